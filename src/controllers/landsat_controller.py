@@ -1,13 +1,21 @@
 from ..landsat import (generate_landsat_query, fetch_stac_server, 
                       determine_required_bands, download_images, 
                       process_metadata, process_indices_from_cutouts_wrapper, 
-                      extract_mosaic_by_polygon, build_mosaic_per_band, get_scenes_by_band)
+                      extract_mosaic_by_polygon, build_mosaic_per_band, get_scenes_by_band,
+                      build_clip_per_band)
+from ..landsat.mosaic import (FUSED_MOSAIC_CLIP, STACKED_CLIP, remove_stacked_clip, save_processing_log,
+                               split_thread_budget, run_band_jobs, stack_clips)
+from ..landsat.downloader import login_usgs, new_concurrency_controller, scene_dir_for_group
+from ..landsat.epochs import (PRIMARY, COMPARISON, EPOCH_LABELS, SOURCE_PATH, epoch_paths, epoch_configs,
+                              run_generators_concurrently, share_scene_dirs)
+from ..landsat.snapshots import save_search_snapshot, load_search_snapshot
 
 import os
 import glob
 import json
 import shutil
-from pathlib import Path
+import threading
+from functools import partial
 import traceback
 
 class LandsatController:
@@ -15,13 +23,76 @@ class LandsatController:
     
     def __init__(self, config):
         self.config = config
+        # (features, scenes) del periodo de comparación, si está habilitado
+        self.comparison = None
+        self.session = None
+        self._session_lock = threading.Lock()
+
+    def get_session(self):
+        """Inicia sesión en USGS una sola vez y comparte la sesión entre periodos."""
+        with self._session_lock:
+            if self.session is None:
+                try:
+                    self.session = login_usgs()
+                except Exception as e:
+                    raise Exception("Fallo al iniciar sesión en USGS.") from e
+            return self.session
 
     def fetch_data(self):
-        """Genera la consulta STAC y la ejecuta para obtener los metadatos."""
+        """
+        Genera la consulta STAC y la ejecuta para obtener los metadatos.
+        Si hay fechas de comparación, ambos periodos se buscan en paralelo;
+        se devuelven las escenas del principal y las del otro quedan en self.comparison.
+        """
+        epochs = epoch_configs(self.config)
+        if len(epochs) == 1:
+            features, scenes = yield from self.fetch_epoch(self.config, PRIMARY)
+        else:
+            yield "Buscando en paralelo el periodo principal y el de comparación...\n"
+            results = yield from run_generators_concurrently(
+                {EPOCH_LABELS[epoch]: self.fetch_epoch(config, epoch) for epoch, config in epochs})
+
+            self.comparison = results[EPOCH_LABELS[COMPARISON]]
+            features, scenes = results[EPOCH_LABELS[PRIMARY]]
+
+        # Guardar la búsqueda para poder reanudar sin volver a consultar el servidor STAC
+        yield from self.save_search(features, scenes)
+        return features, scenes
+
+    def save_search(self, features, scenes):
+        """Guarda el catálogo y la selección de la búsqueda actual en data/temp/runs."""
+        epochs = {PRIMARY: (features, scenes)}
+        if self.comparison is not None:
+            epochs[COMPARISON] = self.comparison
+        try:
+            snapshot_file = save_search_snapshot(self.config, epochs)
+            yield f"Búsqueda guardada en {snapshot_file}"
+        except Exception as e:
+            yield f"No se pudo guardar la búsqueda: {str(e)}"
+
+    def resume_search(self, snapshot_file=None):
+        """
+        Reanuda desde una búsqueda guardada (la más reciente por defecto) sin
+        consultar el servidor STAC. Devuelve (features, scenes) como fetch_data.
+        """
+        yield "Cargando búsqueda guardada...\n"
+        config, epochs = load_search_snapshot(snapshot_file)
+        if not self.config:
+            self.config = config
+
+        features, scenes = epochs[PRIMARY]
+        self.comparison = epochs.get(COMPARISON)
+        yield f"Búsqueda cargada: {len(features)} imágenes y {len(scenes)} escenas seleccionadas."
+        if self.comparison is not None:
+            yield f"{EPOCH_LABELS[COMPARISON]}{len(self.comparison[0])} imágenes y {len(self.comparison[1])} escenas seleccionadas."
+        return features, scenes
+
+    def fetch_epoch(self, config, epoch=PRIMARY):
+        """Consulta y selección de escenas de un periodo."""
         
         # Construcción del query a partir de la configuración
         yield "Generando Query a partir de la información ingresada...\n"
-        query = generate_landsat_query(**self.config)
+        query = generate_landsat_query(**config)
         
         # Obtención de la metadata
         yield "Query generado. Obteniendo metadata...\n"
@@ -29,16 +100,73 @@ class LandsatController:
 
         # Procesar metadatos para sacar las escenas que se ajustan a la configuración deseada
         yield "Metadata obtenida. Iniciando procesamiento...\n"
-        scenes = yield from process_metadata(features)
+        cloud_mask = config.get("cloud_mask", False)
+        session = self.get_session() if cloud_mask else None
+        scenes = yield from process_metadata(features, cloud_mask=cloud_mask, session=session, epoch=epoch)
 
         return features, scenes
 
     def download_data(self, features, scenes, indices):
-        """Descarga los archivos .tif según las escenas obtenidas."""
+        """
+        Descarga los archivos .tif según las escenas obtenidas.
+        Con periodo de comparación ambas descargas corren en paralelo con una
+        sola sesión, y las escenas presentes en los dos periodos se descargan una vez.
+        """
         
         yield "\nObteniendo bandas necesarias para los índices seleccionados...\n"
         required_bands = determine_required_bands(indices)
-        
+
+        yield "Iniciando sesión en USGS..."
+        session = self.get_session()
+        # Un solo control de concurrencia por host para ambos periodos: comparten
+        # los hosts, el límite y las señales de congestión (429/503)
+        concurrency = new_concurrency_controller()
+
+        if self.comparison is None:
+            base_path = yield from self.download_epoch(features, scenes, required_bands, session, concurrency)
+            yield "\nDescarga finalizada."
+            return base_path
+
+        comparison_features, comparison_scenes = self.comparison
+        primary_groups = {scene_group_key(scene) for scene in scenes}
+        shared_groups = sorted({scene_group_key(scene) for scene in comparison_scenes} & primary_groups)
+        pending_scenes = [scene for scene in comparison_scenes if scene_group_key(scene) not in primary_groups]
+        if shared_groups:
+            yield f"{len(shared_groups)} escenas están en ambos periodos y se descargarán una sola vez"
+
+        generators = {EPOCH_LABELS[PRIMARY]: self.download_epoch(features, scenes, required_bands, session,
+                                                                 concurrency)}
+        if pending_scenes:
+            generators[EPOCH_LABELS[COMPARISON]] = self.download_epoch(
+                comparison_features, pending_scenes, required_bands, session, concurrency, epoch=COMPARISON)
+        results = yield from run_generators_concurrently(generators)
+
+        if shared_groups:
+            scene_dirs = [os.path.basename(scene_dir_for_group("", key)) for key in shared_groups]
+            linked = share_scene_dirs(epoch_paths(PRIMARY)["downloads"], epoch_paths(COMPARISON)["downloads"],
+                                      scene_dirs)
+            yield f"Escenas compartidas con el periodo de comparación: {len(scene_dirs)} ({linked} archivos)"
+
+        yield "\nDescarga finalizada."
+        return results[EPOCH_LABELS[PRIMARY]]
+
+    def download_epoch(self, features, scenes, required_bands, session, concurrency=None, epoch=PRIMARY):
+        """
+        Completa las colecciones SR/ST de las escenas de un periodo y las descarga
+        con el control de concurrencia por host `concurrency`.
+        """
+        yield from self.complete_collections(features, scenes, required_bands)
+
+        # Iniciar la descarga
+        yield f"Iniciando descarga de las bandas requeridas..."
+        return (yield from download_images(features, scenes, required_bands, concurrency=concurrency,
+                                           epoch=epoch, session=session))
+
+    def complete_collections(self, features, scenes, required_bands):
+        """
+        Asigna la colección a cada escena y añade las escenas SR/ST
+        correspondientes cuando los índices requieren ambas.
+        """
         # Verificar qué tipos de datos necesitamos
         need_sr = any(collection.lower() == 'sr' for band, collection in required_bands.items())
         need_st = any(collection.lower() == 'st' for band, collection in required_bands.items())
@@ -140,13 +268,11 @@ class LandsatController:
         
         yield f"Total de escenas a procesar: {len(scenes)}"
         yield f"Escenas SR: {len(sr_scenes)}, Escenas ST: {len(st_scenes)}"
-        
-        # Iniciar la descarga
-        yield f"Iniciando descarga de las bandas requeridas..."
-        base_path = yield from download_images(features, scenes, required_bands)
-        
-        yield "\nDescarga finalizada."
-        return base_path
+
+
+def scene_group_key(scene):
+    """Clave path_row_fecha con la que se agrupan las descargas de una escena."""
+    return f"{scene['path']}_{scene['row']}_{scene['date']}"
 
 
 class ProcessingController:
@@ -165,8 +291,7 @@ class ProcessingController:
         try:
             # Paso 1: Preparar carpetas y paths
             yield "Preparando directorios para mosaicos y recortes..."
-            script_dir = Path(__file__).parent
-            data_path = script_dir.parent.parent / "data" / "temp" / "source"
+            data_path = SOURCE_PATH
             
             # Buscar archivos con extensión .geojson y .shp
             files = sorted(
@@ -183,9 +308,29 @@ class ProcessingController:
             
             if not os.path.exists(polygon_path):
                 raise Exception(f"El archivo del polígono {polygon_path} no existe.")
-                
-            download_path = script_dir.parent.parent / "data" / "temp" / "downloads"
+
+            # El polígono se comparte entre periodos; cada uno usa sus propias carpetas
+            epochs = [epoch for epoch, _ in epoch_configs(self.config)]
+            if len(epochs) == 1:
+                return (yield from self.generate_epoch_mosaics(polygon_path))
+
+            yield "Generando en paralelo los mosaicos del periodo principal y del de comparación..."
+            results = yield from run_generators_concurrently(
+                {EPOCH_LABELS[epoch]: self.generate_epoch_mosaics(polygon_path, epoch) for epoch in epochs})
+            return results[EPOCH_LABELS[PRIMARY]]
             
+        except Exception as e:
+            import traceback
+            error_details = traceback.format_exc()
+            print(error_details)
+            raise Exception(f"Error al generar mosaicos: {str(e)}")
+
+    def generate_epoch_mosaics(self, polygon_path, epoch=PRIMARY):
+        """Crea los mosaicos por banda y sus recortes para un periodo."""
+        paths = epoch_paths(epoch)
+        download_path = paths["downloads"]
+
+        try:
             # Paso 2: Obtener bandas descargadas
             yield "Identificando bandas espectrales descargadas..."
             sorted_bands = get_scenes_by_band(download_path)
@@ -197,58 +342,65 @@ class ProcessingController:
             band_info = ", ".join([f"{k}({len(v)})" for k, v in sorted_bands.items()])
             yield f"Bandas encontradas: {band_info}"
             
+            # Pasos 3 y 4 fusionados: recortar cada banda desde su VRT sin escribir el mosaico
+            if self.config.get("fused_clip", FUSED_MOSAIC_CLIP):
+                return (yield from self.generate_epoch_clips(polygon_path, sorted_bands, paths))
+
             # Paso 3: Crear mosaicos por banda
             processed_mosaics = {}
-            output_mosaic = script_dir.parent.parent / "data" / "temp" / "processed" / "mosaic"
+            output_mosaic = paths["mosaic"]
             
-            yield "Creando mosaico para cada banda..."
             total_bands = len(sorted_bands)
-            
-            for i, (band, files) in enumerate(sorted_bands.items()):
-                if self.stop_requested:
-                    yield "Proceso cancelado por el usuario."
-                    return
-                    
-                try:
-                    yield f"[{i+1}/{total_bands}] Creando mosaico para la banda {band}..."
-                    mosaic_path = build_mosaic_per_band(files, output_mosaic, band)
-                    
-                    if mosaic_path and os.path.exists(mosaic_path):
-                        processed_mosaics[band] = mosaic_path
-                        yield f"✓ Mosaico de {band} creado exitosamente"
-                    else:
-                        raise Exception(f"No se pudo crear el mosaico para la banda {band}")
-                    
-                except Exception as e:
-                    yield f"⚠ Error en mosaico de banda {band}: {str(e)}"
+            workers, gdal_threads = split_thread_budget(total_bands)
+            yield f"Creando mosaico para cada banda ({workers} en paralelo, {gdal_threads} hilos de GDAL por banda)..."
+
+            jobs = {
+                band: partial(build_mosaic_per_band, files, output_mosaic, band, num_threads=gdal_threads)
+                for band, files in sorted_bands.items()
+            }
+            for i, (band, mosaic_path, error) in enumerate(run_band_jobs(jobs, workers, self.is_stop_requested)):
+                if error is not None:
+                    yield f"⚠ Error en mosaico de banda {band}: {str(error)}"
+                elif mosaic_path and os.path.exists(mosaic_path):
+                    processed_mosaics[band] = mosaic_path
+                    yield f"[{i+1}/{total_bands}] ✓ Mosaico de {band} creado exitosamente"
+                else:
+                    yield f"⚠ Error en mosaico de banda {band}: No se pudo crear el mosaico para la banda {band}"
+
+            if self.stop_requested:
+                yield "Proceso cancelado por el usuario."
+                return
                     
             if not processed_mosaics:
                 raise Exception("No se pudo crear ningún mosaico.")
                 
             # Paso 4: Recortar mosaicos con el polígono
             created_clips = {}
-            clips_path = script_dir.parent.parent / "data" / "temp" / "processed" / "clip"
+            clips_path = paths["clip"]
             
             yield "\nRecortando mosaicos con el polígono..."
             total_mosaics = len(processed_mosaics)
-            
-            for i, (band, mosaic_path) in enumerate(processed_mosaics.items()):
-                if self.stop_requested:
-                    yield "Proceso cancelado por el usuario."
-                    return
-                    
-                try:
-                    yield f"[{i+1}/{total_mosaics}] Recortando mosaico para banda {band}..."
-                    clip_path = extract_mosaic_by_polygon(mosaic_path, polygon_path, clips_path)
-                    
-                    if clip_path is not None:
-                        created_clips[band] = clip_path
-                        yield f"✓ Recorte de {band} creado exitosamente"
-                    else:
-                        raise Exception(f"No se pudo crear el recorte para la banda {band}")
-                        
-                except Exception as e:
-                    yield f"⚠ Error en recorte de banda {band}: {str(e)}"
+
+            jobs = {
+                band: partial(extract_mosaic_by_polygon, mosaic_path, polygon_path, clips_path)
+                for band, mosaic_path in processed_mosaics.items()
+            }
+            for i, (band, clip_path, error) in enumerate(run_band_jobs(jobs, workers, self.is_stop_requested)):
+                if error is None and clip_path is not None:
+                    created_clips[band] = clip_path
+                    yield f"[{i+1}/{total_mosaics}] ✓ Recorte de {band} creado exitosamente"
+                else:
+                    yield f"⚠ Error en recorte de banda {band}: {str(error) if error else f'No se pudo crear el recorte para la banda {band}'}"
+
+            if self.stop_requested:
+                yield "Proceso cancelado por el usuario."
+                return
+
+            # Recorte multibanda para leer todas las bandas de un bloque a la vez
+            if created_clips and self.config.get("stacked_clip", STACKED_CLIP):
+                yield from stack_clips(created_clips, clips_path)
+            else:
+                remove_stacked_clip(clips_path)
                     
             # Resumen y registro
             results = {
@@ -256,7 +408,7 @@ class ProcessingController:
                 "recortes": created_clips
             }
             
-            output_clips = script_dir.parent.parent / "data" / "exports"
+            output_clips = paths["exports"]
             os.makedirs(output_clips, exist_ok=True)
             
             log_path = os.path.join(output_clips, "registro_procesamiento.json")
@@ -273,10 +425,50 @@ class ProcessingController:
             return results
             
         except Exception as e:
-            import traceback
-            error_details = traceback.format_exc()
-            print(error_details)
-            raise Exception(f"Error al generar mosaicos: {str(e)}")
+            print(traceback.format_exc())
+            raise Exception(f"{EPOCH_LABELS[epoch]}{str(e)}") from e
+
+    def generate_epoch_clips(self, polygon_path, sorted_bands, paths):
+        """Recorta cada banda directamente desde su mosaico virtual con un solo gdal.Warp."""
+        created_clips = {}
+        clips_path = paths["clip"]
+
+        total_bands = len(sorted_bands)
+        workers, gdal_threads = split_thread_budget(total_bands)
+        yield (f"Recortando cada banda directamente desde su mosaico virtual "
+               f"({workers} en paralelo, {gdal_threads} hilos de GDAL por banda)...")
+
+        jobs = {
+            band: partial(build_clip_per_band, files, polygon_path, clips_path, band, num_threads=gdal_threads)
+            for band, files in sorted_bands.items()
+        }
+        for i, (band, clip_path, error) in enumerate(run_band_jobs(jobs, workers, self.is_stop_requested)):
+            if error is None:
+                created_clips[band] = clip_path
+                yield f"[{i+1}/{total_bands}] ✓ Recorte de {band} creado exitosamente"
+            else:
+                yield f"⚠ Error en recorte de banda {band}: {str(error)}"
+
+        if self.stop_requested:
+            yield "Proceso cancelado por el usuario."
+            return
+
+        if not created_clips:
+            raise Exception("No se pudo crear ningún recorte.")
+        if self.config.get("stacked_clip", STACKED_CLIP):
+            yield from stack_clips(created_clips, clips_path)
+        else:
+            remove_stacked_clip(clips_path)
+
+        results = {
+            "mosaicos": {},
+            "recortes": created_clips
+        }
+        log_path = save_processing_log(results, paths["exports"])
+        yield f"\nRegistro guardado en {log_path}"
+        yield f"\nProcesamiento completado: {len(created_clips)} recortes generados."
+
+        return results
 
     def calculate_indices(self, indices):
         """
@@ -288,8 +480,14 @@ class ProcessingController:
                 
             yield f"Iniciando cálculo de índices: {', '.join(indices)}"
             
-            # Llamar al envoltorio de procesamiento de índices
-            yield from process_indices_from_cutouts_wrapper(indices)
+            # Llamar al envoltorio de procesamiento de índices (en paralelo por periodo)
+            epochs = [epoch for epoch, _ in epoch_configs(self.config)]
+            if len(epochs) == 1:
+                yield from process_indices_from_cutouts_wrapper(indices)
+            else:
+                yield from run_generators_concurrently(
+                    {EPOCH_LABELS[epoch]: process_indices_from_cutouts_wrapper(indices, epoch=epoch)
+                     for epoch in epochs})
             
             yield "Cálculo de índices completado exitosamente"
             
@@ -301,4 +499,7 @@ class ProcessingController:
             
     def stop(self):
         """Detiene el procesamiento actual de forma segura"""
-        self.stop_requested = True
\ No newline at end of file
+        self.stop_requested = True
+
+    def is_stop_requested(self):
+        return self.stop_requested
\ No newline at end of file
@@ -1,7 +1,8 @@
 from .query import generate_landsat_query, fetch_stac_server
 from .downloader import download_images, determine_required_bands
 from .processing import process_metadata
-from .mosaic import generate_mosaics_and_clips, build_mosaic_per_band, extract_mosaic_by_polygon, get_scenes_by_band
+from .mosaic import (generate_mosaics_and_clips, build_mosaic_per_band, build_clip_per_band,
+                     extract_mosaic_by_polygon, get_scenes_by_band)
 from .indices import process_indices_from_cutouts_wrapper
 from .config import USGS_USERNAME, USGS_PASSWORD
 
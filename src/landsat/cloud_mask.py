@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import rasterio
+from rasterio.features import geometry_mask
+from rasterio.windows import from_bounds
+from .projection import GEOGRAPHIC_CRS, project
+from .raster_env import raster_options
+from .storage import FileBackend
+
+# Bits de la banda QA_PIXEL de Landsat Colección 2
+QA_FILL = 1 << 0
+QA_DILATED_CLOUD = 1 << 1
+QA_CLOUD = 1 << 3
+QA_CLOUD_SHADOW = 1 << 4
+QA_CLEAR = 1 << 6
+# Un píxel sin el bit de despejado se considera despejado si no tiene ninguno de estos
+QA_OBSTRUCTED = QA_DILATED_CLOUD | QA_CLOUD | QA_CLOUD_SHADOW
+
+CLOUD_MASK_WORKERS = 8
+
+# Lectura por rangos HTTP de COGs remotos sin listar el directorio
+GDAL_REMOTE_OPTIONS = {
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+    "CPL_VSIL_CURL_ALLOWED_EXTENSIONS": ".TIF,.tif",
+    "GDAL_HTTP_MULTIRANGE": "YES",
+    "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+}
+
+
+def find_qa_href(feature):
+    """Devuelve el href del asset QA_PIXEL de una característica o None."""
+    assets = feature.get('assets', {})
+    for key in ("qa_pixel", "QA_PIXEL"):
+        if key in assets and 'href' in assets[key]:
+            return assets[key]['href']
+    for asset in assets.values():
+        href = asset.get('href', '')
+        if href.upper().endswith("_QA_PIXEL.TIF"):
+            return href
+    return None
+
+
+def clear_sky_fraction(qa, inside):
+    """
+    Fracción de píxeles despejados entre los píxeles válidos (no relleno) del AOI.
+    `qa` es el arreglo QA_PIXEL y `inside` la máscara booleana del AOI.
+    Devuelve None si no hay píxeles válidos.
+    """
+    valid = inside & ((qa & QA_FILL) == 0)
+    total = np.count_nonzero(valid)
+    if not total:
+        return None
+    clear = ((qa & QA_CLEAR) != 0) | ((qa & QA_OBSTRUCTED) == 0)
+    return np.count_nonzero(clear & valid) / total
+
+
+def gdal_http_options(session=None):
+    """Opciones de GDAL para leer por HTTP con las cookies de la sesión de USGS."""
+    options = dict(GDAL_REMOTE_OPTIONS)
+    if session is not None and session.cookies:
+        options["GDAL_HTTP_COOKIE"] = "; ".join(f"{c.name}={c.value}" for c in session.cookies)
+    return options
+
+
+def read_aoi_clear_fraction(href, aoi):
+    """
+    Lee solo la ventana del AOI (en coordenadas geográficas) del QA_PIXEL y
+    calcula su fracción despejada. Debe llamarse dentro de un rasterio.Env.
+    """
+    if FileBackend().can_handle(href):
+        href = FileBackend.to_path(href)
+
+    with rasterio.open(href) as src:
+        aoi_src = project(aoi, GEOGRAPHIC_CRS, src.crs.to_string())
+        window = from_bounds(*aoi_src.bounds, transform=src.transform)
+        window = window.round_offsets().round_lengths().intersection(
+            rasterio.windows.Window(0, 0, src.width, src.height))
+        qa = src.read(1, window=window)
+        transform = src.window_transform(window)
+
+    inside = geometry_mask([aoi_src], out_shape=qa.shape, transform=transform, invert=True, all_touched=True)
+    return clear_sky_fraction(qa, inside)
+
+
+def compute_clear_sky(features, aoi, session=None, max_workers=CLOUD_MASK_WORKERS):
+    """
+    Calcula en paralelo la fracción despejada dentro del AOI para cada característica
+    con QA_PIXEL. Devuelve {id de escena: fracción}; las escenas que no se pudieron
+    leer no aparecen en el resultado.
+    """
+    jobs = [(feature.get('id'), find_qa_href(feature)) for feature in features]
+    jobs = [(scene_id, href) for scene_id, href in jobs if href]
+    if not jobs:
+        return {}
+
+    options = dict(raster_options(), **gdal_http_options(session))
+
+    def run(job):
+        scene_id, href = job
+        try:
+            with rasterio.Env(**options):
+                return scene_id, read_aoi_clear_fraction(href, aoi)
+        except Exception as e:
+            print(f"No se pudo leer QA_PIXEL de {scene_id}: {str(e)}")
+            return scene_id, None
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+        results = executor.map(run, jobs)
+        return {scene_id: fraction for scene_id, fraction in results if fraction is not None}
@@ -0,0 +1,50 @@
+import os
+import rasterio
+import rasterio.shutil
+from .raster_env import RASTER_THREAD_BUDGET, raster_env
+from .compression import INDEX, MASK, REFLECTANCE, cog_compression
+
+# Convertir los productos raster (mosaicos, recortes, máscara e índices) a
+# Cloud-Optimized GeoTIFF con overviews internas. Se activa por despliegue con
+# LANDSAT_COG_OUTPUT=1 o por llamada con el argumento `enabled`
+COG_OUTPUT = os.environ.get("LANDSAT_COG_OUTPUT", "").lower() in ("1", "true", "yes")
+COG_BLOCK_SIZE = 512
+
+# Remuestreo de las overviews según el producto
+OVERVIEW_RESAMPLING = {
+    REFLECTANCE: "AVERAGE",
+    INDEX: "AVERAGE",
+    MASK: "MODE",
+}
+
+
+def cog_options(product, dtype, num_threads=RASTER_THREAD_BUDGET):
+    """Opciones del driver COG de GDAL para un producto."""
+    return {
+        **cog_compression(product, dtype),
+        "BLOCKSIZE": COG_BLOCK_SIZE,
+        "OVERVIEW_RESAMPLING": OVERVIEW_RESAMPLING[product],
+        "NUM_THREADS": num_threads,
+        "BIGTIFF": "IF_SAFER",
+    }
+
+
+def finalize_raster(path, product=REFLECTANCE, enabled=None, num_threads=RASTER_THREAD_BUDGET):
+    """
+    Reescribe `path` como COG con overviews (calculadas en `num_threads` hilos)
+    si la salida COG está activada. El reemplazo es atómico. Devuelve la ruta.
+    """
+    if not (COG_OUTPUT if enabled is None else enabled):
+        return path
+
+    temp_path = f"{path}.cog.tmp"
+    try:
+        with raster_env():
+            with rasterio.open(path) as src:
+                dtype = src.dtypes[0]
+            rasterio.shutil.copy(path, temp_path, driver="COG", **cog_options(product, dtype, num_threads))
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return path
@@ -0,0 +1,82 @@
+import os
+import numpy as np
+
+# Productos raster con su propia compresión
+REFLECTANCE = "reflectance"  # mosaicos, recortes y recorte multibanda
+INDEX = "index"              # índices float32
+MASK = "mask"                # máscara del área de interés
+
+# Códec por producto como "CÓDEC" o "CÓDEC:parámetro": nivel para DEFLATE y ZSTD,
+# error máximo absoluto para LERC (0 = sin pérdida). Cada valor se puede
+# sobrescribir por despliegue con LANDSAT_COMPRESSION_<PRODUCTO>, p. ej.
+# LANDSAT_COMPRESSION_INDEX=LERC:0.001. Elegir con tests/benchmark_compression.py
+COMPRESSION_DEFAULTS = {
+    REFLECTANCE: "DEFLATE",
+    INDEX: "DEFLATE",
+    MASK: "DEFLATE",
+}
+CODECS = ("NONE", "DEFLATE", "ZSTD", "LZW", "LERC")
+
+# Opciones de compresión que se reemplazan al aplicar las de otro producto
+_COMPRESSION_KEYS = ("compress", "predictor", "zlevel", "zstd_level", "max_z_error", "level")
+
+
+def parse_compression(spec):
+    """'ZSTD:9' -> ('ZSTD', 9.0); 'LZW' -> ('LZW', None)."""
+    codec, _, param = str(spec).strip().upper().partition(":")
+    if codec not in CODECS:
+        raise Exception(f"Códec de compresión no soportado: {codec} (opciones: {', '.join(CODECS)})")
+    return codec, float(param) if param else None
+
+
+def compression_spec(product):
+    """Códec y parámetro efectivos de un producto (valor por defecto o variable de entorno)."""
+    return parse_compression(os.environ.get(f"LANDSAT_COMPRESSION_{product.upper()}",
+                                            COMPRESSION_DEFAULTS[product]))
+
+
+def compression_options(product, dtype, spec=None):
+    """
+    Opciones de creación GTiff para comprimir un producto del tipo `dtype`:
+    predictor horizontal (2) para enteros y de coma flotante (3) para reales.
+    """
+    codec, param = parse_compression(spec) if spec else compression_spec(product)
+    if codec == "NONE":
+        return {}
+
+    options = {"COMPRESS": codec}
+    if codec == "LERC":
+        options["MAX_Z_ERROR"] = param or 0
+        return options
+
+    options["PREDICTOR"] = 3 if np.issubdtype(np.dtype(dtype), np.floating) else 2
+    if param is not None and codec == "DEFLATE":
+        options["ZLEVEL"] = int(param)
+    elif param is not None and codec == "ZSTD":
+        options["ZSTD_LEVEL"] = int(param)
+    return options
+
+
+def gtiff_creation_options(product, dtype, num_threads=1):
+    """Opciones de creación para gdal.Translate/Warp: compresión, teselas e hilos."""
+    options = compression_options(product, dtype)
+    return [f"{key}={value}" for key, value in options.items()] + ["TILED=YES", f"NUM_THREADS={num_threads}"]
+
+
+def apply_compression(profile, product):
+    """Reemplaza la compresión de un profile de rasterio por la del producto. Devuelve el profile."""
+    for key in _COMPRESSION_KEYS:
+        profile.pop(key, None)
+    profile.update({key.lower(): value for key, value in compression_options(product, profile["dtype"]).items()})
+    return profile
+
+
+def cog_compression(product, dtype):
+    """Las mismas opciones con los nombres del driver COG (LEVEL en vez de ZLEVEL/ZSTD_LEVEL)."""
+    options = compression_options(product, dtype) or {"COMPRESS": "NONE"}  # el COG usa LZW por defecto
+    for key in ("ZLEVEL", "ZSTD_LEVEL"):
+        if key in options:
+            options["LEVEL"] = options.pop(key)
+    if "PREDICTOR" in options:
+        options["PREDICTOR"] = "FLOATING_POINT" if options["PREDICTOR"] == 3 else "STANDARD"
+    return options
@@ -0,0 +1,156 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Códigos HTTP que indican que el servidor pide reducir la carga
+BACKPRESSURE_STATUS = (429, 503)
+
+
+class HostState:
+    """Estado de control de concurrencia para un host."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.condition = threading.Condition()
+
+        self.total_bytes = 0
+        self.completed = 0
+        self.failures = 0
+        self.backoffs = 0
+
+        self.window_bytes = 0
+        self.window_started = time.monotonic()
+        self.window_completed = 0
+        self.window_latency = 0.0
+        self.last_throughput = 0.0
+        self.throughput = 0.0
+        self.latency = None
+        self.baseline_latency = None
+        self.last_backoff = 0.0
+
+
+class AdaptiveConcurrencyController:
+    """
+    Control de concurrencia AIMD (aumento aditivo, disminución multiplicativa) por host.
+
+    Cada transferencia ocupa un cupo del host. Al completar una ronda (tantas
+    transferencias como el límite actual), si el rendimiento subió y la latencia
+    se mantiene cerca de la línea base, el límite crece en `increase`.
+    Ante 429/503 o timeouts el límite se multiplica por `decrease_factor`.
+    """
+
+    def __init__(self, initial=2, min_concurrency=1, max_concurrency=16, increase=1,
+                 decrease_factor=0.5, latency_tolerance=1.5, throughput_gain=0.05, backoff_cooldown=2.0):
+        self.initial = initial
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.throughput_gain = throughput_gain
+        self.backoff_cooldown = backoff_cooldown
+
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+    def _state(self, host):
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = HostState(self.initial)
+            return self._hosts[host]
+
+    @contextmanager
+    def slot(self, host):
+        """Reserva un cupo de transferencia para el host; bloquea hasta que haya uno libre."""
+        state = self._state(host)
+        with state.condition:
+            while state.active >= state.limit:
+                state.condition.wait()
+            state.active += 1
+        try:
+            yield
+        finally:
+            with state.condition:
+                state.active -= 1
+                state.condition.notify_all()
+
+    def record_success(self, host, nbytes, latency):
+        """Registra una transferencia completa (bytes y tiempo hasta el primer byte)."""
+        state = self._state(host)
+        with state.condition:
+            state.total_bytes += nbytes
+            state.completed += 1
+            state.window_bytes += nbytes
+            state.window_completed += 1
+            state.window_latency += latency
+            if state.baseline_latency is None or latency < state.baseline_latency:
+                state.baseline_latency = latency
+
+            # Evaluar una vez por ronda de transferencias
+            if state.window_completed < state.limit:
+                return
+
+            elapsed = max(time.monotonic() - state.window_started, 1e-6)
+            state.throughput = state.window_bytes / elapsed
+            state.latency = state.window_latency / state.window_completed
+
+            throughput_rising = state.throughput >= state.last_throughput * (1 + self.throughput_gain)
+            latency_flat = state.latency <= state.baseline_latency * self.latency_tolerance + 0.05
+            if throughput_rising and latency_flat and state.limit < self.max_concurrency:
+                state.limit = min(self.max_concurrency, state.limit + self.increase)
+                state.condition.notify_all()
+
+            state.last_throughput = state.throughput
+            state.window_bytes = 0
+            state.window_completed = 0
+            state.window_latency = 0.0
+            state.window_started = time.monotonic()
+
+    def record_failure(self, host, reason=""):
+        """Registra una señal de congestión (429/503/timeout) y reduce el límite."""
+        state = self._state(host)
+        with state.condition:
+            state.failures += 1
+            now = time.monotonic()
+            # Una sola reducción por ráfaga de errores
+            if now - state.last_backoff < self.backoff_cooldown:
+                return
+            state.last_backoff = now
+            state.backoffs += 1
+            state.limit = max(self.min_concurrency, int(state.limit * self.decrease_factor))
+            state.last_throughput = 0.0
+            state.window_bytes = 0
+            state.window_completed = 0
+            state.window_latency = 0.0
+            state.window_started = now
+            print(f"Reduciendo concurrencia hacia {host} a {state.limit} ({reason})")
+
+    def metrics(self):
+        """Devuelve concurrencia y rendimiento actuales por host."""
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        result = {}
+        with self._lock:
+            hosts = dict(self._hosts)
+        for host, state in hosts.items():
+            with state.condition:
+                result[host] = {
+                    "concurrency": state.limit,
+                    "active": state.active,
+                    "completed": state.completed,
+                    "failures": state.failures,
+                    "backoffs": state.backoffs,
+                    "throughput_MBps": round(state.throughput / 1e6, 3),
+                    "average_MBps": round(state.total_bytes / elapsed / 1e6, 3),
+                    "latency_s": round(state.latency, 3) if state.latency is not None else None,
+                }
+        return result
+
+    def describe(self):
+        """Resumen legible de las métricas para los mensajes de progreso."""
+        lines = []
+        for host, m in self.metrics().items():
+            lines.append(f"{host}: concurrencia={m['concurrency']}, {m['average_MBps']:.2f} MB/s promedio, "
+                         f"{m['completed']} transferencias, {m['backoffs']} reducciones")
+        return "\n".join(lines)
@@ -3,10 +3,29 @@ import requests
 import json
 from bs4 import BeautifulSoup
 from .config import USGS_USERNAME, USGS_PASSWORD
-from pathlib import Path
+from .storage import get_storage_backend
+from .verification import verify_downloads
+from .concurrency import AdaptiveConcurrencyController
+from .metadata import MetadataCache, parse_mtl_file
+from .epochs import PRIMARY, epoch_paths
 import traceback
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-LOGIN_URL = "https://ers.cr.usgs.gov/login"
+# Se puede redirigir a un servidor local (p. ej. tests/fake_usgs_server.py) para pruebas sin red
+LOGIN_URL = os.environ.get("USGS_LOGIN_URL", "https://ers.cr.usgs.gov/login")
+
+# Número de veces que se vuelve a descargar un TIF que no pasa la verificación
+VERIFY_RETRIES = 2
+
+# Grupos de escenas descargados en paralelo (las transferencias por host las limita el control AIMD)
+MAX_DOWNLOAD_WORKERS = 8
+# Límites del control adaptativo de concurrencia por host
+MIN_HOST_CONCURRENCY = 1
+MAX_HOST_CONCURRENCY = 8
+# Segundos entre reportes de métricas de descarga
+METRICS_INTERVAL = 10
 
 def login_usgs():
     """ Logs into the USGS system and returns an authenticated session."""
@@ -188,15 +207,21 @@ def find_matching_feature(features, path, row, date, target_collection):
     # Devolver el primer match si existe
     return matching_features[0] if matching_features else None
 
-def download_specific_band(session, feature, band, collection, download_path):
+def band_file_name(download_path, scene_id, collection, band):
+    """Returns the local path where a band of a scene is stored."""
+    return os.path.join(download_path, f"{scene_id}_{collection.upper()}_{band}.TIF")
+
+def download_specific_band(storage, feature, band, collection, download_path, expected_sizes=None):
     """
     Downloads a specific band using the standard Landsat filename pattern.
+    The asset is resolved through the storage backend (local mirror, file:// or HTTP).
+    If expected_sizes is given, the Content-Length of the transfer is recorded in it.
     """
     scene_info = extract_scene_info(feature)
     scene_id = scene_info['id']
     
     # Check if the band already exists in the download folder
-    output_path = os.path.join(download_path, f"{scene_id}_{collection.upper()}_{band}.TIF")
+    output_path = band_file_name(download_path, scene_id, collection, band)
     if os.path.exists(output_path):
         msg = f"La banda {band} ({collection}) de {scene_id} ya existe. Omitiendo descarga."
         print(msg)
@@ -249,13 +274,9 @@ def download_specific_band(session, feature, band, collection, download_path):
                     direct_url += constructed_filename
                     
                     # Check if URL exists
-                    try:
-                        head_response = session.head(direct_url)
-                        if head_response.status_code == 200:
-                            download_url = direct_url
-                            print(f"Usando URL directa para banda {band}: {download_url}")
-                    except Exception as e:
-                        print(f"Error verificando URL directa: {str(e)}")
+                    if storage.exists(direct_url):
+                        download_url = direct_url
+                        print(f"Usando URL directa para banda {band}: {download_url}")
             except Exception as e:
                 print(f"Error construyendo URL directa: {str(e)}")
     
@@ -267,20 +288,21 @@ def download_specific_band(session, feature, band, collection, download_path):
     
     # Download the band
     try:
-        file_name = os.path.join(download_path, f"{scene_id}_{collection.upper()}_{band}.TIF")
+        file_name = output_path
         
         msg = f"Descargando: {os.path.basename(file_name)} desde {download_url}"
         print(msg)
         yield msg
 
-        # Download with authentication
-        with session.get(download_url, stream=True) as response:
-            response.raise_for_status()
-            total_size = int(response.headers.get('content-length', 0))
+        # Download through the storage backend (mirror first, then HTTP)
+        with storage.open(download_url) as stream:
+            total_size = stream.total_size
+            if expected_sizes is not None and total_size:
+                expected_sizes[file_name] = total_size
             
             with open(file_name, 'wb') as file:
                 downloaded = 0
-                for chunk in response.iter_content(chunk_size=8192):
+                for chunk in stream.iter_content(chunk_size=8192):
                     file.write(chunk)
                     downloaded += len(chunk)
                     # Show progress every 20%
@@ -296,8 +318,20 @@ def download_specific_band(session, feature, band, collection, download_path):
         print(f"Error al descargar la banda {band}: {str(e)}")
         return False
 
-def download_metadata(session, feature, download_path):
-    """Descarga los metadatos de una escena."""
+def is_valid_mtl(file_name):
+    """Indica si un MTL.json descargado se puede interpretar (no está truncado ni es una página HTML)."""
+    try:
+        parse_mtl_file(file_name)
+        return True
+    except Exception:
+        return False
+
+def download_metadata(storage, feature, download_path):
+    """
+    Descarga los metadatos de una escena y devuelve la ruta del MTL.json (o False).
+    Un MTL.json existente solo se reutiliza si se puede interpretar; si no, se
+    elimina y se vuelve a descargar.
+    """
     scene_id = feature.get('id', 'unknown')
     collection = get_collection_from_feature(feature)
     collection_suffix = "_SR" if "sr" in collection.lower() else "_ST" if "st" in collection.lower() else ""
@@ -305,37 +339,326 @@ def download_metadata(session, feature, download_path):
     try:
         if "MTL.json" in feature['assets'] and "href" in feature['assets']["MTL.json"]:
             file_name = os.path.join(download_path, f"{scene_id}{collection_suffix}_MTL.json")
+            if os.path.exists(file_name):
+                if is_valid_mtl(file_name):
+                    return file_name
+                print(f"Metadata inválida {os.path.basename(file_name)}; se vuelve a descargar")
+                os.remove(file_name)
+
             download_url = feature['assets']["MTL.json"]['href']
             print(f"Descargando metadata: {os.path.basename(file_name)}")
 
-            with session.get(download_url, stream=True) as response:
-                response.raise_for_status()
-                with open(file_name, 'wb') as file:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        file.write(chunk)
+            storage.fetch(download_url, file_name)
             
             print(f"Metadata descargada: {file_name}")
-            return True
+            return file_name
         
         return False
     except Exception as e:
         print(f"Error al descargar la metadata: {str(e)}")
         return False
 
-def download_images(features, scenes_needed, required_bands):
+def scene_dir_for_group(download_path, group_key):
+    """Carpeta de descarga de un grupo de escenas (path_row_fecha)."""
+    path, row, date = group_key.split("_")
+    return os.path.join(download_path, f"scene_{path}_{row}_{date}")
+
+def prefetch_metadata(storage, features, scene_groups, download_path):
+    """
+    Descarga en paralelo los MTL.json de todas las escenas antes que las bandas,
+    los interpreta una sola vez y guarda los registros en la caché de metadatos.
+    Los MTL.json que no se pueden descargar o interpretar (truncados, páginas de
+    error HTML) se eliminan y se vuelven a pedir hasta VERIFY_RETRIES veces.
+    """
+    cache = MetadataCache(download_path).load()
+    features_by_id = {f.get('id'): f for f in features}
+
+    jobs = []
+    for group_key, group_scenes in scene_groups.items():
+        scene_dir = scene_dir_for_group(download_path, group_key)
+        os.makedirs(scene_dir, exist_ok=True)
+        for scene in group_scenes:
+            feature = features_by_id.get(scene['id'])
+            if feature and not cache.get(scene['id']):
+                jobs.append((feature, scene_dir))
+
+    def fetch(job):
+        feature, scene_dir = job
+        mtl_file = download_metadata(storage, feature, scene_dir)
+        if not mtl_file:
+            return False
+        try:
+            collection = "st" if "st" in get_collection_from_feature(feature).lower() else "sr"
+            cache.put(parse_mtl_file(mtl_file, feature.get('id'), collection, os.path.basename(scene_dir)))
+            return True
+        except Exception as e:
+            print(f"Error al interpretar {os.path.basename(mtl_file)}: {str(e)}")
+            if os.path.exists(mtl_file):
+                os.remove(mtl_file)
+            return False
+
+    fetched = 0
+    pending = jobs
+    with ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS) as executor:
+        for attempt in range(VERIFY_RETRIES + 1):
+            results = list(executor.map(fetch, pending))
+            fetched += sum(results)
+            pending = [job for job, ok in zip(pending, results) if not ok]
+            if not pending or attempt == VERIFY_RETRIES:
+                break
+            print(f"Reintentando {len(pending)} metadatos fallidos ({attempt + 1}/{VERIFY_RETRIES})")
+
+    cache.save()
+    return cache, fetched, len(jobs)
+
+def download_band_job(storage, job, expected_sizes=None):
+    """
+    Ejecuta (o repite) un trabajo de descarga registrado por download_images.
+    Un trabajo es ("band", feature, band, collection, scene_dir) o ("url", url, file_name).
+    """
+    if job[0] == "band":
+        _, feature, band, collection, scene_dir = job
+        for result in download_specific_band(storage, feature, band, collection, scene_dir, expected_sizes):
+            if not isinstance(result, bool):
+                yield result
+    else:
+        _, url, file_name = job
+        try:
+            msg = f"Descargando: {os.path.basename(file_name)}"
+            print(msg)
+            yield msg
+            storage.fetch(url, file_name)
+        except Exception as e:
+            print(f"Error descargando URL construida: {str(e)}")
+
+def verify_and_requeue(storage, download_jobs, expected_sizes, full_decode=False):
+    """
+    Verifica en paralelo los TIF descargados y vuelve a descargar los inválidos
+    (truncados, páginas de error HTML, tamaño distinto al Content-Length).
+    Los archivos que siguen siendo inválidos tras VERIFY_RETRIES intentos se eliminan
+    para que no lleguen a la etapa de mosaicos.
+    """
+    pending = [path for path in download_jobs if os.path.exists(path)]
+    msg = f"\nVerificando integridad de {len(pending)} archivos descargados..."
+    print(msg)
+    yield msg
+
+    for attempt in range(VERIFY_RETRIES + 1):
+        invalid = verify_downloads(pending, expected_sizes, full_decode)
+        if not invalid:
+            msg = "Verificación de integridad completada: todos los archivos son válidos."
+            print(msg)
+            yield msg
+            return True
+
+        pending = []
+        for path, reason in invalid.items():
+            msg = f"Archivo inválido {os.path.basename(path)}: {reason}"
+            print(msg)
+            yield msg
+
+            if os.path.exists(path):
+                os.remove(path)
+            expected_sizes.pop(path, None)
+
+            if attempt < VERIFY_RETRIES:
+                yield f"Reintentando descarga ({attempt + 1}/{VERIFY_RETRIES}): {os.path.basename(path)}"
+                yield from download_band_job(storage, download_jobs[path], expected_sizes)
+                if os.path.exists(path):
+                    pending.append(path)
+
+        if not pending:
+            break
+
+    msg = "Advertencia: algunos archivos no pudieron descargarse correctamente y se descartaron."
+    print(msg)
+    yield msg
+    return False
+
+def download_scene_group(storage, features, group_key, group_scenes, required_bands, download_path,
+                         download_jobs, expected_sizes, label=""):
+    """
+    Descarga las bandas requeridas de un grupo de escenas (mismo path/row y fecha).
+    Registra cada descarga en download_jobs para poder verificarla y reintentarla.
+    """
+    path, row, date = group_key.split("_")
+    scene_dir = scene_dir_for_group(download_path, group_key)
+    os.makedirs(scene_dir, exist_ok=True)
+
+    msg = f"\nProcesando grupo de escenas {label}: Path={path}, Row={row}, Fecha={date}"
+    print(msg)
+    yield msg
+
+    # Crear registro de bandas descargadas
+    downloaded_band_info = {band: False for band in required_bands}
+
+    # Procesar primero las escenas ST si estamos buscando bandas ST
+    st_needed = any(collection.lower() == 'st' for band, collection in required_bands.items())
+    sr_needed = any(collection.lower() == 'sr' for band, collection in required_bands.items())
+
+    # Ordenar las escenas: primero las ST si necesitamos bandas ST, luego las SR
+    if st_needed:
+        group_scenes.sort(key=lambda x: 0 if 'st' in x.get('collection', '').lower() else 1)
+    else:
+        group_scenes.sort(key=lambda x: 0 if 'sr' in x.get('collection', '').lower() else 1)
+
+    # Procesar cada escena del grupo
+    for scene in group_scenes:
+        scene_id = scene['id']
+        collection = scene.get('collection', '').lower()
+
+        # Buscar el feature correspondiente
+        target_feature = next((f for f in features if f.get('id') == scene_id), None)
+
+        if not target_feature:
+            print(f"No se encontró la característica para {scene_id}")
+            continue
+
+        print(f"Procesando escena {scene_id} de colección {collection}")
+
+        # Determinar qué bandas descargar de esta escena según su colección
+        if 'sr' in collection:
+            # De una escena SR, intentar descargar todas las bandas SR requeridas
+            sr_bands = [band for band, coll in required_bands.items() 
+                       if coll.lower() == 'sr' and not downloaded_band_info[band]]
+
+            for band in sr_bands:
+                success = False
+                download_jobs[band_file_name(scene_dir, target_feature.get('id', ''), 'sr', band)] = ("band", target_feature, band, 'sr', scene_dir)
+                for result in download_specific_band(storage, target_feature, band, 'sr', scene_dir, expected_sizes):
+                    if isinstance(result, bool):
+                        success = result
+                    else:
+                        yield result
+
+                if success:
+                    downloaded_band_info[band] = True
+
+        if 'st' in collection:
+            # De una escena ST, intentar descargar todas las bandas ST requeridas
+            st_bands = [band for band, coll in required_bands.items() 
+                       if coll.lower() == 'st' and not downloaded_band_info[band]]
+
+            for band in st_bands:
+                success = False
+                download_jobs[band_file_name(scene_dir, target_feature.get('id', ''), 'st', band)] = ("band", target_feature, band, 'st', scene_dir)
+                for result in download_specific_band(storage, target_feature, band, 'st', scene_dir, expected_sizes):
+                    if isinstance(result, bool):
+                        success = result
+                    else:
+                        yield result
+
+                if success:
+                    downloaded_band_info[band] = True
+
+            # Si tenemos una escena ST y necesitamos bandas SR, buscar la correspondiente escena SR
+            #if sr_needed and any(not downloaded_band_info[band] for band, coll in required_bands.items() if coll.lower() == 'sr'):
+                # Extraer información para buscar la correspondencia
+                scene_info = extract_scene_info(target_feature)
+
+                # Buscar un feature SR que coincida
+                matching_sr = find_matching_feature(
+                    features, 
+                    scene_info['path'], 
+                    scene_info['row'], 
+                    scene_info['date'], 
+                    'landsat-c2l2-sr'
+                )
+
+                if matching_sr:
+                    print(f"Encontrada escena SR correspondiente: {matching_sr.get('id')}")
+
+                    # Descargar las bandas SR pendientes
+                    sr_bands = [band for band, coll in required_bands.items() 
+                               if coll.lower() == 'sr' and not downloaded_band_info[band]]
+
+                    for band in sr_bands:
+                        success = False
+                        download_jobs[band_file_name(scene_dir, matching_sr.get('id', ''), 'sr', band)] = ("band", matching_sr, band, 'sr', scene_dir)
+                        for result in download_specific_band(storage, matching_sr, band, 'sr', scene_dir, expected_sizes):
+                            if isinstance(result, bool):
+                                success = result
+                            else:
+                                yield result
+
+                        if success:
+                            downloaded_band_info[band] = True
+                else:
+                    print("No se encontró escena SR correspondiente. Intentando construir URLs...")
+
+                    # Intentar construir URLs para las bandas SR pendientes
+                    sr_bands = [band for band, coll in required_bands.items() 
+                               if coll.lower() == 'sr' and not downloaded_band_info[band]]
+
+                    # Obtener una URL base de la escena ST
+                    base_url = None
+                    for asset_key, asset_info in target_feature['assets'].items():
+                        if 'href' in asset_info and asset_info['href'].lower().endswith('.tif'):
+                            base_url = asset_info['href']
+                            break
+
+                    if base_url:
+                        # Convertir la URL base de ST a SR
+                        for band in sr_bands:
+                            sr_url = base_url.replace('_ST_', '_SR_').replace('_B10', f'_B{band[1:]}')
+
+                            try:
+                                # Verificar si la URL existe
+                                if storage.exists(sr_url):
+                                    print(f"Construida URL para banda {band}: {sr_url}")
+
+                                    # Descargar la banda
+                                    file_name = os.path.join(scene_dir, f"{scene_info['id']}_SR_{band}.TIF")
+
+                                    msg = f"Descargando: {os.path.basename(file_name)}"
+                                    print(msg)
+                                    yield msg
+
+                                    download_jobs[file_name] = ("url", sr_url, file_name)
+                                    storage.fetch(sr_url, file_name)
+
+                                    print(f"Descargado: {file_name}")
+                                    downloaded_band_info[band] = True
+                            except Exception as e:
+                                print(f"Error descargando URL construida: {str(e)}")
+
+def new_concurrency_controller():
+    """
+    Controlador AIMD de concurrencia por host para las descargas. Las descargas
+    simultáneas contra los mismos hosts (p. ej. las dos épocas) deben compartir uno.
+    """
+    return AdaptiveConcurrencyController(
+        min_concurrency=MIN_HOST_CONCURRENCY,
+        max_concurrency=MAX_HOST_CONCURRENCY
+    )
+
+def download_images(features, scenes_needed, required_bands, verify_full_decode=False, concurrency=None,
+                    epoch=PRIMARY, session=None):
     """
     Descarga las bandas necesarias para cada escena, manejando múltiples colecciones.
+    Los grupos de escenas se descargan en paralelo con concurrencia adaptativa por host
+    (se puede pasar un AdaptiveConcurrencyController para compartirlo o consultar sus métricas).
+    Al final verifica la integridad de los TIF y vuelve a descargar los inválidos.
+    `epoch` elige la carpeta de descargas y `session` permite reutilizar un login.
     """
-    # Ruta basada en la ubicación del script
-    script_dir = Path(__file__).parent
-    download_path = script_dir.parent.parent / "data" / "temp" / "downloads"
+    download_path = epoch_paths(epoch)["downloads"]
     os.makedirs(download_path, exist_ok=True)
     
     # Iniciar sesión en USGS
-    try:
-        session = login_usgs()
-    except Exception as e:
-        raise Exception("Fallo al iniciar sesión en USGS.") from e
+    if session is None:
+        try:
+            session = login_usgs()
+        except Exception as e:
+            raise Exception("Fallo al iniciar sesión en USGS.") from e
+
+    # Resolver los assets contra el espejo local antes de recurrir a HTTP
+    if concurrency is None:
+        concurrency = new_concurrency_controller()
+    storage = get_storage_backend(session, concurrency=concurrency)
+
+    # Registro de descargas para poder verificarlas y reintentarlas
+    download_jobs = {}
+    expected_sizes = {}
 
     # Agrupar escenas por path/row y fecha para evitar duplicados
     scene_groups = {}
@@ -345,154 +668,55 @@ def download_images(features, scenes_needed, required_bands):
             scene_groups[key] = []
         scene_groups[key].append(scene)
     
-    # Descargar bandas para cada grupo de escenas
-    for i, (group_key, group_scenes) in enumerate(scene_groups.items()):
-        path, row, date = group_key.split("_")
-        scene_dir = os.path.join(download_path, f"scene_{path}_{row}_{date}")
-        os.makedirs(scene_dir, exist_ok=True)
-        
-        msg = f"\nProcesando grupo de escenas {i+1}/{len(scene_groups)}: Path={path}, Row={row}, Fecha={date}"
+    # Descargar primero y en paralelo los metadatos de todas las escenas
+    yield f"Descargando metadatos (MTL.json) de {len(scenes_needed)} escenas..."
+    _, fetched, total = prefetch_metadata(storage, features, scene_groups, download_path)
+    yield f"Metadatos descargados: {fetched}/{total}"
+
+    # Descargar los grupos de escenas en paralelo; la concurrencia real de
+    # transferencias por host la regula el controlador AIMD
+    messages = queue.Queue()
+
+    def run_group(index, group_key, group_scenes):
+        label = f"{index + 1}/{len(scene_groups)}"
+        for msg in download_scene_group(storage, features, group_key, group_scenes, required_bands,
+                                        download_path, download_jobs, expected_sizes, label):
+            messages.put(msg)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_DOWNLOAD_WORKERS, len(scene_groups)))) as executor:
+        futures = [executor.submit(run_group, i, key, group) for i, (key, group) in enumerate(scene_groups.items())]
+        last_report = time.monotonic()
+
+        while True:
+            try:
+                yield messages.get(timeout=0.2)
+            except queue.Empty:
+                if all(future.done() for future in futures):
+                    break
+
+            # Informar periódicamente la concurrencia y el rendimiento actuales
+            if time.monotonic() - last_report > METRICS_INTERVAL and concurrency.metrics():
+                last_report = time.monotonic()
+                yield f"Rendimiento de descarga:\n{concurrency.describe()}"
+
+        # Mensajes encolados entre el último get() y la comprobación de los futuros
+        while not messages.empty():
+            yield messages.get()
+
+        for future in futures:
+            error = future.exception()
+            if error:
+                msg = f"Error al descargar un grupo de escenas: {str(error)}"
+                print(msg)
+                yield msg
+
+    if concurrency.metrics():
+        msg = f"\nMétricas de descarga:\n{concurrency.describe()}"
         print(msg)
         yield msg
         
-        # Crear registro de bandas descargadas
-        downloaded_band_info = {band: False for band in required_bands}
-        
-        # Procesar primero las escenas ST si estamos buscando bandas ST
-        st_needed = any(collection.lower() == 'st' for band, collection in required_bands.items())
-        sr_needed = any(collection.lower() == 'sr' for band, collection in required_bands.items())
-        
-        # Ordenar las escenas: primero las ST si necesitamos bandas ST, luego las SR
-        if st_needed:
-            group_scenes.sort(key=lambda x: 0 if 'st' in x.get('collection', '').lower() else 1)
-        else:
-            group_scenes.sort(key=lambda x: 0 if 'sr' in x.get('collection', '').lower() else 1)
-        
-        # Procesar cada escena del grupo
-        for scene in group_scenes:
-            scene_id = scene['id']
-            collection = scene.get('collection', '').lower()
-            
-            # Buscar el feature correspondiente
-            target_feature = next((f for f in features if f.get('id') == scene_id), None)
-            
-            if not target_feature:
-                print(f"No se encontró la característica para {scene_id}")
-                continue
-            
-            print(f"Procesando escena {scene_id} de colección {collection}")
-            
-            # Determinar qué bandas descargar de esta escena según su colección
-            if 'sr' in collection:
-                # De una escena SR, intentar descargar todas las bandas SR requeridas
-                sr_bands = [band for band, coll in required_bands.items() 
-                           if coll.lower() == 'sr' and not downloaded_band_info[band]]
-                
-                for band in sr_bands:
-                    success = False
-                    for result in download_specific_band(session, target_feature, band, 'sr', scene_dir):
-                        if isinstance(result, bool):
-                            success = result
-                        else:
-                            yield result
-                    
-                    if success:
-                        downloaded_band_info[band] = True
-            
-            if 'st' in collection:
-                # De una escena ST, intentar descargar todas las bandas ST requeridas
-                st_bands = [band for band, coll in required_bands.items() 
-                           if coll.lower() == 'st' and not downloaded_band_info[band]]
-                
-                for band in st_bands:
-                    success = False
-                    for result in download_specific_band(session, target_feature, band, 'st', scene_dir):
-                        if isinstance(result, bool):
-                            success = result
-                        else:
-                            yield result
-                    
-                    if success:
-                        downloaded_band_info[band] = True
-                
-                # Si tenemos una escena ST y necesitamos bandas SR, buscar la correspondiente escena SR
-                #if sr_needed and any(not downloaded_band_info[band] for band, coll in required_bands.items() if coll.lower() == 'sr'):
-                    # Extraer información para buscar la correspondencia
-                    scene_info = extract_scene_info(target_feature)
-                    
-                    # Buscar un feature SR que coincida
-                    matching_sr = find_matching_feature(
-                        features, 
-                        scene_info['path'], 
-                        scene_info['row'], 
-                        scene_info['date'], 
-                        'landsat-c2l2-sr'
-                    )
-                    
-                    if matching_sr:
-                        print(f"Encontrada escena SR correspondiente: {matching_sr.get('id')}")
-                        
-                        # Descargar las bandas SR pendientes
-                        sr_bands = [band for band, coll in required_bands.items() 
-                                   if coll.lower() == 'sr' and not downloaded_band_info[band]]
-                        
-                        for band in sr_bands:
-                            success = False
-                            for result in download_specific_band(session, matching_sr, band, 'sr', scene_dir):
-                                if isinstance(result, bool):
-                                    success = result
-                                else:
-                                    yield result
-                            
-                            if success:
-                                downloaded_band_info[band] = True
-                    else:
-                        print("No se encontró escena SR correspondiente. Intentando construir URLs...")
-                        
-                        # Intentar construir URLs para las bandas SR pendientes
-                        sr_bands = [band for band, coll in required_bands.items() 
-                                   if coll.lower() == 'sr' and not downloaded_band_info[band]]
-                        
-                        # Obtener una URL base de la escena ST
-                        base_url = None
-                        for asset_key, asset_info in target_feature['assets'].items():
-                            if 'href' in asset_info and asset_info['href'].lower().endswith('.tif'):
-                                base_url = asset_info['href']
-                                break
-                        
-                        if base_url:
-                            # Convertir la URL base de ST a SR
-                            for band in sr_bands:
-                                sr_url = base_url.replace('_ST_', '_SR_').replace('_B10', f'_B{band[1:]}')
-                                
-                                try:
-                                    # Verificar si la URL existe
-                                    head_response = session.head(sr_url)
-                                    if head_response.status_code == 200:
-                                        print(f"Construida URL para banda {band}: {sr_url}")
-                                        
-                                        # Descargar la banda
-                                        file_name = os.path.join(scene_dir, f"{scene_info['id']}_SR_{band}.TIF")
-                                        
-                                        msg = f"Descargando: {os.path.basename(file_name)}"
-                                        print(msg)
-                                        yield msg
-                                        
-                                        with session.get(sr_url, stream=True) as response:
-                                            response.raise_for_status()
-                                            with open(file_name, 'wb') as file:
-                                                for chunk in response.iter_content(chunk_size=8192):
-                                                    file.write(chunk)
-                                        
-                                        print(f"Descargado: {file_name}")
-                                        downloaded_band_info[band] = True
-                                except Exception as e:
-                                    print(f"Error descargando URL construida: {str(e)}")
-            
-            # Descargar metadatos para todas las escenas
-            download_metadata(session, target_feature, scene_dir)
-        
-       
+    # Verificar los TIF descargados antes de pasarlos a la etapa de mosaicos
+    yield from verify_and_requeue(storage, download_jobs, expected_sizes, verify_full_decode)
     
     yield "\nProceso de descarga finalizado."
     return download_path
\ No newline at end of file
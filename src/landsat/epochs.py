@@ -0,0 +1,138 @@
+import os
+import queue
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from .metadata import MetadataCache
+
+# Raíz de los datos de trabajo; LANDSAT_DATA_ROOT permite usar otra (p. ej. en benchmarks)
+DATA_ROOT = Path(os.environ.get("LANDSAT_DATA_ROOT") or Path(__file__).parent.parent.parent / "data")
+# Polígono del área de interés (importado o generado)
+SOURCE_PATH = DATA_ROOT / "temp" / "source"
+# Mosaicos completos y sus manifiestos, fuera de temp/ y exports/ (la interfaz los
+# vacía en cada ejecución) para que la actualización incremental los reutilice
+MOSAIC_CACHE_PATH = DATA_ROOT / "cache" / "mosaic"
+
+PRIMARY = "primary"
+COMPARISON = "comparison"
+
+# Etiqueta de los mensajes de progreso de cada época
+EPOCH_LABELS = {PRIMARY: "", COMPARISON: "[comparación] "}
+
+
+def epoch_paths(epoch=PRIMARY):
+    """
+    Carpetas de trabajo de una época. La principal usa las rutas de siempre;
+    la de comparación tiene sus propias descargas, procesados y exportaciones.
+    Los mosaicos de cada época se conservan en MOSAIC_CACHE_PATH.
+    """
+    if epoch == PRIMARY:
+        temp = DATA_ROOT / "temp"
+        exports = DATA_ROOT / "exports"
+    else:
+        temp = DATA_ROOT / "temp" / epoch
+        exports = DATA_ROOT / "exports" / epoch
+
+    return {
+        "downloads": temp / "downloads",
+        "mosaic": MOSAIC_CACHE_PATH / epoch,
+        "clip": temp / "processed" / "clip",
+        "exports": exports,
+        "indices": exports / "indices",
+    }
+
+
+def comparison_enabled(config):
+    return bool(config.get("diff_date_enabled") and config.get("diff_start_date") and config.get("diff_end_date"))
+
+
+def epoch_configs(config):
+    """
+    Devuelve [(época, configuración)]: la principal y, si está habilitada,
+    la de comparación con sus fechas en start_date/end_date.
+    """
+    epochs = [(PRIMARY, config)]
+    if comparison_enabled(config):
+        comparison = dict(config)
+        comparison["start_date"] = config["diff_start_date"]
+        comparison["end_date"] = config["diff_end_date"]
+        epochs.append((COMPARISON, comparison))
+    return epochs
+
+
+def run_generators_concurrently(generators):
+    """
+    Ejecuta en paralelo varios generadores de mensajes ({etiqueta: generador}),
+    reenvía sus mensajes con la etiqueta como prefijo y devuelve
+    {etiqueta: valor de retorno}. Si alguno falla se relanza su excepción.
+    """
+    messages = queue.Queue()
+    results = {}
+
+    def drain(label, generator):
+        try:
+            while True:
+                message = next(generator)
+                messages.put(f"{label}{message}" if isinstance(message, str) else message)
+        except StopIteration as e:
+            results[label] = e.value
+
+    with ThreadPoolExecutor(max_workers=len(generators)) as executor:
+        futures = [executor.submit(drain, label, generator) for label, generator in generators.items()]
+        while True:
+            try:
+                yield messages.get(timeout=0.2)
+            except queue.Empty:
+                if all(future.done() for future in futures):
+                    break
+        while not messages.empty():
+            yield messages.get()
+
+        for future in futures:
+            future.result()
+
+    return results
+
+
+def link_or_copy(source, destination):
+    """
+    Enlaza `source` en `destination` con un enlace duro, o lo copia si el sistema
+    de archivos no lo permite. Un archivo previo en el destino se reemplaza.
+    """
+    if os.path.lexists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+    return destination
+
+
+def share_scene_dirs(source_path, target_path, scene_dirs):
+    """
+    Comparte carpetas de escenas ya descargadas con otra época mediante enlaces
+    duros (o copias si el sistema de archivos no los permite) y añade sus
+    registros a la caché de metadatos de destino.
+    Devuelve el número de archivos compartidos.
+    """
+    source_cache = MetadataCache(source_path).load()
+    target_cache = MetadataCache(target_path).load()
+
+    linked = 0
+    for scene_dir in scene_dirs:
+        source = Path(source_path) / scene_dir
+        target = Path(target_path) / scene_dir
+        if not source.is_dir():
+            continue
+        target.mkdir(parents=True, exist_ok=True)
+        for file in source.iterdir():
+            destination = target / file.name
+            if not file.is_file() or destination.exists():
+                continue
+            link_or_copy(file, destination)
+            linked += 1
+        for record in source_cache.for_scene_dir(scene_dir):
+            target_cache.put(record)
+
+    target_cache.save()
+    return linked
@@ -0,0 +1,104 @@
+import json
+import numpy as np
+import shapely
+from shapely import STRtree
+from .projection import GEOGRAPHIC_CRS, project
+
+BOUND_KEYS = ['landsat:bounds_west', 'landsat:bounds_south', 'landsat:bounds_east', 'landsat:bounds_north']
+
+
+def get_footprints_from_features(features):
+    """
+    Construye en bloque las huellas de todas las características como un arreglo
+    de geometrías shapely (None donde no se puede determinar la huella).
+    """
+    footprints = np.full(len(features), None, dtype=object)
+
+    # Huellas GeoJSON: se interpretan todas en una sola llamada a GEOS
+    with_geometry = [i for i, feature in enumerate(features) if feature.get('geometry')]
+    if with_geometry:
+        footprints[with_geometry] = shapely.from_geojson(
+            [json.dumps(features[i]['geometry']) for i in with_geometry]
+        )
+
+    # Huellas a partir de los límites en las propiedades
+    with_bounds = [
+        i for i, feature in enumerate(features)
+        if not feature.get('geometry') and all(k in feature.get('properties', {}) for k in BOUND_KEYS)
+    ]
+    if with_bounds:
+        bounds = np.array([[features[i]['properties'][k] for k in BOUND_KEYS] for i in with_bounds], dtype=float)
+        footprints[with_bounds] = shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3])
+
+    return footprints
+
+
+class FootprintIndex:
+    """
+    Índice espacial (STRtree) de las huellas de un catálogo de escenas.
+    Se construye una vez por búsqueda y responde qué escenas intersectan
+    una geometría (el AOI, cada una de sus partes o la vista de un mapa)
+    sin recorrer todas las huellas.
+    """
+
+    def __init__(self, features):
+        self.features = features
+        self.ids = [feature.get('id', f'Escena {i+1}') for i, feature in enumerate(features)]
+        self.footprints = get_footprints_from_features(features)
+
+        valid = ~shapely.is_missing(self.footprints)
+        self.missing = np.flatnonzero(~valid)
+        # Posición en `features` de cada geometría del árbol
+        self._tree_positions = np.flatnonzero(valid)
+        self.tree = STRtree(self.footprints[self._tree_positions])
+
+        self._positions = {}
+        for position, scene_id in enumerate(self.ids):
+            self._positions.setdefault(scene_id, position)
+
+    def __len__(self):
+        return len(self.features)
+
+    def position(self, scene_id):
+        """Posición de la escena en la lista de características (None si no existe)."""
+        return self._positions.get(scene_id)
+
+    def footprint(self, scene_id):
+        position = self.position(scene_id)
+        return self.footprints[position] if position is not None else None
+
+    def query(self, geometry, predicate="intersects"):
+        """Posiciones (ordenadas) de las escenas que cumplen el predicado con la geometría."""
+        shapely.prepare(geometry)
+        hits = self.tree.query(geometry, predicate=predicate)
+        return np.sort(self._tree_positions[hits])
+
+    def query_parts(self, geometry, predicate="intersects"):
+        """
+        Consulta cada parte de una geometría múltiple (p. ej. un AOI con varios
+        polígonos) en una sola llamada. Devuelve una lista de posiciones por parte.
+        """
+        parts = shapely.get_parts(geometry)
+        part_idx, hits = self.tree.query(parts, predicate=predicate)
+        positions = self._tree_positions[hits]
+        return [np.sort(positions[part_idx == i]) for i in range(len(parts))]
+
+    def query_bounds(self, min_x, min_y, max_x, max_y):
+        """Posiciones de las escenas visibles en una ventana (vista de un mapa)."""
+        return self.query(shapely.box(min_x, min_y, max_x, max_y))
+
+    def intersection_areas(self, geometry, area_crs=None):
+        """
+        Área de intersección de cada huella con la geometría (0 para las que no la
+        tocan). Solo se calcula la intersección exacta de los candidatos del índice.
+        Si se indica `area_crs`, las intersecciones se reproyectan en bloque a ese
+        CRS antes de medirlas.
+        """
+        areas = np.zeros(len(self.features), dtype=float)
+        candidates = self.query(geometry)
+        if len(candidates):
+            intersections = shapely.intersection(self.footprints[candidates], geometry)
+            if area_crs is not None:
+                intersections = project(intersections, GEOGRAPHIC_CRS, area_crs)
+            areas[candidates] = shapely.area(intersections)
+        return areas
@@ -0,0 +1,189 @@
+import json
+import math
+import os
+import rasterio
+import rasterio.shutil
+import rasterio.windows
+from rasterio.warp import transform_bounds
+from .compression import REFLECTANCE, compression_options
+
+# Versión 2: la firma de una escena es su tamaño, sin la fecha de modificación
+MANIFEST_VERSION = 2
+
+# Reescribir teselas comprimidas en modo r+ las añade al final del archivo (GDAL no
+# reutiliza el espacio de las anteriores). Tras una actualización el mosaico se
+# compacta si los bytes sin uso superan esta fracción de los datos vigentes
+MAX_WASTED_FRACTION = 0.25
+
+
+def manifest_path(mosaic_path):
+    """Ruta del manifiesto de un mosaico (mosaic_B4.tif -> mosaic_B4.manifest.json)."""
+    return os.path.splitext(str(mosaic_path))[0] + ".manifest.json"
+
+
+def grid_of(dataset):
+    """Rejilla de un raster: CRS, transform, tamaño, bandas y tipo de dato."""
+    return {
+        "crs": dataset.crs.to_wkt() if dataset.crs else None,
+        "transform": list(dataset.transform)[:6],
+        "width": dataset.width,
+        "height": dataset.height,
+        "count": dataset.count,
+        "dtype": dataset.dtypes[0],
+    }
+
+
+def source_entries(sorted_files, crs):
+    """
+    Entradas del manifiesto para las escenas de un mosaico, en orden de apilado:
+    archivo, nubosidad, firma y extensión en `crs`. La firma es el tamaño: las
+    descargas se repiten en cada ejecución y cambian la fecha de modificación,
+    y una escena reprocesada por USGS cambia de nombre.
+    """
+    entries = []
+    for file, cloud in sorted_files:
+        with rasterio.open(file) as src:
+            bounds = src.bounds if src.crs == crs else transform_bounds(src.crs, crs, *src.bounds)
+        entries.append({
+            "file": os.path.abspath(file),
+            "cloud": cloud,
+            "size": os.path.getsize(file),
+            "bounds": list(bounds),
+        })
+    return entries
+
+
+def load_manifest(mosaic_path):
+    path = manifest_path(mosaic_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def save_manifest(mosaic_path, grid, sources):
+    path = manifest_path(mosaic_path)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump({"version": MANIFEST_VERSION, "grid": grid, "sources": sources}, f, indent=2)
+    os.replace(temp_path, path)
+    return path
+
+
+def plan_update(manifest, grid, sources):
+    """
+    Compara el manifiesto del mosaico existente con las escenas actuales.
+    Devuelve la lista de extensiones que cambiaron (vacía si no hay cambios) o
+    None si hay que reconstruir todo: la rejilla cambió o las escenas que se
+    mantienen cambiaron de orden de apilado.
+    """
+    if manifest is None or manifest.get("grid") != grid:
+        return None
+
+    old = {entry["file"]: entry for entry in manifest["sources"]}
+    new = {entry["file"]: entry for entry in sources}
+    kept_old = [entry["file"] for entry in manifest["sources"] if entry["file"] in new]
+    kept_new = [entry["file"] for entry in sources if entry["file"] in old]
+    if kept_old != kept_new:
+        return None
+
+    changed = []
+    for entry in sources:
+        previous = old.get(entry["file"])
+        if previous is None:
+            changed.append(entry["bounds"])
+        elif previous["size"] != entry["size"]:
+            changed.extend([previous["bounds"], entry["bounds"]])
+    changed.extend(entry["bounds"] for file, entry in old.items() if file not in new)
+    return changed
+
+
+def changed_block_windows(dataset, bounds_list):
+    """Ventanas de los bloques internos de `dataset` que tocan alguna de las extensiones."""
+    block_height, block_width = dataset.block_shapes[0]
+    block_rows = math.ceil(dataset.height / block_height)
+    block_cols = math.ceil(dataset.width / block_width)
+    inverse = ~dataset.transform
+
+    blocks = set()
+    for min_x, min_y, max_x, max_y in bounds_list:
+        corners = [inverse * (x, y) for x in (min_x, max_x) for y in (min_y, max_y)]
+        col_start = max(0, math.floor(min(c for c, _ in corners)))
+        col_stop = min(dataset.width, math.ceil(max(c for c, _ in corners)))
+        row_start = max(0, math.floor(min(r for _, r in corners)))
+        row_stop = min(dataset.height, math.ceil(max(r for _, r in corners)))
+        if col_start >= col_stop or row_start >= row_stop:
+            continue
+        for block_row in range(row_start // block_height, min(block_rows, math.ceil(row_stop / block_height))):
+            for block_col in range(col_start // block_width, min(block_cols, math.ceil(col_stop / block_width))):
+                blocks.add((block_row, block_col))
+
+    return [
+        rasterio.windows.Window(
+            col * block_width, row * block_height,
+            min(block_width, dataset.width - col * block_width),
+            min(block_height, dataset.height - row * block_height)
+        )
+        for row, col in sorted(blocks)
+    ]
+
+
+def update_mosaic_blocks(mosaic_path, vrt_path, bounds_list):
+    """
+    Recalcula desde el VRT solo los bloques del mosaico que tocan las extensiones
+    cambiadas y los reescribe en el mismo archivo. Devuelve (bloques reescritos, total).
+    Con compresión el archivo crece con cada actualización; ver compact_mosaic.
+    """
+    with rasterio.open(vrt_path) as src, rasterio.open(mosaic_path, "r+") as dst:
+        windows = changed_block_windows(dst, bounds_list)
+        for window in windows:
+            dst.write(src.read(window=window), window=window)
+        block_height, block_width = dst.block_shapes[0]
+        total = math.ceil(dst.height / block_height) * math.ceil(dst.width / block_width)
+    return len(windows), total
+
+
+def wasted_bytes(mosaic_path):
+    """
+    Bytes del archivo fuera de las teselas vigentes (teselas reemplazadas y
+    cabeceras) y bytes de las teselas vigentes: (sin uso, vigentes).
+    """
+    with rasterio.open(mosaic_path) as src:
+        block_height, block_width = src.block_shapes[0]
+        block_rows = math.ceil(src.height / block_height)
+        block_cols = math.ceil(src.width / block_width)
+        live = sum(
+            src.block_size(band, row, col)
+            for band in src.indexes for row in range(block_rows) for col in range(block_cols)
+        )
+    return max(0, os.path.getsize(mosaic_path) - live), live
+
+
+def compact_mosaic(mosaic_path, max_wasted_fraction=MAX_WASTED_FRACTION):
+    """
+    Reescribe el mosaico sin las teselas reemplazadas si los bytes sin uso superan
+    `max_wasted_fraction` de los vigentes. El reemplazo es atómico.
+    Devuelve True si se compactó.
+    """
+    wasted, live = wasted_bytes(mosaic_path)
+    if wasted <= max_wasted_fraction * live:
+        return False
+
+    with rasterio.open(mosaic_path) as src:
+        block_height, block_width = src.block_shapes[0]
+        dtype = src.dtypes[0]
+    temp_path = f"{mosaic_path}.compact.tmp"
+    try:
+        rasterio.shutil.copy(
+            str(mosaic_path), temp_path, driver="GTiff", TILED="YES",
+            BLOCKXSIZE=block_width, BLOCKYSIZE=block_height, **compression_options(REFLECTANCE, dtype)
+        )
+        os.replace(temp_path, mosaic_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return True
@@ -7,6 +7,18 @@ import json
 import json
 from pathlib import Path
 import glob
+import threading
+from .metadata import get_download_metadata
+from .epochs import PRIMARY, epoch_paths
+from .raster_env import raster_env
+from .cog import finalize_raster
+from .compression import INDEX, apply_compression
+
+# pyplot no es seguro entre hilos; las épocas pueden calcular índices a la vez
+_plot_lock = threading.Lock()
+
+# Recorte multibanda entrelazado por píxel (ver mosaic.build_stacked_clip)
+STACK_FILE_NAME = "clips_stack.tif"
 
 def read_band(file_path):
     """
@@ -38,38 +50,9 @@ def get_required_bands_for_index(index_name):
     # Devuelve un diccionario que mapea bandas a colecciones
     return index_requirements.get(index_name, {})
 
-def find_metadata_files(base_path):
-    """
-    Busca archivos de metadatos MTL.json en la ruta dada y sus subdirectorios.
-    """
-    metadata_files = {
-        "sr": [],
-        "st": []
-    }
-    
-    # Buscar en la ruta base y todas las subcarpetas
-    for root, dirs, files in os.walk(base_path):
-        for file in files:
-            if file.endswith("MTL.json"):
-                file_path = os.path.join(root, file)
-                
-                # Determinar si es SR o ST
-                if "_SR_" in file or "_sr_" in file.lower():
-                    metadata_files["sr"].append(file_path)
-                elif "_ST_" in file or "_st_" in file.lower():
-                    metadata_files["st"].append(file_path)
-                else:
-                    # Si no está claro, intentar inferir de la ruta
-                    if "sr" in file_path.lower() and "st" not in file_path.lower():
-                        metadata_files["sr"].append(file_path)
-                    elif "st" in file_path.lower():
-                        metadata_files["st"].append(file_path)
-    
-    return metadata_files
-
-def load_thermal_constants(metadata_files):
+def load_thermal_constants(metadata_records):
     """
-    Carga las constantes térmicas desde un archivo de metadatos ST.
+    Carga las constantes térmicas desde los registros de metadatos ST (SceneMetadata).
     """
     # Valores por defecto en caso de error
     constants = {
@@ -79,36 +62,32 @@ def load_thermal_constants(metadata_files):
         "AL": 0.1,         # Aditivo radiancia
     }
     
-    if not metadata_files.get("st"):
-        print("No se encontraron archivos de metadatos ST. Usando valores por defecto.")
+    st_records = [record for record in metadata_records if record.collection == "st"]
+    if not st_records:
+        print("No se encontraron metadatos ST. Usando valores por defecto.")
         return constants
     
-    # Intentar cargar desde cada archivo hasta encontrar uno válido
-    for metadata_file in metadata_files["st"]:
-        try:
-            with open(metadata_file, 'r') as f:
-                metadata = json.load(f)
-            
-            # Extraer coeficientes de calibración para banda térmica
-            if "LANDSAT_METADATA_FILE" in metadata:
-                if "LEVEL2_SURFACE_TEMPERATURE_PARAMETERS" in metadata["LANDSAT_METADATA_FILE"]:
-                    thermal_constants = metadata["LANDSAT_METADATA_FILE"]["LEVEL2_SURFACE_TEMPERATURE_PARAMETERS"]
-                    constants["K1"] = float(thermal_constants["K1_CONSTANT_BAND_10"])
-                    constants["K2"] = float(thermal_constants["K2_CONSTANT_BAND_10"])
-                
-                if "LEVEL1_RADIOMETRIC_RESCALING" in metadata["LANDSAT_METADATA_FILE"]:
-                    calib = metadata["LANDSAT_METADATA_FILE"]["LEVEL1_RADIOMETRIC_RESCALING"]
-                    constants["ML"] = float(calib["RADIANCE_MULT_BAND_10"])
-                    constants["AL"] = float(calib["RADIANCE_ADD_BAND_10"])
-                
-                print(f"Constantes térmicas cargadas de {os.path.basename(metadata_file)}")
-                return constants
-        except Exception as e:
-            print(f"Error al cargar constantes de {metadata_file}: {e}")
+    # Usar el primer registro que tenga constantes térmicas
+    for record in st_records:
+        thermal_constants = record.thermal_constants()
+        if thermal_constants:
+            constants.update(thermal_constants)
+            print(f"Constantes térmicas cargadas de {record.scene_id}")
+            return constants
     
-    print("No se pudieron cargar constantes térmicas de los archivos. Usando valores por defecto.")
+    print("No se pudieron cargar constantes térmicas de los metadatos. Usando valores por defecto.")
     return constants
 
+def load_temperature_scaling(metadata_records):
+    """
+    Devuelve el factor de escala y el offset de la banda ST_B10 (Kelvin).
+    Usa los valores estándar de Collection 2 Level-2 si no están en los metadatos.
+    """
+    for record in metadata_records:
+        if record.collection == "st" and record.temperature_mult is not None and record.temperature_add is not None:
+            return record.temperature_mult, record.temperature_add
+    return 0.00341802, 149.0
+
 def find_band_files(clips_path, band_code, collection=None):
     """
     Busca archivos de bandas según el código de banda y la colección.
@@ -139,6 +118,60 @@ def find_band_files(clips_path, band_code, collection=None):
     # Si llegamos aquí, no se encontró ningún archivo
     return None
 
+def band_key(band, collection):
+    """Nombre de banda en los recortes y en el recorte multibanda (p. ej. "B4_SR")."""
+    return f"{band}_{collection.upper()}"
+
+def current_stack_file(clips_path):
+    """
+    Ruta del recorte multibanda si existe y es posterior a todos los recortes por
+    banda de la carpeta; un recorte multibanda de una ejecución anterior no se usa.
+    """
+    stack_file = os.path.join(clips_path, STACK_FILE_NAME)
+    if not os.path.exists(stack_file):
+        return None
+    stack_mtime = os.path.getmtime(stack_file)
+    if any(os.path.getmtime(clip) > stack_mtime for clip in glob.glob(os.path.join(clips_path, "clip_*.tif"))):
+        print(f"{STACK_FILE_NAME} es anterior a los recortes por banda; se ignora")
+        return None
+    return stack_file
+
+def stacked_band_names(clips_path):
+    """Bandas del recorte multibanda vigente (lista vacía si no hay)."""
+    stack_file = current_stack_file(clips_path)
+    if stack_file is None:
+        return []
+    try:
+        with rasterio.open(stack_file) as src:
+            return json.loads(src.tags().get("BANDS", "[]")) or list(src.descriptions)
+    except Exception as e:
+        print(f"Error al leer el recorte multibanda: {str(e)}")
+        return []
+
+def load_stacked_bands(clips_path, band_keys):
+    """
+    Lee del recorte multibanda vigente (STACK_FILE_NAME) solo las bandas pedidas
+    que contenga, en una sola lectura: al estar entrelazado por píxel, cada bloque
+    se descomprime una vez para todas ellas.
+    Devuelve ({banda: array float32}, profile de una banda) o ({}, None) si no existe.
+    """
+    names = stacked_band_names(clips_path)
+    indexes = {key: names.index(key) + 1 for key in sorted(band_keys) if key in names}
+    if not indexes:
+        return {}, None
+
+    try:
+        with rasterio.open(os.path.join(clips_path, STACK_FILE_NAME)) as src:
+            print(f"Cargando bandas {', '.join(indexes)} desde {STACK_FILE_NAME}...")
+            data = src.read(list(indexes.values()), out_dtype=np.float32)
+            profile = src.profile.copy()
+    except Exception as e:
+        print(f"Error al leer el recorte multibanda: {str(e)}")
+        return {}, None
+
+    profile.update(count=1, interleave="band")
+    return {key: data[i] for i, key in enumerate(indexes)}, profile
+
 def process_indices_from_cutouts(clips_path, output_path, selected_indices):
     """
     Procesa los índices a partir de recortes generados previamente.
@@ -164,12 +197,15 @@ def process_indices_from_cutouts(clips_path, output_path, selected_indices):
         print("No se encontró máscara del área de interés. Se procesará toda la imagen.")
         area_mask = None
     
-    # Buscar archivos de metadatos
+    # Leer los metadatos ya interpretados de las escenas descargadas
     download_path = Path(clips_path).parent.parent / "downloads"
-    metadata_files = find_metadata_files(download_path)
-    thermal_constants = load_thermal_constants(metadata_files)
+    metadata_records = get_download_metadata(download_path)
+    thermal_constants = load_thermal_constants(metadata_records)
     
     print(f"Constantes térmicas: K1={thermal_constants['K1']}, K2={thermal_constants['K2']}")
+
+    # Bandas disponibles en el recorte multibanda; cada índice lee solo las suyas
+    stacked_bands = set(stacked_band_names(clips_path))
     
     # Verificar qué índices podemos calcular
     calculable_indices = []
@@ -181,6 +217,8 @@ def process_indices_from_cutouts(clips_path, output_path, selected_indices):
         
         # Verificar cada banda requerida
         for band, collection in required_bands.items():
+            if band_key(band, collection) in stacked_bands:
+                continue
             band_file = find_band_files(clips_path, band, collection)
             if not band_file:
                 missing_bands.append(f"{band} ({collection})")
@@ -217,8 +255,17 @@ def process_indices_from_cutouts(clips_path, output_path, selected_indices):
             # Cargar las bandas
             band_data = {}
             band_profile = None
+            index_stack, stacked_profile = load_stacked_bands(
+                clips_path, {band_key(band, collection) for band, collection in required_bands.items()}
+            )
             
             for band, collection in required_bands.items():
+                if band_key(band, collection) in index_stack:
+                    band_data[band] = index_stack[band_key(band, collection)]
+                    if band_profile is None:
+                        band_profile = stacked_profile.copy()
+                    continue
+
                 band_file = find_band_files(clips_path, band, collection)
                 if band_file:
                     print(f"Cargando banda {band} desde {os.path.basename(band_file)}...")
@@ -367,9 +414,8 @@ def process_indices_from_cutouts(clips_path, output_path, selected_indices):
                 
                 
                 print("Aplicando conversión estándar para Landsat 8 Collection 2 Level-2 ST")
-                # Factor de escala y offset de la documentación del USGS
-                scale_factor = 0.00341802
-                add_offset = 149.0
+                # Factor de escala y offset de los metadatos (o de la documentación del USGS)
+                scale_factor, add_offset = load_temperature_scaling(metadata_records)
                     
                 # Convertir a temperatura en Kelvin
                 kelvin_temp = thermal_data * scale_factor + add_offset
@@ -398,8 +444,9 @@ def process_indices_from_cutouts(clips_path, output_path, selected_indices):
                 print(f"Índice {index} no implementado")
                 continue
             
-            # Actualizar el perfil para 32 bits
+            # Actualizar el perfil para 32 bits, con la compresión de los índices
             band_profile.update(dtype=rasterio.float32)
+            apply_compression(band_profile, INDEX)
             
             # Guardar el índice como archivo GeoTIFF
             with rasterio.open(tiff_path, 'w', **band_profile) as dst:
@@ -407,26 +454,28 @@ def process_indices_from_cutouts(clips_path, output_path, selected_indices):
                 result_data_clean = np.where(np.isnan(index_data), -9999, index_data)
                 dst.write(result_data_clean.astype(np.float32), 1)
             
+            finalize_raster(tiff_path, INDEX)
             print(f"Índice {index} guardado en {tiff_path}")
             
             # Generar visualización del índice
             print(f"Generando visualización para {index}...")
-            plt.figure(figsize=(12, 8))
-            
             # Enmascarar valores nodata o NaN
             masked_data = np.ma.masked_where(
                 (np.isnan(index_data)) | (index_data == -9999), 
                 index_data
             )
             
-            # Crear visualización con escala de colores apropiada
-            plt.imshow(masked_data, cmap=plt.get_cmap(cmap_name), norm=Normalize(vmin=vmin, vmax=vmax))
-            plt.colorbar(label=index)
-            plt.title(title)
-            
-            # Guardar como imagen PNG
-            plt.savefig(png_path, dpi=300, bbox_inches='tight')
-            plt.close()
+            with _plot_lock:
+                plt.figure(figsize=(12, 8))
+
+                # Crear visualización con escala de colores apropiada
+                plt.imshow(masked_data, cmap=plt.get_cmap(cmap_name), norm=Normalize(vmin=vmin, vmax=vmax))
+                plt.colorbar(label=index)
+                plt.title(title)
+
+                # Guardar como imagen PNG
+                plt.savefig(png_path, dpi=300, bbox_inches='tight')
+                plt.close()
             
             print(f"Visualización guardada en {png_path}")
             
@@ -456,14 +505,14 @@ def process_indices_from_cutouts(clips_path, output_path, selected_indices):
     
     return output_files
 
-def process_indices_from_cutouts_wrapper(selected_indices):
+def process_indices_from_cutouts_wrapper(selected_indices, epoch=PRIMARY):
     """
     Función envoltorio para procesar índices desde recortes.
+    `epoch` elige las carpetas de recortes y de salida.
     """
 
-    # Ruta basada en la ubicación del script
-    script_dir = Path(__file__).parent  # Carpeta donde está el script
-    clips_path = script_dir.parent.parent / "data" / "temp" / "processed" / "clip"
+    paths = epoch_paths(epoch)
+    clips_path = paths["clip"]
 
     try:
         # Verificar que la ruta de recortes existe
@@ -481,12 +530,13 @@ def process_indices_from_cutouts_wrapper(selected_indices):
         yield msg
         
         # Crear directorio para salida    
-        output_path = script_dir.parent.parent / "data" / "exports" / "indices"
+        output_path = paths["indices"]
         os.makedirs(output_path, exist_ok=True)
         
         # Llamar a la función principal con manejo de errores
         try:
-            results = process_indices_from_cutouts(clips_path, output_path, selected_indices)
+            with raster_env():
+                results = process_indices_from_cutouts(clips_path, output_path, selected_indices)
         except Exception as e:
             raise Exception(f"Error al procesar índices: {str(e)}")
         
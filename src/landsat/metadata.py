@@ -0,0 +1,196 @@
+import os
+import json
+import glob
+import threading
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+
+CACHE_FILE_NAME = "metadata_cache.json"
+
+
+@dataclass(frozen=True)
+class SceneMetadata:
+    """Registro compacto con los campos del MTL.json que usan las etapas de procesamiento."""
+    scene_id: str
+    collection: str = ""
+    scene_dir: str = ""
+    cloud_cover: float = None
+    cloud_cover_land: float = None
+    sun_azimuth: float = None
+    sun_elevation: float = None
+    reflectance_mult: dict = field(default_factory=dict)
+    reflectance_add: dict = field(default_factory=dict)
+    temperature_mult: float = None
+    temperature_add: float = None
+    k1: float = None
+    k2: float = None
+    radiance_mult: float = None
+    radiance_add: float = None
+
+    def thermal_constants(self):
+        """Constantes de la banda 10 en el formato de indices.load_thermal_constants."""
+        constants = {"K1": self.k1, "K2": self.k2, "ML": self.radiance_mult, "AL": self.radiance_add}
+        return {key: value for key, value in constants.items() if value is not None}
+
+
+def _float(section, key):
+    try:
+        return float(section[key])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def parse_mtl(data, scene_id, collection="", scene_dir=""):
+    """Convierte el contenido de un MTL.json en un SceneMetadata."""
+    mtl = data.get("LANDSAT_METADATA_FILE", {})
+    image = mtl.get("IMAGE_ATTRIBUTES", {})
+    reflectance = mtl.get("LEVEL2_SURFACE_REFLECTANCE_PARAMETERS", {})
+    temperature = mtl.get("LEVEL2_SURFACE_TEMPERATURE_PARAMETERS", {})
+    thermal = mtl.get("LEVEL1_THERMAL_CONSTANTS", {})
+    radiometric = mtl.get("LEVEL1_RADIOMETRIC_RESCALING", {})
+
+    reflectance_mult, reflectance_add = {}, {}
+    for key in reflectance:
+        if key.startswith("REFLECTANCE_MULT_BAND_"):
+            reflectance_mult[f"B{key.rsplit('_', 1)[-1]}"] = _float(reflectance, key)
+        elif key.startswith("REFLECTANCE_ADD_BAND_"):
+            reflectance_add[f"B{key.rsplit('_', 1)[-1]}"] = _float(reflectance, key)
+
+    # Algunas versiones del MTL incluyen K1/K2 en los parámetros de temperatura
+    k1 = _float(thermal, "K1_CONSTANT_BAND_10")
+    k2 = _float(thermal, "K2_CONSTANT_BAND_10")
+    if k1 is None:
+        k1 = _float(temperature, "K1_CONSTANT_BAND_10")
+    if k2 is None:
+        k2 = _float(temperature, "K2_CONSTANT_BAND_10")
+
+    return SceneMetadata(
+        scene_id=scene_id,
+        collection=collection,
+        scene_dir=scene_dir,
+        cloud_cover=_float(image, "CLOUD_COVER"),
+        cloud_cover_land=_float(image, "CLOUD_COVER_LAND"),
+        sun_azimuth=_float(image, "SUN_AZIMUTH"),
+        sun_elevation=_float(image, "SUN_ELEVATION"),
+        reflectance_mult=reflectance_mult,
+        reflectance_add=reflectance_add,
+        temperature_mult=_float(temperature, "TEMPERATURE_MULT_BAND_ST_B10"),
+        temperature_add=_float(temperature, "TEMPERATURE_ADD_BAND_ST_B10"),
+        k1=k1,
+        k2=k2,
+        radiance_mult=_float(radiometric, "RADIANCE_MULT_BAND_10"),
+        radiance_add=_float(radiometric, "RADIANCE_ADD_BAND_10"),
+    )
+
+
+def parse_mtl_file(file_path, scene_id=None, collection="", scene_dir=""):
+    """Lee y convierte un archivo MTL.json."""
+    with open(file_path, 'r') as f:
+        data = json.load(f)
+    if scene_id is None:
+        scene_id = os.path.basename(file_path).replace("_MTL.json", "")
+    return parse_mtl(data, scene_id, collection, scene_dir)
+
+
+class MetadataCache:
+    """
+    Caché de SceneMetadata por id de escena, persistido como JSON en la
+    carpeta de descargas para que las etapas posteriores no vuelvan a leer
+    ni a interpretar los MTL.json.
+    """
+
+    def __init__(self, download_path):
+        self.download_path = Path(download_path)
+        self.cache_file = self.download_path / CACHE_FILE_NAME
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def put(self, record):
+        with self._lock:
+            self._records[record.scene_id] = record
+
+    def get(self, scene_id):
+        return self._records.get(scene_id)
+
+    def records(self):
+        return list(self._records.values())
+
+    def for_scene_dir(self, scene_dir):
+        """Registros de las escenas guardadas en una carpeta scene_*."""
+        name = os.path.basename(os.path.normpath(str(scene_dir)))
+        return [record for record in self._records.values() if record.scene_dir == name]
+
+    def by_collection(self, collection):
+        return [record for record in self._records.values() if record.collection == collection]
+
+    def save(self):
+        os.makedirs(self.download_path, exist_ok=True)
+        with self._lock:
+            data = {scene_id: asdict(record) for scene_id, record in self._records.items()}
+        with open(self.cache_file, 'w') as f:
+            json.dump({"scenes": data}, f, indent=2)
+
+    def load(self):
+        if self.cache_file.exists():
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+            for values in data.get("scenes", {}).values():
+                self.put(SceneMetadata(**values))
+        return self
+
+
+_loaded_caches = {}
+
+
+def load_metadata_cache(download_path):
+    """
+    Devuelve la caché de metadatos de una carpeta de descargas.
+    Se lee del disco una sola vez mientras el archivo no cambie.
+    """
+    cache = MetadataCache(download_path)
+    try:
+        mtime = os.path.getmtime(cache.cache_file)
+    except OSError:
+        return cache
+
+    key = str(cache.cache_file)
+    cached = _loaded_caches.get(key)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    cache.load()
+    _loaded_caches[key] = (mtime, cache)
+    return cache
+
+
+def get_scene_dir_metadata(scene_dir):
+    """
+    Devuelve los SceneMetadata de una carpeta scene_*. Si la caché no los
+    tiene (descargas antiguas), interpreta los MTL.json de la carpeta.
+    """
+    cache = load_metadata_cache(Path(scene_dir).parent)
+    records = cache.for_scene_dir(scene_dir)
+    if records:
+        return records
+
+    name = os.path.basename(os.path.normpath(str(scene_dir)))
+    records = []
+    for mtl_file in glob.glob(os.path.join(scene_dir, "*MTL.json")):
+        try:
+            collection = "st" if "_ST_" in os.path.basename(mtl_file) else "sr"
+            records.append(parse_mtl_file(mtl_file, collection=collection, scene_dir=name))
+        except Exception as e:
+            print(f"Error al leer archivo de info: {str(e)}")
+    return records
+
+
+def get_download_metadata(download_path):
+    """Devuelve los SceneMetadata de todas las escenas de una carpeta de descargas."""
+    cache = load_metadata_cache(download_path)
+    if cache.records():
+        return cache.records()
+
+    records = []
+    for scene_dir in glob.glob(os.path.join(str(download_path), "scene_*")):
+        records.extend(get_scene_dir_metadata(scene_dir))
+    return records
@@ -1,10 +1,14 @@
 import os
 import glob
+import math
 import json
-from rasterio.mask import mask
+from rasterio.mask import geometry_window
+from rasterio import features
+import rasterio.windows
+from rasterio.crs import CRS
+from rasterio.warp import transform_bounds
 import geopandas as gpd
 from osgeo import gdal
-from pathlib import Path
 import subprocess
 import rasterio
 from shapely.geometry import mapping, box
@@ -12,12 +16,333 @@ import traceback
 import re
 import numpy as np
 import shutil
+import threading
+from collections import OrderedDict
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .verification import verify_downloads
+from .metadata import get_scene_dir_metadata
+from .epochs import PRIMARY, SOURCE_PATH, epoch_paths, link_or_copy
+from .raster_env import RASTER_THREAD_BUDGET, configure_gdal, raster_env
+from .projection import GEOGRAPHIC_CRS, common_utm_crs
+from .indices import STACK_FILE_NAME
+from .cog import COG_OUTPUT, finalize_raster
+from .compression import MASK, REFLECTANCE, apply_compression, gtiff_creation_options
+from .incremental import (compact_mosaic, grid_of, load_manifest, manifest_path, plan_update, save_manifest,
+                          source_entries, update_mosaic_blocks)
 gdal.UseExceptions()
+configure_gdal()
+
+# Recortar directamente desde el VRT de cada banda con un solo gdal.Warp, sin
+# escribir el mosaico completo en disco. Se activa con LANDSAT_FUSED_CLIP=1 o con
+# la opción "fused_clip" de la configuración: en ese modo no se generan los
+# mosaic_<banda>.tif ni se aprovecha la actualización incremental de mosaicos
+FUSED_MOSAIC_CLIP = os.environ.get("LANDSAT_FUSED_CLIP", "").lower() in ("1", "true", "yes")
+
+# El presupuesto global de hilos (raster_env.RASTER_THREAD_BUDGET) se reparte
+# entre las bandas que se procesan en paralelo y los hilos internos de GDAL de
+# cada una (GDAL libera el GIL, así que basta con hilos)
+MAX_PARALLEL_BANDS = 4
+
+# Memoria máxima (MB) para los píxeles de un recorte en curso; el recorte se lee y
+# escribe por franjas de bloques de CLIP_BLOCK_SIZE filas
+CLIP_MEMORY_BUDGET_MB = int(os.environ.get("LANDSAT_CLIP_MEMORY_MB", "256"))
+CLIP_BLOCK_SIZE = 512
+
+# Generar además un recorte multibanda entrelazado por píxel para el cálculo de índices
+STACKED_CLIP = False
+
+# Actualizar un mosaico existente reescribiendo solo los bloques que tocan escenas
+# nuevas, modificadas o retiradas (según su manifiesto mosaic_<banda>.manifest.json).
+# Los mosaicos se guardan en epochs.MOSAIC_CACHE_PATH, que sobrevive entre ejecuciones.
+# No se aplica con salida COG: escribir en el archivo invalida su estructura
+INCREMENTAL_MOSAIC = True
+
+# Cupos de bandas compartidos por todas las llamadas (p. ej. las dos épocas a la vez)
+_band_slots = threading.BoundedSemaphore(MAX_PARALLEL_BANDS)
+# Todas las bandas de una época escriben la misma aoi_mask.tif
+_mask_lock = threading.Lock()
+# Resultado de un trabajo por banda que no empezó porque se pidió detener
+_SKIPPED = object()
+
+def split_thread_budget(n_bands, budget=RASTER_THREAD_BUDGET, max_parallel=MAX_PARALLEL_BANDS):
+    """
+    Reparte el presupuesto de hilos: devuelve (bandas en paralelo, hilos de GDAL por banda).
+    """
+    workers = max(1, min(n_bands, max_parallel, budget))
+    return workers, max(1, budget // workers)
+
+def creation_options(num_threads=1, dtype="uint16"):
+    """Opciones de creación GTiff de reflectancia (ver compression.py) con compresión en `num_threads` hilos."""
+    return gtiff_creation_options(REFLECTANCE, dtype, num_threads)
+
+def run_band_jobs(jobs, max_workers, should_stop=None):
+    """
+    Ejecuta en paralelo los trabajos por banda ({banda: función sin argumentos}) y
+    genera (banda, resultado, error) a medida que terminan. Si should_stop()
+    se vuelve verdadero, cancela las bandas que aún no empezaron y termina.
+    Como mucho MAX_PARALLEL_BANDS bandas se procesan a la vez en todo el proceso.
+    Cada trabajo corre dentro del entorno raster configurado. Las bandas que no
+    llegaron a empezar por la cancelación no se generan.
+    """
+    def run(job):
+        with _band_slots:
+            if should_stop is not None and should_stop():
+                return _SKIPPED
+            with raster_env():
+                return job()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run, job): band for band, job in jobs.items()}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                band = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error al procesar banda {band}: {str(e)}")
+                    print(traceback.format_exc())
+                    yield band, None, e
+                    continue
+                if result is not _SKIPPED:
+                    yield band, result, None
+            if should_stop is not None and should_stop():
+                for future in pending:
+                    future.cancel()
+                return
+
+def rows_per_chunk(width, count, dtype, memory_budget_mb=CLIP_MEMORY_BUDGET_MB, block_size=CLIP_BLOCK_SIZE):
+    """
+    Filas por franja para no superar el presupuesto de memoria: múltiplo del bloque
+    si el presupuesto alcanza para una franja de bloques; si no, las filas que
+    quepan (al menos una).
+    """
+    row_bytes = max(1, width * count * np.dtype(dtype).itemsize)
+    rows = int(memory_budget_mb * 1024 * 1024) // row_bytes
+    if rows >= block_size:
+        return rows // block_size * block_size
+    return max(1, rows)
+
+def write_aoi_mask(mask_file, profile, grid=None, memory_budget_mb=CLIP_MEMORY_BUDGET_MB):
+    """
+    Guarda la máscara binaria del área de interés en la rejilla de `profile`,
+    rasterizando el polígono de `grid` por franjas. Sin polígono (o con un
+    AoiGrid completo) la máscara cubre todo el raster.
+    """
+    mask_meta = profile.copy()
+    mask_meta.update({
+        "count": 1,
+        "dtype": "uint8",
+        "nodata": 0
+    })
+    apply_compression(mask_meta, MASK)
+    height, width = mask_meta["height"], mask_meta["width"]
+    step = rows_per_chunk(width, 1, np.uint8, memory_budget_mb)
+    with _mask_lock:
+        with rasterio.open(mask_file, "w", **mask_meta) as dest:
+            for row in range(0, height, step):
+                rows = min(step, height - row)
+                if grid is None or grid.full:
+                    strip = np.ones((rows, width), dtype=np.uint8)
+                else:
+                    strip = grid.mask_strip(row, rows)
+                dest.write(strip, 1, window=rasterio.windows.Window(0, row, width, rows))
+    return mask_file
+
+def write_clip_windowed(src, grid, output_file, out_meta, memory_budget_mb=CLIP_MEMORY_BUDGET_MB):
+    """
+    Escribe el recorte de `src` en la ventana del AOI por franjas de bloques,
+    rasterizando para cada una su parte de la máscara. La memoria de píxeles
+    (datos y máscara) queda acotada por `memory_budget_mb` sea cual sea el
+    tamaño del AOI.
+    """
+    col_off, row_off = int(grid.window.col_off), int(grid.window.row_off)
+    height, width = out_meta["height"], out_meta["width"]
+    nodata = src.nodata if src.nodata is not None else 0
+    # La máscara de la franja ocupa un byte por píxel además de los datos
+    pixel_bytes = src.count * np.dtype(src.dtypes[0]).itemsize + 1
+    step = rows_per_chunk(width, pixel_bytes, np.uint8, memory_budget_mb)
+
+    with rasterio.open(output_file, "w", **out_meta) as dest:
+        for row in range(0, height, step):
+            rows = min(step, height - row)
+            data = src.read(window=rasterio.windows.Window(col_off, row_off + row, width, rows))
+            data[:, grid.mask_strip(row, rows) == 0] = nodata
+            dest.write(data, window=rasterio.windows.Window(0, row, width, rows))
+    return output_file
+
+def is_path_row_polygon(polygon_gdf, polygon_path):
+    """
+    Indica si el archivo de polígono corresponde al modo path/row, en el que
+    se conserva el mosaico completo sin recortar.
+    """
+    try:
+        if polygon_gdf.empty or polygon_gdf.geometry.is_empty.all():
+            return True
+        # Verificar si el archivo es del tipo "source_file" (generado) o no
+        return not os.path.basename(polygon_path).startswith("source_file")
+    except:
+        return True
+
+class AoiGrid:
+    """
+    Polígono del AOI preparado para la rejilla de un raster: geometrías en su CRS,
+    ventana de recorte y su transform. La máscara no se guarda: se rasteriza por
+    franjas al escribir, para que la memoria no crezca con el tamaño del AOI.
+    Sin geometrías (modo path/row o sin intersección) se conserva el raster completo.
+    """
+
+    def __init__(self, crs, geometries=None, window=None, transform=None, bounds=None, source=None):
+        self.crs = crs
+        self.geometries = geometries
+        self.window = window
+        self.transform = transform
+        self.bounds = bounds
+        # (ruta, mtime) del polígono: identifica el AOI al compartir máscaras
+        self.source = source
+        self._cutline_file = None
+        self._lock = threading.Lock()
+
+    @property
+    def full(self):
+        return self.geometries is None
+
+    @property
+    def shape(self):
+        """(filas, columnas) de la ventana del recorte."""
+        return int(self.window.height), int(self.window.width)
+
+    def mask_strip(self, row, rows):
+        """
+        Máscara del AOI (1 dentro, 0 fuera, con all_touched como rasterio.mask)
+        para las filas [row, row + rows) de la ventana del recorte.
+        """
+        width = self.shape[1]
+        strip = rasterio.windows.Window(0, row, width, rows)
+        return features.rasterize(
+            [(geom, 1) for geom in self.geometries],
+            out_shape=(rows, width),
+            transform=rasterio.windows.transform(strip, self.transform),
+            fill=0,
+            all_touched=True,
+            dtype=np.uint8
+        )
+
+    def write_mask(self, mask_file, profile):
+        """
+        Escribe aoi_mask.tif. La máscara se rasteriza una sola vez por AOI y rejilla
+        de recorte; las demás carpetas de recortes (otras épocas sobre la misma
+        rejilla) reciben un enlace duro o una copia de la primera.
+        """
+        mask_file = os.path.abspath(mask_file)
+        key = (self.source, mask_grid_key(profile))
+        with _aoi_masks_lock:
+            written = [f for f in _aoi_masks.pop(key, []) if os.path.exists(f)]
+            _aoi_masks[key] = written
+            if len(_aoi_masks) > AOI_GRID_CACHE_SIZE:
+                _aoi_masks.popitem(last=False)
+            if mask_file in written:
+                return mask_file
+            if written:
+                link_or_copy(written[0], mask_file)
+            else:
+                # Un archivo previo puede estar enlazado con otra época: no escribir sobre él
+                if os.path.exists(mask_file):
+                    os.remove(mask_file)
+                write_aoi_mask(mask_file, profile, self)
+                finalize_raster(mask_file, MASK)
+            written.append(mask_file)
+        return mask_file
+
+    def cutline_file(self, temp_dir):
+        """GeoJSON con las geometrías en el CRS del raster para gdal.Warp, escrito una vez."""
+        with self._lock:
+            if self._cutline_file is None or not os.path.exists(self._cutline_file):
+                cutline_file = os.path.join(temp_dir, f"cutline_{id(self):x}.geojson")
+                gpd.GeoDataFrame(geometry=self.geometries, crs=self.crs).to_file(cutline_file, driver="GeoJSON")
+                self._cutline_file = cutline_file
+            return self._cutline_file
+
+# Caché LRU de AoiGrid por (polígono, rejilla)
+_aoi_grids = OrderedDict()
+_aoi_grids_lock = threading.Lock()
+AOI_GRID_CACHE_SIZE = 16
+# Máscaras ya escritas por (polígono, rejilla del recorte), en orden LRU
+_aoi_masks = OrderedDict()
+_aoi_masks_lock = threading.Lock()
+
+def mask_grid_key(profile):
+    """Rejilla de la máscara según su perfil: CRS, transform y tamaño."""
+    crs = profile.get("crs")
+    return (
+        CRS.from_user_input(crs).to_wkt() if crs else None,
+        tuple(profile["transform"]), profile["width"], profile["height"]
+    )
+
+def get_aoi_grid(polygon_path, dataset):
+    """
+    Devuelve el AoiGrid del polígono para la rejilla de `dataset` (CRS, transform y
+    tamaño). El polígono se lee y reproyecta una sola vez por rejilla; las demás
+    bandas con la misma rejilla reutilizan la ventana y la máscara escrita.
+    """
+    key = (
+        os.path.abspath(polygon_path), os.path.getmtime(polygon_path),
+        dataset.crs.to_wkt() if dataset.crs else None, tuple(dataset.transform), dataset.width, dataset.height
+    )
+    with _aoi_grids_lock:
+        grid = _aoi_grids.get(key)
+        if grid is None:
+            grid = _build_aoi_grid(polygon_path, dataset)
+            grid.source = key[:2]
+            _aoi_grids[key] = grid
+            if len(_aoi_grids) > AOI_GRID_CACHE_SIZE:
+                _aoi_grids.popitem(last=False)
+        else:
+            _aoi_grids.move_to_end(key)
+    return grid
+
+def _build_aoi_grid(polygon_path, dataset):
+    raster_crs = dataset.crs
+    raster_bbox = box(*dataset.bounds)
+    print(f"CRS del raster: {raster_crs}")
+    print(f"Extensión del raster: {dataset.bounds}")
+
+    # Cargar el polígono desde el archivo
+    poligono_gdf = gpd.read_file(polygon_path)
+    if is_path_row_polygon(poligono_gdf, polygon_path):
+        print("Detectado modo path/row: Se conserva el mosaico completo sin recortar")
+        return AoiGrid(raster_crs)
+
+    print(f"CRS del polígono: {poligono_gdf.crs}")
+    print(f"Extensión del polígono: {poligono_gdf.total_bounds}")
+
+    # Verificar si los CRS son diferentes y reproyectar si es necesario
+    if poligono_gdf.crs != raster_crs:
+        print(f"Reproyectando polígono de {poligono_gdf.crs} a {raster_crs}")
+        poligono_gdf = poligono_gdf.to_crs(raster_crs)
+
+    # Verificar intersección espacial antes de intentar recortar
+    if not any(geom.intersects(raster_bbox) for geom in poligono_gdf.geometry):
+        print("ERROR: El polígono no intersecta con el raster.")
+        print("Utilizando el área completa del raster como alternativa...")
+        return AoiGrid(raster_crs)
+
+    print("El polígono intersecta con el raster. Procediendo con el recorte normal.")
+    geometries = list(poligono_gdf.geometry)
+
+    # Misma ventana que rasterio.mask con crop=True (la máscara se rasteriza al escribir)
+    window = geometry_window(dataset, [mapping(geom) for geom in geometries])
+    transform = dataset.window_transform(window)
+    bounds = rasterio.windows.bounds(window, dataset.transform)
+    return AoiGrid(raster_crs, geometries, window, transform, bounds)
 
 def extract_mosaic_by_polygon(mosaic_path, polygon_path, output_path):
     """
     Recorta un mosaico de banda utilizando un polígono con manejo de diferentes CRS.
     También crea una máscara binaria que indica el área de interés dentro del recorte.
+    La ventana y la máscara se comparten entre las bandas con la misma rejilla.
     """
     try:
         print(f"Recortando mosaico {os.path.basename(mosaic_path)} con polígono...")
@@ -27,155 +352,33 @@ def extract_mosaic_by_polygon(mosaic_path, polygon_path, output_path):
         band_name = os.path.basename(mosaic_path).replace("mosaic_", "").replace(".tif", "")
         output_file = os.path.join(output_path, f"clip_{band_name}.tif")
         mask_file = os.path.join(output_path, f"aoi_mask.tif")
-        
-        # Abrir el mosaico para obtener su CRS y extensión
+
         with rasterio.open(mosaic_path) as src:
-            raster_crs = src.crs
-            raster_bounds = src.bounds
-            raster_bbox = box(raster_bounds.left, raster_bounds.bottom, 
-                             raster_bounds.right, raster_bounds.top)
-            
-            print(f"CRS del raster: {raster_crs}")
-            print(f"Extensión del raster: {raster_bounds}")
-        
-        # Cargar el polígono desde el archivo
-        poligono_gdf = gpd.read_file(polygon_path)
-        poligono_crs = poligono_gdf.crs
-        
-        is_path_row_mode = False
-        try:
-            if poligono_gdf.empty or poligono_gdf.geometry.is_empty.all():
-                is_path_row_mode = True
-            else:
-                # Verificar si el archivo es del tipo "source_file" (generado) o no
-                polygon_filename = os.path.basename(polygon_path)
-                if not polygon_filename.startswith("source_file"):
-                    is_path_row_mode = True
-        except:
-            is_path_row_mode = True
-        
-        if is_path_row_mode:
-            print("Detectado modo path/row: Copiando el mosaico completo sin recortar")
-            # Simplemente copiar el archivo original
-            shutil.copy(mosaic_path, output_file)
-            
-            # Crear una máscara que cubra toda el área
-            with rasterio.open(mosaic_path) as src:
-                mask_array = np.ones((src.height, src.width), dtype=np.uint8)
-                mask_meta = src.meta.copy()
-                mask_meta.update({
-                    "count": 1,
-                    "dtype": "uint8",
-                    "nodata": 0
+            grid = get_aoi_grid(polygon_path, src)
+            out_meta = src.meta.copy()
+
+            if not grid.full:
+                # Leer solo la ventana del AOI, por franjas, anulando los píxeles fuera del polígono
+                out_meta.update({
+                    "driver": "GTiff",
+                    "height": grid.shape[0],
+                    "width": grid.shape[1],
+                    "transform": grid.transform,
+                    "tiled": True,
+                    "blockxsize": CLIP_BLOCK_SIZE,
+                    "blockysize": CLIP_BLOCK_SIZE
                 })
-                
-                with rasterio.open(mask_file, "w", **mask_meta) as dest:
-                    dest.write(mask_array, 1)
-            
-            print(f"Recorte para banda {band_name} creado en {output_file}")
-            print(f"Máscara para el área completa creada en {mask_file}")
-            return output_file
-        
-        
-        
-        
-        print(f"CRS del polígono: {poligono_crs}")
-        print(f"Extensión del polígono: {poligono_gdf.total_bounds}")
-        
-        # Verificar si los CRS son diferentes y reproyectar si es necesario
-        if poligono_crs != raster_crs:
-            print(f"Reproyectando polígono de {poligono_crs} a {raster_crs}")
-            poligono_gdf = poligono_gdf.to_crs(raster_crs)
-        
-        # Verificar intersección espacial antes de intentar recortar
-        intersects = False
-        for geom in poligono_gdf.geometry:
-            if geom.intersects(raster_bbox):
-                intersects = True
-                break
-        
-        if not intersects:
-            print("ERROR: El polígono no intersecta con el raster.")
-            print("Utilizando el área completa del raster como alternativa...")
-            
-            # Usar el bbox del raster como geometría de recorte
-            geometries = [mapping(raster_bbox)]
-            
-            # Crear una copia del raster original sin recortar
-            output_file = os.path.join(output_path, f"clip_{band_name}.tif")
+                apply_compression(out_meta, REFLECTANCE)
+                write_clip_windowed(src, grid, output_file, out_meta)
+
+        if not grid.full:
+            finalize_raster(output_file, REFLECTANCE)
+
+        if grid.full:
+            # Copiar el mosaico completo y una máscara que cubre toda el área
             shutil.copy(mosaic_path, output_file)
-            
-            # Crear una máscara que cubra todo el raster (todos los píxeles válidos)
-            with rasterio.open(mosaic_path) as src:
-                mask_array = np.ones((src.height, src.width), dtype=np.uint8)
-                mask_meta = src.meta.copy()
-                mask_meta.update({
-                    "count": 1,
-                    "dtype": "uint8",
-                    "nodata": 0
-                })
-                
-                mask_file = os.path.join(output_path, f"aoi_mask.tif")
-                with rasterio.open(mask_file, "w", **mask_meta) as dest:
-                    dest.write(mask_array, 1)
-            
-            print(f"Recorte completo para banda {band_name} creado en {output_file}")
-            print(f"Máscara para el área completa creada en {mask_file}")
-            return output_file
-        else:
-            print("El polígono intersecta con el raster. Procediendo con el recorte normal.")
-            geometries = [mapping(geom) for geom in poligono_gdf.geometry]
-        
-        # Abrir el mosaico y realizar el recorte
-        with rasterio.open(mosaic_path) as src:
-            # Realizar el recorte
-            out_image, out_transform = mask(src, geometries, crop=True, all_touched=True)
-            # Actualizar metadatos
-            out_meta = src.meta.copy()
-            out_meta.update({
-                "driver": "GTiff",
-                "height": out_image.shape[1],
-                "width": out_image.shape[2],
-                "transform": out_transform,
-                "compress": "deflate",
-                "predictor": 2,
-                "tiled": True
-            })
-            
-            # Guardar el resultado
-            with rasterio.open(output_file, "w", **out_meta) as dest:
-                dest.write(out_image)
-            
-            # NUEVO: Crear una máscara binaria del área del polígono
-            # Inicializar una máscara con ceros (fuera del área)
-            mask_array = np.zeros((out_image.shape[1], out_image.shape[2]), dtype=np.uint8)
-            
-            # Rasterizar el polígono sobre la máscara
-            from rasterio import features
-            
-            # Crear una ventana de transformación ajustada al recorte
-            for geom in poligono_gdf.geometry:
-                # Rasterizar cada geometría como 1 en la máscara
-                features.rasterize(
-                    [(geom, 1)],
-                    out=mask_array,
-                    transform=out_transform,
-                    all_touched=True
-                )
-            
-            # Guardar la máscara como GeoTIFF
-            mask_meta = out_meta.copy()
-            mask_meta.update({
-                "count": 1,
-                "dtype": "uint8",
-                "nodata": 0
-            })
-            
-            with rasterio.open(mask_file, "w", **mask_meta) as dest:
-                dest.write(mask_array, 1)
-            
-            print(f"Máscara del área de interés creada en {mask_file}")
-        
+        grid.write_mask(mask_file, out_meta)
+
         # Verificar que el archivo se haya creado correctamente
         if os.path.exists(output_file) and os.path.exists(mask_file):
             print(f"Recorte para banda {band_name} creado en {output_file}")
@@ -190,9 +393,12 @@ def extract_mosaic_by_polygon(mosaic_path, polygon_path, output_path):
         print(traceback.format_exc())
         return None
 
-def build_mosaic_per_band(band_files, output_path, band_name, temp_dir=None):
+def build_mosaic_per_band(band_files, output_path, band_name, temp_dir=None, num_threads=1,
+                          incremental=INCREMENTAL_MOSAIC):
     """
     Crea un mosaico para una banda específica, priorizando escenas con menor nubosidad.
+    Con `incremental`, si ya existe un mosaico con manifiesto sobre la misma rejilla
+    solo se recalculan los bloques afectados por escenas que cambiaron.
     """
     # Crear directorio para mosaicos si no existe
     os.makedirs(output_path, exist_ok=True)
@@ -209,18 +415,141 @@ def build_mosaic_per_band(band_files, output_path, band_name, temp_dir=None):
     
     # Enfoque usando GDAL directamente (más control sobre el proceso)
     # Crear un archivo VRT para el mosaico
+    vrt_path = build_band_vrt(sorted_files, temp_dir, band_name)
+    with rasterio.open(vrt_path) as vrt:
+        grid = grid_of(vrt)
+        sources = source_entries(sorted_files, vrt.crs)
+
+    incremental = incremental and not COG_OUTPUT
+    changed = plan_update(load_manifest(output_mosaic), grid, sources) \
+        if incremental and os.path.exists(output_mosaic) else None
+    if changed is not None:
+        updated, total = update_mosaic_blocks(output_mosaic, vrt_path, changed) if changed else (0, 0)
+        save_manifest(output_mosaic, grid, sources)
+        print(f"Mosaico para banda {band_name} actualizado: {updated} de {total} bloques reescritos")
+        if updated and compact_mosaic(output_mosaic):
+            print(f"Mosaico para banda {band_name} compactado tras la actualización")
+        return output_mosaic
+
+    # Convertir el VRT al mosaico GeoTIFF final
+    mosaic_options = creation_options(num_threads, grid["dtype"])
+    gdal_translate_cmd = ['gdal_translate']
+    for option in mosaic_options:
+        gdal_translate_cmd += ['-co', option]
+    gdal_translate_cmd += [vrt_path, output_mosaic]
+    
+    cmd = ' '.join(gdal_translate_cmd)
+    print(f"Ejecutando: {cmd}")
+    
+    try:
+        gdal.Translate(
+            output_mosaic,
+            vrt_path,
+            options=gdal.TranslateOptions(
+                creationOptions=mosaic_options
+            )
+        )
+    except Exception as e:
+        print(f"Error al convertir VRT a GeoTIFF: {str(e)}")
+        subprocess.run(cmd, shell=True, check=True) # Ejecutar como proceso externo si falla la API
+    
+    finalize_raster(output_mosaic, REFLECTANCE, num_threads=num_threads)
+    if incremental:
+        save_manifest(output_mosaic, grid, sources)
+    elif os.path.exists(manifest_path(output_mosaic)):
+        os.remove(manifest_path(output_mosaic))  # ya no describe el mosaico
+    print(f"Mosaico para banda {band_name} creado en {output_mosaic}")
+    
+    return output_mosaic
+
+def snap_bounds(bounds, transform):
+    """
+    Amplía `bounds` (min_x, min_y, max_x, max_y) hasta las líneas de píxel de la
+    rejilla de `transform` (origen y tamaño de píxel de una escena de referencia).
+    """
+    min_x, min_y, max_x, max_y = bounds
+    x_res, y_res = transform.a, -transform.e
+    origin_x, origin_y = transform.c, transform.f
+    return (
+        origin_x + math.floor((min_x - origin_x) / x_res) * x_res,
+        origin_y - math.ceil((origin_y - min_y) / y_res) * y_res,
+        origin_x + math.ceil((max_x - origin_x) / x_res) * x_res,
+        origin_y - math.floor((origin_y - max_y) / y_res) * y_res
+    )
+
+def common_grid_sources(sorted_files, temp_dir, band_name):
+    """
+    Devuelve las rutas de las escenas (en el mismo orden) listas para un único VRT.
+    Si están en CRS distintos (AOI entre zonas UTM) se elige la zona UTM del centro
+    de su extensión conjunta y cada escena en otra zona se reproyecta a ella con un
+    VRT con warp: los píxeles se remuestrean al leer, sin copias temporales.
+    Las escenas reproyectadas se alinean a la rejilla de la primera escena nativa
+    de esa zona, para que las que ya están en ella no se remuestreen en el VRT.
+    """
+    sources = []
+    for file, _ in sorted_files:
+        with rasterio.open(file) as src:
+            sources.append((file, src.crs, src.bounds, src.transform, src.nodata))
+
+    if len({crs.to_string() if crs else None for _, crs, _, _, _ in sources}) <= 1:
+        return [file for file, _, _, _, _ in sources]
+
+    target_crs = common_utm_crs([
+        transform_bounds(crs, GEOGRAPHIC_CRS, *bounds) for _, crs, bounds, _, _ in sources
+    ])
+    target = CRS.from_user_input(target_crs)
+    reference = next((transform for _, crs, _, transform, _ in sources if crs == target), None)
+    print(f"Escenas de la banda {band_name} en varias zonas UTM; se reproyectan a {target_crs}")
+
+    paths = []
+    for i, (file, crs, bounds, _, nodata) in enumerate(sources):
+        if crs == target:
+            paths.append(file)
+            continue
+        if reference is not None:
+            grid_options = dict(
+                xRes=reference.a,
+                yRes=-reference.e,
+                outputBounds=snap_bounds(transform_bounds(crs, target_crs, *bounds), reference)
+            )
+        else:
+            # Ninguna escena está en la zona común: rejilla alineada a múltiplos del píxel
+            resolution = min(min(abs(transform.a), abs(transform.e)) for _, _, _, transform, _ in sources)
+            grid_options = dict(xRes=resolution, yRes=resolution, targetAlignedPixels=True)
+        warped_vrt = os.path.join(temp_dir, f"warp_{band_name}_{i}.vrt")
+        gdal.Warp(
+            warped_vrt,
+            file,
+            options=gdal.WarpOptions(
+                format="VRT",
+                dstSRS=target_crs,
+                resampleAlg="near",
+                # Fuera de la huella de la escena debe quedar transparente en el mosaico
+                dstNodata=nodata if nodata is not None else 0,
+                **grid_options
+            )
+        )
+        paths.append(warped_vrt)
+    return paths
+
+def build_band_vrt(sorted_files, temp_dir, band_name):
+    """
+    Crea el VRT de una banda con los archivos en el orden recibido
+    (lista de tuplas (archivo, nubosidad)) y devuelve su ruta.
+    Las escenas de otras zonas UTM entran reproyectadas a un CRS común.
+    """
     vrt_path = os.path.join(temp_dir, f"mosaic_{band_name}.vrt")
+    source_paths = common_grid_sources(sorted_files, temp_dir, band_name)
     
     # Crear un archivo de texto con la lista de archivos ordenados por nubosidad
     list_file = os.path.join(temp_dir, f"filelist_{band_name}.txt")
     with open(list_file, 'w') as f:
-        for file, _ in sorted_files:
+        for file in source_paths:
             f.write(file + '\n')
     
     # Construir el comando para crear el VRT
     gdal_build_vrt_cmd = [
         'gdalbuildvrt',
-        '-allow_projection_difference',
         '-resolution', 'highest',
         '-input_file_list', list_file,
         vrt_path
@@ -233,45 +562,123 @@ def build_mosaic_per_band(band_files, output_path, band_name, temp_dir=None):
     try:
         gdal.BuildVRT(
             vrt_path, 
-            [archivo for archivo, _ in sorted_files],
+            source_paths,
             options=gdal.BuildVRTOptions(
                 resolution='highest',
-                separate=False,
-                allowProjectionDifference=True
+                separate=False
             )
         )
     except Exception as e:
         print(f"Error al crear VRT: {str(e)}")
         subprocess.run(cmd, shell=True, check=True) # Ejecutar como proceso externo si falla la API
 
-    # Convertir el VRT al mosaico GeoTIFF final
-    gdal_translate_cmd = [
-        'gdal_translate',
-        '-co', 'COMPRESS=DEFLATE',
-        '-co', 'PREDICTOR=2',
-        '-co', 'TILED=YES',
-        vrt_path,
-        output_mosaic
-    ]
-    
-    cmd = ' '.join(gdal_translate_cmd)
-    print(f"Ejecutando: {cmd}")
-    
-    try:
-        gdal.Translate(
-            output_mosaic,
+    return vrt_path
+
+def build_clip_per_band(band_files, polygon_path, output_path, band_name, temp_dir=None, num_threads=1):
+    """
+    Crea el recorte de una banda directamente desde su VRT con un solo gdal.Warp,
+    usando el polígono como línea de corte, sin escribir el mosaico completo.
+    El recorte usa la misma rejilla y la misma máscara aoi_mask.tif que
+    extract_mosaic_by_polygon.
+    """
+    os.makedirs(output_path, exist_ok=True)
+    if temp_dir is None:
+        temp_dir = os.path.join(output_path, "temp")
+    os.makedirs(temp_dir, exist_ok=True)
+
+    # Ordenar archivos por nubosidad (menor a mayor), igual que en el mosaico
+    sorted_files = sorted(band_files, key=lambda x: x[1])
+    vrt_path = build_band_vrt(sorted_files, temp_dir, band_name)
+
+    output_file = os.path.join(output_path, f"clip_{band_name}.tif")
+    mask_file = os.path.join(output_path, "aoi_mask.tif")
+
+    with rasterio.open(vrt_path) as src:
+        grid = get_aoi_grid(polygon_path, src)
+        clip_options = creation_options(num_threads, src.dtypes[0])
+
+    if grid.full:
+        gdal.Translate(output_file, vrt_path,
+                       options=gdal.TranslateOptions(creationOptions=clip_options))
+    else:
+        print(f"Recortando banda {band_name} desde el VRT con gdal.Warp...")
+        # Misma ventana que rasterio.mask con crop=True: alineada a la rejilla del VRT
+        gdal.Warp(
+            output_file,
             vrt_path,
-            options=gdal.TranslateOptions(
-                creationOptions=['COMPRESS=DEFLATE', 'PREDICTOR=2', 'TILED=YES']
+            options=gdal.WarpOptions(
+                cutlineDSName=grid.cutline_file(temp_dir),
+                outputBounds=grid.bounds,
+                width=int(grid.window.width),
+                height=int(grid.window.height),
+                warpOptions=['CUTLINE_ALL_TOUCHED=TRUE', f'NUM_THREADS={num_threads}'],
+                creationOptions=clip_options,
+                multithread=True
             )
         )
-    except Exception as e:
-        print(f"Error al convertir VRT a GeoTIFF: {str(e)}")
-        subprocess.run(cmd, shell=True, check=True) # Ejecutar como proceso externo si falla la API
-    
-    print(f"Mosaico para banda {band_name} creado en {output_mosaic}")
-    
-    return output_mosaic
+
+    finalize_raster(output_file, REFLECTANCE, num_threads=num_threads)
+    with rasterio.open(output_file) as clip:
+        grid.write_mask(mask_file, clip.profile.copy())
+
+    print(f"Recorte para banda {band_name} creado en {output_file}")
+    return output_file
+
+def build_stacked_clip(clip_files, output_path, memory_budget_mb=CLIP_MEMORY_BUDGET_MB):
+    """
+    Apila los recortes por banda ({banda: ruta}) en un único GeoTIFF multibanda,
+    teselado y entrelazado por píxel (STACK_FILE_NAME), para que cada bloque
+    contenga todas las bandas. Los nombres de banda se guardan como descripciones
+    y en la etiqueta BANDS. Solo se apilan las bandas con la rejilla de la primera;
+    se copia por franjas dentro del presupuesto de memoria.
+    Devuelve la ruta del archivo o None si no hay bandas.
+    """
+    bands = sorted(clip_files)
+    if not bands:
+        return None
+
+    sources = [rasterio.open(clip_files[band]) for band in bands]
+    try:
+        first = sources[0]
+        grid = (first.crs, first.transform, first.width, first.height)
+        stacked = []
+        for band, src in zip(bands, sources):
+            if (src.crs, src.transform, src.width, src.height) == grid:
+                stacked.append((band, src))
+            else:
+                print(f"La banda {band} no comparte la rejilla del recorte; no se apila")
+
+        dtype = np.result_type(*[src.dtypes[0] for _, src in stacked]).name
+        profile = first.profile.copy()
+        profile.update({
+            "driver": "GTiff",
+            "count": len(stacked),
+            "dtype": dtype,
+            "interleave": "pixel",
+            "tiled": True,
+            "blockxsize": CLIP_BLOCK_SIZE,
+            "blockysize": CLIP_BLOCK_SIZE
+        })
+        apply_compression(profile, REFLECTANCE)
+
+        output_file = os.path.join(output_path, STACK_FILE_NAME)
+        width, height = first.width, first.height
+        step = rows_per_chunk(width, len(stacked), dtype, memory_budget_mb)
+        with rasterio.open(output_file, "w", **profile) as dest:
+            for row in range(0, height, step):
+                window = rasterio.windows.Window(0, row, width, min(step, height - row))
+                dest.write(np.stack([src.read(1, window=window).astype(dtype) for _, src in stacked]), window=window)
+            for i, (band, _) in enumerate(stacked, start=1):
+                dest.set_band_description(i, band)
+            dest.update_tags(BANDS=json.dumps([band for band, _ in stacked]))
+    finally:
+        for src in sources:
+            src.close()
+
+    finalize_raster(output_file, REFLECTANCE)
+
+    print(f"Recorte multibanda ({', '.join(band for band, _ in stacked)}) creado en {output_file}")
+    return output_file
 
 def extract_collection_indicator(filename):
     """
@@ -294,17 +701,12 @@ def extract_collection_indicator(filename):
 
 def get_cloud_cover(scene_dir):
     """
-    Intenta obtener el porcentaje de nubosidad de los metadatos de la escena.
+    Obtiene el porcentaje de nubosidad de la escena desde la caché de metadatos
+    (o de su MTL.json si la caché no existe).
     """
-    info_files = glob.glob(os.path.join(scene_dir, "*MTL.json"))
-    if info_files:
-        try:
-            with open(info_files[0], 'r') as info_file:
-                info_data = json.load(info_file)
-                return float(info_data["LANDSAT_METADATA_FILE"]["IMAGE_ATTRIBUTES"]["CLOUD_COVER"])
-        except (KeyError, ValueError, Exception) as e:
-            print(f"Error al leer archivo de info: {str(e)}")
-            return None
+    for record in get_scene_dir_metadata(scene_dir):
+        if record.cloud_cover is not None:
+            return record.cloud_cover
     
     # Si no encontramos la información, lanzar excepción
     raise ValueError(f"No se pudo obtener la nubosidad para {scene_dir}")
@@ -350,6 +752,18 @@ def get_scenes_by_band(download_path):
                 # Agregar la ruta del archivo y el porcentaje de nubosidad
                 sorted_bands[band_key].append((tif_file, cloud_cover))
     
+    # Descartar TIFs truncados o páginas de error antes de que lleguen a GDAL
+    all_files = [tif_file for files in sorted_bands.values() for tif_file, _ in files]
+    invalid = verify_downloads(all_files)
+    if invalid:
+        for tif_file, reason in invalid.items():
+            print(f"Descartando {os.path.basename(tif_file)}: {reason}")
+        sorted_bands = {
+            band_key: [(tif_file, cloud) for tif_file, cloud in files if tif_file not in invalid]
+            for band_key, files in sorted_bands.items()
+        }
+        sorted_bands = {band_key: files for band_key, files in sorted_bands.items() if files}
+
     # Verificar si encontramos bandas
     if not sorted_bands:
         raise Exception(f"No se encontraron archivos de bandas en {download_path}")
@@ -360,15 +774,18 @@ def get_scenes_by_band(download_path):
     
     return sorted_bands
 
-def generate_mosaics_and_clips(temp_dir=None):
+def generate_mosaics_and_clips(temp_dir=None, epoch=PRIMARY, fused=FUSED_MOSAIC_CLIP, stacked=STACKED_CLIP):
     """
     Función principal que coordina el proceso completo:
     1. Busca todas las bandas descargadas
     2. Crea mosaicos por banda
     3. Recorta los mosaicos según el polígono
+    `epoch` elige las carpetas de descargas, mosaicos, recortes y exportación.
+    Con `fused` los pasos 2 y 3 se hacen en un solo gdal.Warp desde el VRT y con
+    `stacked` se genera también el recorte multibanda.
     """
-    script_dir = Path(__file__).parent
-    data_path = script_dir.parent.parent / "data" / "temp" / "source"
+    paths = epoch_paths(epoch)
+    data_path = SOURCE_PATH
     # Buscar archivos con extensión .geojson y .shp
     files = sorted(
         glob.glob(str(data_path / "*.geojson")) + glob.glob(str(data_path / "*.shp")),
@@ -382,7 +799,7 @@ def generate_mosaics_and_clips(temp_dir=None):
     if not os.path.exists(polygon_path):
         raise Exception(f"El archivo del polígono {polygon_path} no existe.")
 
-    download_path = script_dir.parent.parent / "data" / "temp" / "downloads"
+    download_path = paths["downloads"]
     try:
         msg = "Obteniendo bandas espectrales descargadas...\n"
         print(msg)
@@ -393,50 +810,121 @@ def generate_mosaics_and_clips(temp_dir=None):
 
     if not sorted_bands:
         raise Exception("No se encontraron bandas para procesar")
+
+    workers, gdal_threads = split_thread_budget(len(sorted_bands))
+    # Bandas que fallaron: {banda: mensaje de error}
+    errors = {}
+
+    if fused:
+        created_clips = {}
+        msg = f"Recortando cada banda directamente desde su mosaico virtual ({workers} en paralelo)...\n"
+        print(msg)
+        yield msg
+        jobs = {
+            band: partial(build_clip_per_band, files, polygon_path, paths["clip"], band, temp_dir, gdal_threads)
+            for band, files in sorted_bands.items()
+        }
+        for band, clip_path, error in run_band_jobs(jobs, workers):
+            if error is None:
+                created_clips[band] = clip_path
+                yield f"Recorte de {band} creado"
+            else:
+                errors[band] = str(error)
+                yield f"⚠ Error en recorte de banda {band}: {str(error)}"
+        if not created_clips:
+            raise Exception("No se pudo crear ningún recorte.")
+        if stacked:
+            yield from stack_clips(created_clips, paths["clip"])
+        else:
+            remove_stacked_clip(paths["clip"])
+
+        results = {"mosaicos": {}, "recortes": created_clips, "errores": errors}
+        log_path = save_processing_log(results, paths["exports"])
+        msg = f"\nProcesamiento completado. Se generaron {len(created_clips)} recortes.\nRegistro guardado en {log_path}"
+        if errors:
+            msg += f"\nBandas con errores: {', '.join(errors)}"
+        print(msg)
+        yield msg
+        return results
+
     processed_mosaics = {}
-    output_mosaic = script_dir.parent.parent / "data" / "temp" / "processed" / "mosaic"
-    msg = "Creando mosaico para cada banda...\n"
+    output_mosaic = paths["mosaic"]
+    msg = f"Creando mosaico para cada banda ({workers} en paralelo)...\n"
     print(msg)
     yield msg
-    for band, files in sorted_bands.items():
-        try:
-            print(f"\nCreando mosaico para la banda {band}...")
-            mosaic_path = build_mosaic_per_band(files, output_mosaic, band, temp_dir)
-
-            if mosaic_path and os.path.exists(mosaic_path):
-                processed_mosaics[band] = mosaic_path
-                print(f"Mosaico creado exitosamente: {mosaic_path}")
-            else:
-                raise Exception(f"No se pudo crear el mosaico para la banda {band}")
-            
-        except Exception as e:
-            print(f"Error al crear mosaico para banda {band}: {str(e)}")
-            print(traceback.format_exc())
+    jobs = {
+        band: partial(build_mosaic_per_band, files, output_mosaic, band, temp_dir, gdal_threads)
+        for band, files in sorted_bands.items()
+    }
+    for band, mosaic_path, error in run_band_jobs(jobs, workers):
+        if error is None and mosaic_path and os.path.exists(mosaic_path):
+            processed_mosaics[band] = mosaic_path
+            print(f"Mosaico creado exitosamente: {mosaic_path}")
+            yield f"Mosaico de {band} creado"
+        else:
+            errors[band] = str(error) if error else "No se pudo crear el mosaico"
+            yield f"⚠ Error en mosaico de banda {band}: {errors[band]}"
     if not processed_mosaics:
         raise Exception("No se pudo crear ningún mosaico.")
 
     created_clips = {}
-    clips_path = script_dir.parent.parent / "data" / "temp" / "processed" / "clip"
+    clips_path = paths["clip"]
 
     yield "Mosaico generado. Realizando corte...\n"
-    for band, mosaic_path in processed_mosaics.items():
-        try:
-            print(f"\nRecortando mosaico para banda {band}...")
-            clip_path = extract_mosaic_by_polygon(mosaic_path, polygon_path, clips_path)
-
-            if clip_path is not None:
-                created_clips[band] = clip_path
-                print(f"Recorte creado exitosamente: {clip_path}")
-            else:
-                raise Exception(f"No se pudo crear el recorte para la banda {band}")
-        except Exception as e:
-            print(f"Error al recortar mosaico para banda {band}: {str(e)}")
-            print(traceback.format_exc())
+    jobs = {
+        band: partial(extract_mosaic_by_polygon, mosaic_path, polygon_path, clips_path)
+        for band, mosaic_path in processed_mosaics.items()
+    }
+    for band, clip_path, error in run_band_jobs(jobs, workers):
+        if error is None and clip_path is not None:
+            created_clips[band] = clip_path
+            print(f"Recorte creado exitosamente: {clip_path}")
+        else:
+            errors[band] = str(error) if error else "No se pudo crear el recorte"
+            yield f"⚠ Error en recorte de banda {band}: {errors[band]}"
+    if stacked and created_clips:
+        yield from stack_clips(created_clips, clips_path)
+    else:
+        remove_stacked_clip(clips_path)
     results = {
         "mosaicos": processed_mosaics,
-        "recortes": created_clips
+        "recortes": created_clips,
+        "errores": errors
     }
-    output_clips = script_dir.parent.parent / "data" / "exports"
+    log_path = save_processing_log(results, paths["exports"])
+
+    msg = f"\nProcesamiento completado. Se generaron {len(processed_mosaics)} mosaicos y {len(created_clips)} recortes.\nRegistro guardado en {log_path}"
+    if errors:
+        msg += f"\nBandas con errores: {', '.join(errors)}"
+    print(msg)
+    yield msg
+
+    return results
+
+def remove_stacked_clip(clips_path):
+    """
+    Borra el recorte multibanda de una ejecución anterior cuando no se genera uno
+    nuevo, para que el cálculo de índices no lea bandas desactualizadas.
+    """
+    stack_file = os.path.join(clips_path, STACK_FILE_NAME)
+    if os.path.exists(stack_file):
+        os.remove(stack_file)
+        print(f"Recorte multibanda anterior eliminado: {stack_file}")
+
+def stack_clips(created_clips, clips_path):
+    """Genera el recorte multibanda de los recortes creados, informando el resultado."""
+    try:
+        with raster_env():
+            stack_file = build_stacked_clip(created_clips, clips_path)
+        msg = f"Recorte multibanda creado: {stack_file}"
+    except Exception as e:
+        print(traceback.format_exc())
+        msg = f"No se pudo crear el recorte multibanda: {str(e)}"
+    print(msg)
+    yield msg
+
+def save_processing_log(results, output_clips):
+    """Guarda el registro de mosaicos y recortes generados y devuelve su ruta."""
     os.makedirs(output_clips, exist_ok=True)
     log_path = os.path.join(output_clips, "registro_procesamiento.json")
 
@@ -446,9 +934,4 @@ def generate_mosaics_and_clips(temp_dir=None):
     except Exception as e:
         print(f"Error al guardar el registro de procesamiento: {str(e)}")
         print(traceback.format_exc())
-
-    msg = f"\nProcesamiento completado. Se generaron {len(processed_mosaics)} mosaicos y {len(created_clips)} recortes.\nRegistro guardado en {log_path}"
-    print(msg)
-    yield msg
-
-    return results
\ No newline at end of file
+    return log_path
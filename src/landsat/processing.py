@@ -1,16 +1,42 @@
 import os
+import json
 import traceback
 import pandas as pd
+import shapely
 from shapely.ops import unary_union
-from datetime import datetime
 import geopandas as gpd
 from shapely.geometry import shape, Polygon
-import matplotlib.pyplot as plt
 import glob
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib.patches as mpatches
-import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from adjustText import adjust_text
+from .footprints import FootprintIndex
+from .selection import select_scenes
+from .projection import GEOGRAPHIC_CRS, area_crs_for, project
+from .cloud_mask import compute_clear_sky
+from .epochs import PRIMARY, SOURCE_PATH, epoch_paths
+
+# Resolución y tamaño (pulgadas) del mapa de cobertura
+COVERAGE_MAP_DPI = 150
+COVERAGE_MAP_SIZE = (14, 12)
+# Límites del reacomodo de etiquetas de las escenas seleccionadas
+LABEL_RELAX_MAX_TEXTS = 60
+LABEL_RELAX_ITERATIONS = 100
+# Generar el mapa de cobertura en segundo plano sin bloquear process_metadata.
+# Desactivado por defecto: process_metadata terminaría antes de que exista
+# coverage_map.png; quien lo active y necesite el PNG debe esperar el Future
+# de render_coverage_map_async
+RENDER_COVERAGE_IN_BACKGROUND = False
+
+# Tolerancia (grados) de simplificación y precisión de la capa GeoJSON de cobertura
+COVERAGE_LAYER_TOLERANCE = 0.001
+COVERAGE_LAYER_PRECISION = 1e-5
+
+# Un solo hilo para los mapas: los renders se encolan en orden
+_render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="coverage_map")
 
 def get_footprint_from_feature(feature):
     """
@@ -42,19 +68,22 @@ def get_footprint_from_feature(feature):
     # Si no podemos determinar la huella, devolver None
     return None
 
-def visualize_coverage(relative_path, features, selected_scenes=None, coverage_percent=None):
+def visualize_coverage(relative_path, features, selected_scenes=None, coverage_percent=None, footprint_index=None,
+                       dpi=COVERAGE_MAP_DPI, figsize=COVERAGE_MAP_SIZE, output_dir=None):
     """
     Genera una visualización de la cobertura del polígono por las escenas Landsat.
+    Si se pasa el índice de huellas del catálogo se reutiliza; si no, se construye.
+    Cada capa (escenas disponibles y seleccionadas) se dibuja como una sola colección
+    y la figura no usa el estado global de pyplot, por lo que puede generarse en un hilo.
     """
     
     # Leer el polígono
     gdf_polygon = gpd.read_file(relative_path)
 
-    # Establece el backend en un modo seguro para hilos
-    matplotlib.use("Agg")
-    
-    # Crear una figura y eje
-    fig, ax = plt.subplots(figsize=(14, 12))
+    # Figura independiente de pyplot (segura para hilos) con el backend Agg
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
     
     # Definir un colormap personalizado para las escenas seleccionadas
     colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', 
@@ -64,12 +93,9 @@ def visualize_coverage(relative_path, features, selected_scenes=None, coverage_p
     gdf_polygon.plot(ax=ax, color='none', edgecolor='red', linewidth=2.5, zorder=3)
     
     # Obtener IDs de escenas seleccionadas si existen
-    selected_ids = []
+    selected_ids = set()
     if selected_scenes:
-        selected_ids = [scene.get('id') for scene in selected_scenes]
-    
-    # Crear diccionario para registrar qué path/row ya están dibujados (para escenas no seleccionadas)
-    path_row_drawn = {}
+        selected_ids = {scene.get('id') for scene in selected_scenes}
 
     # Obtener límites del polígono
     min_x, min_y, max_x, max_y = gdf_polygon.total_bounds
@@ -82,113 +108,57 @@ def visualize_coverage(relative_path, features, selected_scenes=None, coverage_p
     # Ajustar tamaño de texto dinámicamente en función del tamaño del polígono
     text_size = max(4, min(12, (max_x - min_x) * 0.05))  # Ajuste automático
 
-    # Lista para manejar textos con adjustText
-    texts = []
+    if footprint_index is None:
+        footprint_index = FootprintIndex(features)
 
-    # Filtrar características por ID para dibujar primero las NO seleccionadas (fondo)
-    for i, feature in enumerate(features):
-        scene_id = feature.get('id', f'Escena {i+1}')
-        
-        # Si esta escena está en las seleccionadas, la dibujamos después
-        if scene_id in selected_ids:
+    # Solo las escenas visibles en la vista del mapa
+    visible = footprint_index.query_bounds(min_x - buffer, min_y - buffer, max_x + buffer, max_y + buffer)
+
+    # Escenas NO seleccionadas (fondo): una huella por path/row
+    background, background_labels = [], {}
+    for i in visible:
+        if footprint_index.ids[i] in selected_ids:
             continue
-            
-        # Obtener footprint e info
-        footprint = get_footprint_from_feature(feature)
-        if not footprint:
+        props = features[i].get('properties', {})
+        path_row = (props.get('landsat:wrs_path', 'N/A'), props.get('landsat:wrs_row', 'N/A'))
+        if path_row in background_labels:
             continue
-            
-        props = feature.get('properties', {})
-        path = props.get('landsat:wrs_path', 'N/A')
-        row = props.get('landsat:wrs_row', 'N/A')
-        path_row = f"{path}_{row}"
-        
-        # Si ya dibujamos este path/row, continuar
-        if path_row in path_row_drawn:
-            continue
-            
-        # Marcar este path/row como dibujado
-        path_row_drawn[path_row] = True
-        
-        # Crear un GeoDataFrame para la huella
-        gdf_footprint = gpd.GeoDataFrame(geometry=[footprint])
-        
-        # Dibujar la huella con color semitransparente
-        gdf_footprint.plot(
-            ax=ax, 
-            color='lightgray', 
-            alpha=0.2, 
-            linewidth=0.5,
-            edgecolor='gray',
-            zorder=1
-        )
-        
-        # Añadir una etiqueta muy pequeña con Path/Row
-        centroid = footprint.centroid
-        ax.text(
-            centroid.x, centroid.y, 
-            f"P{path}/R{row}",
-            ha='center', va='center', 
-            fontsize=6, 
-            color='gray',
-            zorder=2
-        )
-    
-    # Ahora dibujar las escenas seleccionadas (primer plano)
+        background_labels[path_row] = footprint_index.footprints[i]
+        background.append(footprint_index.footprints[i])
+
+    if background:
+        gpd.GeoSeries(background).plot(ax=ax, color='lightgray', alpha=0.2, linewidth=0.5, edgecolor='gray', zorder=1)
+        for (path, row), footprint in background_labels.items():
+            centroid = footprint.centroid
+            ax.text(centroid.x, centroid.y, f"P{path}/R{row}", ha='center', va='center', fontsize=6, color='gray', zorder=2)
+
+    # Escenas seleccionadas (primer plano), en una sola colección
+    selected_footprints, selected_colors, texts = [], [], []
     for i, scene_info in enumerate(selected_scenes or []):
-        # Buscar la característica correspondiente
-        scene_id = scene_info['id']
-        scene_feature = None
-        
-        for feature in features:
-            if feature.get('id') == scene_id:
-                scene_feature = feature
-                break
-                
-        if not scene_feature:
+        footprint = footprint_index.footprint(scene_info['id'])
+        if footprint is None:
             continue
-            
-        # Obtener footprint
-        footprint = get_footprint_from_feature(scene_feature)
-        if not footprint:
-            continue
-            
-        # Información adicional
-        path = scene_info['path']
-        row = scene_info['row']
-        date = scene_info['date']
-        cloud = scene_info['cloud_cover']
-        
-        # Crear un GeoDataFrame para la huella
-        gdf_footprint = gpd.GeoDataFrame(geometry=[footprint])
-        
-        # Usar un color del ciclo de colores
-        color_idx = i % len(colors)
-        
-        # Dibujar la huella con color distintivo
-        gdf_footprint.plot(
-            ax=ax, 
-            color=colors[color_idx], 
-            alpha=0.5, 
-            linewidth=1.5,
-            edgecolor='black',
-            zorder=4
-        )
-        
+        selected_footprints.append(footprint)
+        selected_colors.append(colors[i % len(colors)])
+
         # Añadir etiqueta informativa
         centroid = footprint.centroid
-        text = ax.text(
+        texts.append(ax.text(
             centroid.x, centroid.y, 
-            f"P{path}/R{row}\n{date}\nNubes: {cloud:.1f}%", 
+            f"P{scene_info['path']}/R{scene_info['row']}\n{scene_info['date']}\nNubes: {scene_info['cloud_cover']:.1f}%", 
             ha='center', va='center', 
             fontsize=text_size,  # Ajuste dinámico del tamaño de texto
             bbox=dict(facecolor='white', alpha=0.4, edgecolor='black', boxstyle='round,pad=0.3'),
             zorder=5
-        )
-        texts.append(text)
-    
-    # Ajustar la posición de los textos si se superponen
-    adjust_text(texts, ax=ax)
+        ))
+
+    if selected_footprints:
+        gpd.GeoSeries(selected_footprints).plot(ax=ax, color=selected_colors, alpha=0.5, linewidth=1.5,
+                                                edgecolor='black', zorder=4)
+
+    # Ajustar la posición de los textos si se superponen, con un límite de iteraciones
+    if 1 < len(texts) <= LABEL_RELAX_MAX_TEXTS:
+        adjust_text(texts, ax=ax, iter_lim=LABEL_RELAX_ITERATIONS)
 
     # Título y configuración
     if selected_scenes and coverage_percent:
@@ -233,78 +203,154 @@ def visualize_coverage(relative_path, features, selected_scenes=None, coverage_p
             f"Nubosidad promedio: {sum(s['cloud_cover'] for s in selected_scenes) / len(selected_scenes):.2f}%"
         )
         
-        plt.figtext(0.02, 0.02, info_text, fontsize=10, bbox=dict(facecolor='white', alpha=0.8, boxstyle='round'))
+        fig.text(0.02, 0.02, info_text, fontsize=10, bbox=dict(facecolor='white', alpha=0.8, boxstyle='round'))
     
     # Guardar la figura
-    script_dir = Path(__file__).parent 
-    output_file = script_dir.parent.parent / "data" / "exports" / "coverage_map.png"
+    output_dir = Path(output_dir) if output_dir else epoch_paths(PRIMARY)["exports"]
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / "coverage_map.png"
     
-    plt.tight_layout()
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(output_file, dpi=dpi, bbox_inches='tight')
     
     return output_file
 
-def analyze_coverage(relative_path, features, min_area, window_days=120, delete_out_range=True):
+def render_coverage_map_async(*args, **kwargs):
+    """
+    Encola visualize_coverage en el hilo de mapas y devuelve el Future con la
+    ruta del PNG. Los errores se informan por consola al terminar.
+    """
+    future = _render_executor.submit(visualize_coverage, *args, **kwargs)
+
+    def report(done):
+        if done.exception() is not None:
+            print(f"No se pudo generar un Mapa de Cobertura: {done.exception()}")
+        else:
+            print(f"Mapa de Cobertura generado: {done.result()}")
+
+    future.add_done_callback(report)
+    return future
+
+def export_coverage_layer(features, selected_scenes, coverage_by_scene=None, footprint_index=None,
+                          tolerance=COVERAGE_LAYER_TOLERANCE, output_dir=None):
+    """
+    Exporta las huellas candidatas y seleccionadas como una capa GeoJSON liviana
+    (geometrías simplificadas y con precisión reducida) con los metadatos de cada
+    escena, para mostrarla en el mapa interactivo. Devuelve la ruta del archivo.
+    """
+    if footprint_index is None:
+        footprint_index = FootprintIndex(features)
+
+    # Candidatas: las escenas analizadas (las que tocan el polígono); si no se conocen, todas
+    if coverage_by_scene is not None and not coverage_by_scene.empty:
+        coverage = dict(zip(coverage_by_scene['id'], coverage_by_scene['coverage_percent']))
+    else:
+        coverage = {}
+    selected_ids = {scene['id'] for scene in selected_scenes or []}
+    positions = [i for i, scene_id in enumerate(footprint_index.ids)
+                 if (scene_id in coverage or not coverage or scene_id in selected_ids)
+                 and footprint_index.footprints[i] is not None]
+
+    geometries = shapely.simplify(footprint_index.footprints[positions], tolerance, preserve_topology=True)
+    geometries = shapely.set_precision(geometries, COVERAGE_LAYER_PRECISION)
+
+    layer_features = []
+    for i, geometry in zip(positions, geometries):
+        props = features[i].get('properties', {})
+        scene_id = footprint_index.ids[i]
+        layer_features.append({
+            "type": "Feature",
+            "properties": {
+                "id": scene_id,
+                "path": props.get('landsat:wrs_path', 'N/A'),
+                "row": props.get('landsat:wrs_row', 'N/A'),
+                "date": (props.get('datetime') or '')[:10],
+                "cloud_cover": round(float(props.get('eo:cloud_cover') or 100.0), 2),
+                "coverage_percent": round(float(coverage.get(scene_id, 0.0)), 2),
+                "selected": scene_id in selected_ids,
+            },
+            "geometry": json.loads(shapely.to_geojson(geometry)),
+        })
+
+    output_dir = Path(output_dir) if output_dir else epoch_paths(PRIMARY)["exports"]
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / "coverage_layer.geojson"
+    with open(output_file, 'w') as f:
+        json.dump({"type": "FeatureCollection", "features": layer_features}, f)
+
+    return output_file
+
+def read_aoi_polygon(relative_path):
+    """Lee el polígono de interés en coordenadas geográficas (las de las huellas STAC)."""
+    gdf_polygon = gpd.read_file(relative_path)
+    if gdf_polygon.crs is not None and not gdf_polygon.crs.equals(GEOGRAPHIC_CRS):
+        gdf_polygon = gdf_polygon.to_crs(GEOGRAPHIC_CRS)
+    return gdf_polygon.geometry.iloc[0]
+
+def analyze_coverage(relative_path, features, min_area, window_days=120, delete_out_range=True, footprint_index=None,
+                     selector="greedy", window_search=True, clear_sky=None):
     """
     Analiza la cobertura del polígono por las escenas Landsat con enfoque en Path/Row.
     Prioriza cobertura espacial, luego minimiza nubosidad y finalmente ajusta coherencia temporal.
+    El selector puede ser "greedy" (voraz ponderado) o "ilp" (exacto, para pocas escenas).
+    Con `window_search` se busca antes la ventana de `window_days` días con mejor cobertura.
+    Si se pasa `clear_sky` ({id: fracción despejada en el AOI, según QA_PIXEL}), la
+    nubosidad de esas escenas es la del AOI y no la de la escena completa.
     """
     
     print("Analizando cobertura con enfoque optimizado en Path/Row...")
 
     # Leer el polígono
-    gdf_polygon = gpd.read_file(relative_path)
-    polygon = gdf_polygon.geometry.iloc[0]
-    polygon_area = polygon.area
+    polygon = read_aoi_polygon(relative_path)
+
+    # Las áreas se miden en metros en un CRS local (UTM o de igual área), no en grados
+    area_crs = area_crs_for(polygon)
+    area_polygon = project(polygon, GEOGRAPHIC_CRS, area_crs)
+    polygon_area = area_polygon.area
     
-    # Lista para almacenar información de todas las escenas
-    all_scenes = []
+    # Índice espacial con todas las huellas
+    if footprint_index is None:
+        footprint_index = FootprintIndex(features)
+    if len(footprint_index.missing):
+        raise Exception(f"No se pudo encontrar la huella de la escena: {footprint_index.ids[footprint_index.missing[0]]}")
+    footprints = footprint_index.footprints
     
-    # Extraer información de todas las escenas
-    for i, feature in enumerate(features):
-        footprint = get_footprint_from_feature(feature)
-        if not footprint:
-            raise Exception(f"No se pudo encontrar la huella de la escena: {feature.get('id', f'Escena {i+1}')}")
-        
-        # Obtener información de la escena
-        props = feature.get('properties', {})
-        scene_id = feature.get('id', f'Escena {i+1}')
-        path = props.get('landsat:wrs_path', 'N/A')
-        row = props.get('landsat:wrs_row', 'N/A')
-        date_str = props.get('datetime', '')
-        cloud = props.get('eo:cloud_cover', 100.0)  # Valor predeterminado alto
-        
-        # Convertir fecha a formato datetime
-        try:
-            date_obj = datetime.strptime(date_str[:10], '%Y-%m-%d') if date_str else None
-        except:
-            date_obj = None
-        
-        # Calcular intersección con el polígono
-        intersection = polygon.intersection(footprint)
-        intersection_area = intersection.area
-        coverage_percent = (intersection_area / polygon_area) * 100
-        
-        # Incluir todas las escenas que tengan alguna intersección significativa con el polígono
-        if coverage_percent >= min_area:  # Umbral mínimo para descartar escenas y ahorrar recursos
-            path_row = f"{path}_{row}"
-            
-            all_scenes.append({
-                'id': scene_id,
-                'path': path,
-                'row': row,
-                'path_row': path_row,
-                'date_str': date_str[:10] if isinstance(date_str, str) else '',
-                'date_obj': date_obj,
-                'cloud_cover': cloud,
-                'coverage_percent': coverage_percent,
-                'footprint': footprint,
-                'intersection_area': intersection_area
-            })
+    # Calcular intersecciones y áreas solo para las escenas que tocan el polígono
+    intersection_area = footprint_index.intersection_areas(polygon, area_crs)
+    coverage_percent = (intersection_area / polygon_area) * 100
+    
+    # Obtener información de las escenas
+    props = [feature.get('properties', {}) for feature in features]
+    date_str = pd.Series([p.get('datetime', '') or '' for p in props], dtype=str).str[:10]
+    path = [p.get('landsat:wrs_path', 'N/A') for p in props]
+    row = [p.get('landsat:wrs_row', 'N/A') for p in props]
     
-    # Convertir a DataFrame para facilitar análisis
-    scenes_df = pd.DataFrame(all_scenes)
+    scenes_df = pd.DataFrame({
+        'id': footprint_index.ids,
+        'path': path,
+        'row': row,
+        'path_row': [f"{p}_{r}" for p, r in zip(path, row)],
+        'date_str': date_str,
+        'date_obj': pd.to_datetime(date_str, format='%Y-%m-%d', errors='coerce'),
+        'cloud_cover': [p.get('eo:cloud_cover', 100.0) for p in props],  # Valor predeterminado alto
+        'coverage_percent': coverage_percent,
+        'footprint': footprints,
+        'intersection_area': intersection_area
+    })
+    
+    # Nubosidad dentro del AOI medida con QA_PIXEL, cuando está disponible
+    if clear_sky:
+        scenes_df['scene_cloud_cover'] = scenes_df['cloud_cover']
+        scenes_df['clear_fraction'] = scenes_df['id'].map(clear_sky)
+        measured = scenes_df['clear_fraction'].notna()
+        scenes_df.loc[measured, 'cloud_cover'] = (1 - scenes_df.loc[measured, 'clear_fraction']) * 100
+
+    # Incluir todas las escenas que tengan alguna intersección significativa con el polígono
+    scenes_df = scenes_df[scenes_df['coverage_percent'] >= min_area].reset_index(drop=True)  # Umbral mínimo para descartar escenas y ahorrar recursos
+
+    # La selección y la cobertura final trabajan en el CRS de áreas
+    scenes_df['footprint'] = project(scenes_df['footprint'].to_numpy(), GEOGRAPHIC_CRS, area_crs)
+    polygon = area_polygon
     
     if scenes_df.empty:
         msg = "No se encontraron escenas con intersección significativa con el polígono."
@@ -320,33 +366,8 @@ def analyze_coverage(relative_path, features, min_area, window_days=120, delete_
     # Ordenar por menor cloud_cover
     scenes_df = scenes_df.sort_values(by=["cloud_cover"])
 
-    # Conjunto para almacenar los path_row seleccionados
-    selected_path_rows = set()
-    best_rows = []
-
-    # Iterar sobre los registros priorizando menor cloud_cover
-    for _, row in scenes_df.iterrows():
-        if row["path_row"] in selected_path_rows:
-            continue  # Si ya seleccionamos este path_row, lo ignoramos
-        
-        # Verificar si al agregar este path_row la ventana de tiempo se respeta
-        temp_selection = best_rows + [row]
-        min_date = min([r["date_obj"] for r in temp_selection])
-        max_date = max([r["date_obj"] for r in temp_selection])
-        
-        if (max_date - min_date).days > window_days:
-            if delete_out_range:
-                continue  # Si la opción está activa, descartamos este path_row
-            else:
-                break  # Si no, terminamos la selección sin incluirlo
-        
-        # Agregar a la selección
-        selected_path_rows.add(row["path_row"])
-        best_rows.append(row)
-
-    # Convertir resultado a DataFrame
-    best_df = pd.DataFrame(best_rows).reset_index(drop=True)
-    # # print(best_df[["path_row", "date_obj", "cloud_cover"]])
+    # Elegir las escenas: cobertura de conjuntos ponderada por nubosidad
+    best_df = select_scenes(scenes_df, polygon, selector, window_days, delete_out_range, window_search)
 
     # Calcular cobertura final con las escenas seleccionadas
     if not best_df.empty:
@@ -371,6 +392,8 @@ def analyze_coverage(relative_path, features, min_area, window_days=120, delete_
             'cloud_cover': scene['cloud_cover'],
             'coverage_percent': scene['coverage_percent']
         })
+        if 'clear_fraction' in scene and pd.notna(scene['clear_fraction']):
+            selected_scenes[-1]['clear_fraction'] = scene['clear_fraction']
 
     return {
         'total_coverage_percent': final_coverage,
@@ -379,17 +402,40 @@ def analyze_coverage(relative_path, features, min_area, window_days=120, delete_
         'uncovered_percent': 100 - final_coverage
     }
 
-def process_metadata(features, min_area=0):
+def measure_clear_sky(relative_path, features, footprint_index, session=None):
+    """
+    Lee la ventana del AOI del QA_PIXEL de cada escena que toca el polígono y
+    devuelve {id: fracción despejada}, emitiendo mensajes de progreso.
+    """
+    polygon = read_aoi_polygon(relative_path)
+    candidates = [features[i] for i in footprint_index.query(polygon)]
+
+    msg = f"\nMidiendo nubosidad en el polígono con QA_PIXEL ({len(candidates)} escenas)..."
+    print(msg)
+    yield msg
+
+    if session is None:
+        from .downloader import login_usgs
+        session = login_usgs()
+
+    clear_sky = compute_clear_sky(candidates, polygon, session)
+    msg = f"Nubosidad en el polígono medida para {len(clear_sky)} de {len(candidates)} escenas"
+    print(msg)
+    yield msg
+    return clear_sky
+
+def process_metadata(features, min_area=0, selector="greedy", render_in_background=RENDER_COVERAGE_IN_BACKGROUND,
+                     cloud_mask=False, session=None, epoch=PRIMARY):
     """
     Procesa los datos según la configuración actual.
+    `epoch` elige la carpeta de exportación del mapa y la capa de cobertura.
     """
 
     msg = ""
     scenes = dict()
+    exports_path = epoch_paths(epoch)["exports"]
 
-    # Ruta basada en la ubicación del script
-    script_dir = Path(__file__).parent  # Carpeta donde está el script
-    data_path = script_dir.parent.parent / "data" / "temp" / "source"  # Ruta a la carpeta con los archivos
+    data_path = SOURCE_PATH  # Ruta a la carpeta con los archivos
 
     # Buscar archivos con extensión .geojson y .shp
     files = sorted(
@@ -446,8 +492,17 @@ def process_metadata(features, min_area=0):
             print(msg)
             yield msg
             
+            # Índice espacial de las huellas, compartido por el análisis y el mapa
+            footprint_index = FootprintIndex(features)
+
+            # Nubosidad dentro del AOI con las máscaras QA_PIXEL (opcional)
+            clear_sky = None
+            if cloud_mask:
+                clear_sky = yield from measure_clear_sky(relative_path, features, footprint_index, session)
+
             # Analizar la cobertura
-            coverage_info = analyze_coverage(relative_path, features, min_area)
+            coverage_info = analyze_coverage(relative_path, features, min_area, footprint_index=footprint_index,
+                                             selector=selector, clear_sky=clear_sky)
 
             msg = f"""\nCobertura total: {coverage_info['total_coverage_percent']:.2f}%\nSe necesitan {len(coverage_info['scenes_needed'])} escenas para cubrir el polígono"""
             print(msg)
@@ -457,12 +512,29 @@ def process_metadata(features, min_area=0):
             scenes_needed = coverage_info['scenes_needed']
             coverage_percent = coverage_info['total_coverage_percent']
 
-            # Generar visualización de cobertura
+            # Capa vectorial para el mapa interactivo
             try:
-                coverage_map = visualize_coverage(relative_path, features, scenes_needed, coverage_percent)
-                msg = f"\nMapa de Cobertura generado: {coverage_map}"
+                coverage_layer = export_coverage_layer(features, scenes_needed, coverage_info['coverage_by_scene'],
+                                                       footprint_index, output_dir=exports_path)
+                msg = f"\nCapa de cobertura generada: {coverage_layer}"
             except Exception as e:
-                msg = "No se pudo generar un Mapa de Cobertura"
+                msg = f"No se pudo generar la capa de cobertura: {str(e)}"
+
+            print(msg)
+            yield msg
+
+            # Generar visualización de cobertura
+            if render_in_background:
+                render_coverage_map_async(relative_path, features, scenes_needed, coverage_percent, footprint_index,
+                                          output_dir=exports_path)
+                msg = "\nGenerando Mapa de Cobertura en segundo plano"
+            else:
+                try:
+                    coverage_map = visualize_coverage(relative_path, features, scenes_needed, coverage_percent, footprint_index,
+                                                      output_dir=exports_path)
+                    msg = f"\nMapa de Cobertura generado: {coverage_map}"
+                except Exception as e:
+                    msg = "No se pudo generar un Mapa de Cobertura"
 
             print(msg)
             yield msg
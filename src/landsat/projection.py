@@ -0,0 +1,60 @@
+from functools import lru_cache
+import numpy as np
+import shapely
+from pyproj import CRS, Transformer
+
+GEOGRAPHIC_CRS = "EPSG:4326"
+# Ancho máximo (grados de longitud) de un AOI para medirlo en su zona UTM;
+# por encima se usa una proyección azimutal equivalente centrada en el AOI
+UTM_MAX_SPAN = 6.0
+
+
+def utm_epsg_for(lon, lat):
+    """Código EPSG de la zona UTM WGS84 que contiene el punto."""
+    zone = min(int((lon + 180) // 6) + 1, 60)
+    return (32600 if lat >= 0 else 32700) + zone
+
+
+@lru_cache(maxsize=64)
+def get_transformer(src_crs, dst_crs):
+    """Transformer de pyproj entre dos CRS, creado una sola vez por par."""
+    return Transformer.from_crs(CRS.from_user_input(src_crs), CRS.from_user_input(dst_crs), always_xy=True)
+
+
+def area_crs_for(geometry):
+    """
+    CRS adecuado para medir áreas de una geometría en coordenadas geográficas:
+    la zona UTM de su centro si cabe en ella, o una proyección azimutal de Lambert
+    de igual área centrada en la geometría.
+    """
+    min_x, min_y, max_x, max_y = geometry.bounds
+    lon, lat = (min_x + max_x) / 2, (min_y + max_y) / 2
+    if max_x - min_x <= UTM_MAX_SPAN:
+        return f"EPSG:{utm_epsg_for(lon, lat)}"
+    return f"+proj=laea +lat_0={lat:.2f} +lon_0={lon:.2f} +datum=WGS84 +units=m +no_defs"
+
+
+def project(geometries, src_crs, dst_crs):
+    """
+    Reproyecta una geometría o un arreglo de geometrías. Todas las coordenadas
+    se transforman en una sola llamada al Transformer.
+    """
+    transformer = get_transformer(str(src_crs), str(dst_crs))
+
+    def transform(coords):
+        x, y = transformer.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack([x, y])
+
+    return shapely.transform(geometries, transform)
+
+
+def common_utm_crs(geographic_bounds):
+    """
+    CRS UTM común para varios rectángulos geográficos (min_x, min_y, max_x, max_y):
+    la zona del centro de su extensión conjunta.
+    """
+    min_x = min(bounds[0] for bounds in geographic_bounds)
+    min_y = min(bounds[1] for bounds in geographic_bounds)
+    max_x = max(bounds[2] for bounds in geographic_bounds)
+    max_y = max(bounds[3] for bounds in geographic_bounds)
+    return f"EPSG:{utm_epsg_for((min_x + max_x) / 2, (min_y + max_y) / 2)}"
@@ -4,7 +4,10 @@ import json
 import geopandas as gpd
 import glob
 import os
-from pathlib import Path
+from .epochs import SOURCE_PATH
+
+# Se puede redirigir a un servidor local (p. ej. tests/fake_usgs_server.py) para pruebas sin red
+STAC_SERVER_URL = os.environ.get("LANDSAT_STAC_URL", "https://landsatlook.usgs.gov/stac-server/search")
 
 def generate_landsat_query(
         file_path,
@@ -55,9 +58,7 @@ def generate_landsat_query(
             "limit": limit
         }
     else:
-        # Ruta basada en la ubicación del script
-        script_dir = Path(__file__).parent
-        data_path = script_dir.parent.parent / "data" / "temp" / "source"
+        data_path = SOURCE_PATH
 
         # Buscar archivos con extensión .geojson y .shp
         files = sorted(
@@ -105,7 +106,7 @@ def fetch_stac_server(query):
         "Accept": "application/geo+json",
     }
 
-    url = f"https://landsatlook.usgs.gov/stac-server/search"
+    url = STAC_SERVER_URL
     
     print(f"Ejecutando consulta a {url} con colecciones: {query.get('collections', [])}")
     
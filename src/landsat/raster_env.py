@@ -0,0 +1,67 @@
+import os
+import threading
+from contextlib import contextmanager
+import rasterio
+
+try:
+    from osgeo import gdal
+except ImportError:  # rasterio trae su propio GDAL; osgeo solo hace falta para mosaic.py
+    gdal = None
+
+# Presupuesto global de hilos del procesamiento raster
+RASTER_THREAD_BUDGET = int(os.environ.get("LANDSAT_RASTER_THREADS", os.cpu_count() or 1))
+
+# Configuración de GDAL para todas las etapas raster. Cada valor se puede
+# sobrescribir por despliegue con la variable de entorno LANDSAT_<OPCIÓN>
+RASTER_DEFAULTS = {
+    # Hilos para warp, compresión y lectura de bloques
+    "GDAL_NUM_THREADS": str(RASTER_THREAD_BUDGET),
+    # Caché de bloques en MB
+    "GDAL_CACHEMAX": "512",
+    # Caché de lecturas de archivos (útil para VRT que releen las mismas escenas)
+    "VSI_CACHE": "TRUE",
+    "VSI_CACHE_SIZE": str(64 * 1024 * 1024),
+    # Tamaño del bloque de trabajo de gdal.Warp/Translate en bytes
+    "GDAL_SWATH_SIZE": str(256 * 1024 * 1024),
+}
+
+_gdal_configured = False
+_gdal_lock = threading.Lock()
+
+
+def _option_value(value):
+    """rasterio.Env necesita enteros para las opciones numéricas (p. ej. GDAL_CACHEMAX)."""
+    return int(value) if isinstance(value, str) and value.isdigit() else value
+
+
+def raster_options(**overrides):
+    """Opciones de GDAL efectivas: valores por defecto, variables de entorno y `overrides`."""
+    options = {key: os.environ.get(f"LANDSAT_{key}", value) for key, value in RASTER_DEFAULTS.items()}
+    options.update(overrides)
+    return {key: _option_value(value) for key, value in options.items()}
+
+
+def configure_gdal():
+    """
+    Aplica las opciones a osgeo.gdal una sola vez. Sus opciones de configuración
+    son globales del proceso, por eso no se cambian por etapa.
+    """
+    global _gdal_configured
+    if gdal is None or _gdal_configured:
+        return
+    with _gdal_lock:
+        if not _gdal_configured:
+            for key, value in raster_options().items():
+                gdal.SetConfigOption(key, str(value))
+            _gdal_configured = True
+
+
+@contextmanager
+def raster_env(**overrides):
+    """
+    Entorno de GDAL para una etapa raster: configura osgeo.gdal y abre un
+    rasterio.Env (local al hilo) con las mismas opciones.
+    """
+    configure_gdal()
+    with rasterio.Env(**raster_options(**overrides)):
+        yield
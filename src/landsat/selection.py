@@ -0,0 +1,315 @@
+import heapq
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+from shapely.ops import polygonize, unary_union
+
+# Se suma a la nubosidad para que una escena sin nubes no tenga peso cero
+CLOUD_WEIGHT_OFFSET = 1.0
+# Ganancia mínima (fracción del área del polígono) para que una escena valga la pena
+MIN_GAIN_FRACTION = 1e-4
+# Por encima de este número de escenas candidatas el modo exacto usa el voraz
+ILP_MAX_SCENES = 150
+
+SELECTORS = ("greedy", "ilp")
+
+
+def scene_weights(scenes_df):
+    """Peso de cada escena en la cobertura de conjuntos: su nubosidad."""
+    return scenes_df['cloud_cover'].astype(float).to_numpy() + CLOUD_WEIGHT_OFFSET
+
+
+def exceeds_window(date_min, date_max, date, window_days):
+    """Indica si agregar `date` a la selección [date_min, date_max] supera la ventana temporal."""
+    if window_days is None or date_min is None:
+        return False
+    span = max(date_max, date) - min(date_min, date)
+    return span.days > window_days
+
+
+def greedy_set_cover(scenes_df, polygon, window_days=None, delete_out_range=True):
+    """
+    Cobertura de conjuntos ponderada voraz: en cada paso elige la escena con mayor
+    área nueva del polígono (no cubierta aún) por unidad de peso. Las ganancias se
+    reevalúan de forma perezosa con una cola de prioridad, ya que solo pueden bajar.
+    Se mantiene una escena por path/row y la ventana temporal de `window_days`.
+    Devuelve las posiciones (en scenes_df) de las escenas elegidas.
+    """
+    if scenes_df.empty:
+        return []
+
+    pieces = shapely.intersection(scenes_df['footprint'].to_numpy(), polygon)
+    gains = shapely.area(pieces)
+    weights = scene_weights(scenes_df)
+    path_rows = scenes_df['path_row'].to_numpy()
+    dates = list(scenes_df['date_obj'])
+    min_gain = polygon.area * MIN_GAIN_FRACTION
+
+    heap = [(-gains[i] / weights[i], i) for i in range(len(scenes_df)) if gains[i] >= min_gain]
+    heapq.heapify(heap)
+
+    uncovered = polygon
+    selected, used_path_rows = [], set()
+    date_min = date_max = None
+
+    while heap and uncovered.area >= min_gain:
+        _, i = heapq.heappop(heap)
+        if path_rows[i] in used_path_rows:
+            continue
+
+        if exceeds_window(date_min, date_max, dates[i], window_days):
+            if delete_out_range:
+                continue  # La ventana solo puede crecer: la escena queda descartada
+            break  # Si no, terminamos la selección sin incluirla
+
+        # Reevaluar la ganancia contra el área aún no cubierta
+        gain = shapely.area(shapely.intersection(pieces[i], uncovered))
+        if gain < min_gain:
+            continue
+        ratio = gain / weights[i]
+        if heap and ratio < -heap[0][0]:
+            heapq.heappush(heap, (-ratio, i))
+            continue
+
+        selected.append(i)
+        used_path_rows.add(path_rows[i])
+        uncovered = uncovered.difference(pieces[i])
+        date_min = dates[i] if date_min is None else min(date_min, dates[i])
+        date_max = dates[i] if date_max is None else max(date_max, dates[i])
+
+    return prune_redundant(pieces, selected, weights, min_gain)
+
+
+def prune_redundant(pieces, selected, weights, min_gain):
+    """
+    Quita de la selección las escenas (de mayor a menor peso) cuya área ya
+    cubren las demás elegidas, algo que la elección voraz no puede deshacer.
+    """
+    kept = list(selected)
+    for i in sorted(selected, key=lambda j: -weights[j]):
+        others = [pieces[j] for j in kept if j != i]
+        if others and shapely.area(shapely.difference(pieces[i], unary_union(others))) < min_gain:
+            kept.remove(i)
+    return kept
+
+
+def coverage_atoms(pieces, polygon):
+    """
+    Divide el polígono en regiones elementales según los bordes de las huellas.
+    Devuelve el área de cada región y, por región, las escenas que la cubren.
+    """
+    lines = unary_union([shapely.boundary(polygon)] + list(shapely.boundary(pieces)))
+    faces = np.array(list(polygonize(lines)), dtype=object)
+    if not len(faces):
+        return np.zeros(0), []
+
+    points = shapely.point_on_surface(faces)
+    inside = shapely.contains(polygon, points)
+    faces, points = faces[inside], points[inside]
+
+    atom_idx, scene_idx = STRtree(pieces).query(points, predicate="within")
+    covers = [scene_idx[atom_idx == a] for a in range(len(faces))]
+    return shapely.area(faces), covers
+
+
+def ilp_set_cover(scenes_df, polygon, window_days=None):
+    """
+    Selección exacta por programación lineal entera (scipy.optimize.milp):
+    primero maximiza el área cubierta y, con esa cobertura fija, minimiza el peso
+    total. Respeta una escena por path/row y la ventana temporal.
+    Devuelve las posiciones elegidas o None si scipy no está disponible o no hay solución.
+    """
+    try:
+        from scipy.optimize import milp, LinearConstraint, Bounds
+        from scipy.sparse import lil_matrix
+    except ImportError:
+        print("scipy no está instalado; se usa la selección voraz")
+        return None
+
+    if scenes_df.empty:
+        return []
+
+    n = len(scenes_df)
+    pieces = shapely.intersection(scenes_df['footprint'].to_numpy(), polygon)
+    areas, covers = coverage_atoms(pieces, polygon)
+    m = len(areas)
+
+    # Variables: x (una por escena, binaria) seguidas de y (una por región, continua en [0, 1])
+    rows = []
+    # y_a <= suma de x_j que cubren la región a
+    for a, scenes in enumerate(covers):
+        rows.append(({n + a: 1.0, **{int(j): -1.0 for j in scenes}}, 0.0))
+    # Una escena por path/row
+    for _, group in pd.Series(range(n)).groupby(scenes_df['path_row'].to_numpy()):
+        if len(group) > 1:
+            rows.append(({int(j): 1.0 for j in group}, 1.0))
+    # Ventana temporal: dos escenas demasiado separadas no pueden elegirse juntas
+    if window_days is not None:
+        days = scenes_df['date_obj'].to_numpy().astype('datetime64[D]').astype(np.int64)
+        too_far = np.abs(days[:, None] - days[None, :]) > window_days
+        for j, k in zip(*np.nonzero(np.triu(too_far, 1))):
+            rows.append(({int(j): 1.0, int(k): 1.0}, 1.0))
+
+    matrix = lil_matrix((len(rows), n + m))
+    upper = np.zeros(len(rows))
+    for r, (coefficients, bound) in enumerate(rows):
+        for col, value in coefficients.items():
+            matrix[r, col] = value
+        upper[r] = bound
+    constraints = [LinearConstraint(matrix.tocsr(), -np.inf, upper)] if rows else []
+    integrality = np.concatenate([np.ones(n), np.zeros(m)])
+    bounds = Bounds(0, 1)
+
+    # Etapa 1: máxima cobertura
+    coverage_cost = np.concatenate([np.zeros(n), -areas])
+    result = milp(coverage_cost, constraints=constraints, integrality=integrality, bounds=bounds)
+    if not result.success:
+        return None
+    best_area = -result.fun
+
+    # Etapa 2: mínimo peso con la cobertura máxima
+    area_row = np.concatenate([np.zeros(n), areas]).reshape(1, -1)
+    tolerance = polygon.area * MIN_GAIN_FRACTION
+    constraints.append(LinearConstraint(area_row, best_area - tolerance, np.inf))
+    weight_cost = np.concatenate([scene_weights(scenes_df), np.zeros(m)])
+    result = milp(weight_cost, constraints=constraints, integrality=integrality, bounds=bounds)
+    if not result.success:
+        return None
+
+    return [j for j in range(n) if result.x[j] > 0.5]
+
+
+def best_time_window(scenes_df, polygon, window_days):
+    """
+    Busca, con dos punteros sobre las escenas ordenadas por fecha, la ventana de
+    `window_days` días que maximiza la cobertura del polígono y, a igual cobertura,
+    minimiza la menor nubosidad disponible en cada path/row, promediada según el
+    área del polígono que cubre. Solo se evalúan ventanas maximales (a las que no
+    se les puede agregar otra escena), ya que contienen a todas las demás.
+
+    La cobertura se mantiene de forma incremental: el polígono se divide una sola
+    vez en regiones elementales según las huellas de los path/row (coverage_atoms)
+    y, cuando un path/row entra o sale de la ventana, solo se actualiza el contador
+    de sus regiones. La menor nubosidad de cada path/row se mantiene con montículos
+    con borrado perezoso. Tras la división, el recorrido cuesta O(n log n + n·k),
+    con k el número de regiones que cubre un path/row.
+    Devuelve las posiciones (en scenes_df) de las escenas de la mejor ventana.
+    """
+    dated = scenes_df['date_obj'].notna().to_numpy()
+    order = np.flatnonzero(dated)[np.argsort(scenes_df['date_obj'].to_numpy()[dated], kind="stable")]
+    if not len(order):
+        return np.arange(len(scenes_df))
+
+    days = scenes_df['date_obj'].to_numpy()[order].astype('datetime64[D]').astype(np.int64)
+    clouds = scenes_df['cloud_cover'].astype(float).to_numpy()[order]
+    path_rows = scenes_df['path_row'].to_numpy()[order]
+
+    # Huella de cada path/row dentro del polígono (unión de sus escenas)
+    pieces = shapely.intersection(scenes_df['footprint'].to_numpy()[order], polygon)
+    path_row_pieces = {
+        path_row: shapely.union_all(pieces[path_rows == path_row]) for path_row in np.unique(path_rows)
+    }
+    path_row_areas = {path_row: shapely.area(piece) for path_row, piece in path_row_pieces.items()}
+
+    # Regiones elementales del polígono y las que cubre cada path/row
+    atom_areas, covers = coverage_atoms(np.array(list(path_row_pieces.values()), dtype=object), polygon)
+    path_row_atoms = {path_row: [] for path_row in path_row_pieces}
+    path_row_list = list(path_row_pieces)
+    for atom, covering in enumerate(covers):
+        for j in covering:
+            path_row_atoms[path_row_list[j]].append(atom)
+    # Path/row presentes en la ventana que cubren cada región
+    atom_counts = np.zeros(len(atom_areas), dtype=np.int64)
+
+    tolerance = polygon.area * MIN_GAIN_FRACTION
+    counts, heaps, best_cloud = {}, {}, {}
+    # Suma de nubosidad mínima por path/row ponderada por área, y área total ponderada
+    cloud_total = area_total = 0.0
+    covered = 0.0
+    best = (-1.0, np.inf, 0, 0)
+    left = 0
+
+    def refresh(path_row):
+        """Actualiza la menor nubosidad del path/row descartando escenas fuera de la ventana."""
+        nonlocal cloud_total, area_total
+        heap = heaps[path_row]
+        while heap and heap[0][1] < left:
+            heapq.heappop(heap)
+        area = path_row_areas[path_row]
+        if path_row in best_cloud:
+            cloud_total -= best_cloud.pop(path_row) * area
+            area_total -= area
+        if heap:
+            best_cloud[path_row] = heap[0][0]
+            cloud_total += heap[0][0] * area
+            area_total += area
+
+    def update_coverage(path_row, step):
+        """Suma (step=1) o quita (step=-1) un path/row de la cobertura de la ventana."""
+        nonlocal covered
+        for atom in path_row_atoms[path_row]:
+            if step < 0:
+                atom_counts[atom] -= 1
+            if not atom_counts[atom]:
+                covered += step * atom_areas[atom]
+            if step > 0:
+                atom_counts[atom] += 1
+
+    for right in range(len(order)):
+        path_row = path_rows[right]
+        counts[path_row] = counts.get(path_row, 0) + 1
+        if counts[path_row] == 1:
+            update_coverage(path_row, 1)
+        heapq.heappush(heaps.setdefault(path_row, []), (clouds[right], right))
+        refresh(path_row)
+
+        # Avanzar el puntero izquierdo hasta que la ventana cumpla el límite
+        while days[right] - days[left] > window_days:
+            leaving = path_rows[left]
+            counts[leaving] -= 1
+            if not counts[leaving]:
+                del counts[leaving]
+                update_coverage(leaving, -1)
+            left += 1
+            refresh(leaving)
+
+        # Evaluar solo si la siguiente escena ya no cabe en esta ventana
+        if right + 1 < len(order) and days[right + 1] - days[left] <= window_days:
+            continue
+
+        cloud = cloud_total / area_total if area_total > 0 else np.inf
+        if covered > best[0] + tolerance or (covered >= best[0] - tolerance and cloud < best[1]):
+            best = (covered, cloud, left, right)
+
+    _, _, start, end = best
+    return np.sort(order[start:end + 1])
+
+
+def select_scenes(scenes_df, polygon, selector="greedy", window_days=None, delete_out_range=True, window_search=True):
+    """
+    Elige las escenas que cubren el polígono con el selector indicado:
+    "greedy" (cobertura de conjuntos ponderada voraz) o "ilp" (exacta, para
+    pocas escenas; si no es posible se usa la voraz).
+    Con `window_search` la selección se hace dentro de la mejor ventana temporal
+    (ver best_time_window); si no, la ventana se aplica de forma voraz.
+    Devuelve un DataFrame con las filas elegidas de scenes_df.
+    """
+    if selector not in SELECTORS:
+        raise ValueError(f"Selector de escenas desconocido: {selector}. Opciones: {', '.join(SELECTORS)}")
+
+    scenes_df = scenes_df.reset_index(drop=True)
+    if window_search and window_days is not None and not scenes_df.empty:
+        scenes_df = scenes_df.iloc[best_time_window(scenes_df, polygon, window_days)].reset_index(drop=True)
+
+    selected = None
+    if selector == "ilp":
+        if len(scenes_df) > ILP_MAX_SCENES:
+            print(f"Demasiadas escenas candidatas ({len(scenes_df)}) para la selección exacta; se usa la voraz")
+        else:
+            selected = ilp_set_cover(scenes_df, polygon, window_days)
+
+    if selected is None:
+        selected = greedy_set_cover(scenes_df, polygon, window_days, delete_out_range)
+
+    return scenes_df.iloc[selected].reset_index(drop=True)
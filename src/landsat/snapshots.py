@@ -0,0 +1,68 @@
+import glob
+import gzip
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from .epochs import DATA_ROOT
+
+RUNS_PATH = DATA_ROOT / "temp" / "runs"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_PATTERN = "run_*.json.gz"
+
+
+def _to_json(value):
+    """Convierte escalares de numpy y otros tipos no serializables."""
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def save_search_snapshot(config, epochs, runs_path=None):
+    """
+    Guarda la búsqueda de una ejecución (configuración, catálogo STAC y escenas
+    seleccionadas por época) como JSON comprimido con gzip.
+    `epochs` es {época: (features, scenes)}. Devuelve la ruta del archivo.
+    """
+    runs_path = Path(runs_path) if runs_path else RUNS_PATH
+    runs_path.mkdir(parents=True, exist_ok=True)
+
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "config": config,
+        "epochs": {epoch: {"features": features, "scenes": scenes} for epoch, (features, scenes) in epochs.items()},
+    }
+
+    output_file = runs_path / f"run_{datetime.now():%Y%m%d_%H%M%S_%f}.json.gz"
+    temp_file = output_file.with_name(output_file.name + ".part")
+    with gzip.open(temp_file, "wt", encoding="utf-8") as f:
+        json.dump(snapshot, f, separators=(",", ":"), default=_to_json)
+    os.replace(temp_file, output_file)
+    return output_file
+
+
+def latest_snapshot(runs_path=None):
+    """Ruta de la búsqueda guardada más reciente o None."""
+    runs_path = Path(runs_path) if runs_path else RUNS_PATH
+    files = sorted(glob.glob(str(runs_path / SNAPSHOT_PATTERN)), key=os.path.getmtime, reverse=True)
+    return Path(files[0]) if files else None
+
+
+def load_search_snapshot(snapshot_file=None):
+    """
+    Lee una búsqueda guardada (la más reciente si no se indica archivo).
+    Devuelve (config, {época: (features, scenes)}).
+    """
+    snapshot_file = snapshot_file or latest_snapshot()
+    if snapshot_file is None or not os.path.exists(snapshot_file):
+        raise Exception(f"No se encontró ninguna búsqueda guardada en: {RUNS_PATH}")
+
+    with gzip.open(snapshot_file, "rt", encoding="utf-8") as f:
+        snapshot = json.load(f)
+
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        raise Exception(f"Versión de búsqueda guardada no soportada: {snapshot.get('version')}")
+
+    epochs = {epoch: (data["features"], data["scenes"]) for epoch, data in snapshot["epochs"].items()}
+    return snapshot["config"], epochs
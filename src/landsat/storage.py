@@ -0,0 +1,307 @@
+import os
+import shutil
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from urllib.parse import urlparse, unquote
+import requests
+from requests.adapters import HTTPAdapter
+from .concurrency import BACKPRESSURE_STATUS
+
+# Raíz del espejo local (p. ej. un NAS montado) con la misma estructura de
+# rutas que los servidores de USGS: <raíz>/<host>/<ruta> o <raíz>/<ruta>.
+MIRROR_ROOT = os.environ.get("LANDSAT_MIRROR_ROOT", "")
+
+CHUNK_SIZE = 8192
+
+# Tiempo máximo de conexión y de lectura por petición HTTP (segundos)
+HTTP_TIMEOUT = (15, 120)
+# Reintentos ante 429/503/timeouts antes de dar la descarga por fallida
+HTTP_RETRIES = 3
+
+
+class AssetStream:
+    """Flujo de lectura de un asset con su tamaño total (0 si se desconoce)."""
+
+    def __init__(self, chunks, total_size=0, source=""):
+        self._chunks = chunks
+        self.total_size = total_size
+        self.source = source
+
+    def iter_content(self, chunk_size=CHUNK_SIZE):
+        return self._chunks(chunk_size)
+
+
+@contextmanager
+def atomic_output(output_file):
+    """
+    Entrega una ruta temporal junto a output_file y la mueve a su lugar solo si
+    el bloque termina sin error: una descarga fallida no deja un archivo parcial.
+    """
+    temp_file = f"{output_file}.part"
+    try:
+        yield temp_file
+        os.replace(temp_file, output_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+class StorageBackend(ABC):
+    """Interfaz común para obtener assets a partir de su href."""
+
+    def can_handle(self, href):
+        return True
+
+    @abstractmethod
+    def exists(self, href):
+        """Indica si el asset está disponible."""
+
+    @abstractmethod
+    def open(self, href):
+        """Context manager que entrega un AssetStream del asset."""
+
+    def fetch(self, href, output_file):
+        """Copia el asset completo en output_file y devuelve el número de bytes escritos."""
+        written = 0
+        with self.open(href) as stream, atomic_output(output_file) as temp_file:
+            with open(temp_file, 'wb') as file:
+                for chunk in stream.iter_content(CHUNK_SIZE):
+                    file.write(chunk)
+                    written += len(chunk)
+        return written
+
+
+class FileBackend(StorageBackend):
+    """Lee assets desde el sistema de archivos (href file:// o ruta local)."""
+
+    def can_handle(self, href):
+        scheme = urlparse(href).scheme
+        return scheme == "file" or scheme == "" or (len(scheme) == 1 and os.name == "nt")
+
+    @staticmethod
+    def to_path(href):
+        parsed = urlparse(href)
+        if parsed.scheme == "file":
+            return unquote(parsed.netloc + parsed.path) if parsed.netloc not in ("", "localhost") else unquote(parsed.path)
+        return href
+
+    def exists(self, href):
+        return os.path.isfile(self.to_path(href))
+
+    @contextmanager
+    def open(self, href):
+        path = self.to_path(href)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"El asset {href} no existe en {path}")
+
+        with open(path, 'rb') as file:
+            def chunks(chunk_size):
+                while True:
+                    data = file.read(chunk_size)
+                    if not data:
+                        break
+                    yield data
+
+            yield AssetStream(chunks, os.path.getsize(path), source=path)
+
+    def fetch(self, href, output_file):
+        path = self.to_path(href)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"El asset {href} no existe en {path}")
+        with atomic_output(output_file) as temp_file:
+            shutil.copyfile(path, temp_file)
+        return os.path.getsize(output_file)
+
+
+class HTTPBackend(StorageBackend):
+    """
+    Descarga assets por HTTP(S) usando una sesión autenticada de requests.
+    Si se indica un controlador de concurrencia, cada transferencia ocupa un cupo
+    del host y le informa del rendimiento y de las señales de congestión.
+    """
+
+    def __init__(self, session, concurrency=None, timeout=HTTP_TIMEOUT, retries=HTTP_RETRIES):
+        self.session = session
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+
+        if concurrency is not None and not self._has_pool(session, concurrency.max_concurrency):
+            # Un pool de conexiones por host suficiente para la concurrencia máxima;
+            # una sesión compartida (p. ej. entre épocas) conserva el que ya tiene
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=concurrency.max_concurrency)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+
+    @staticmethod
+    def _has_pool(session, pool_maxsize):
+        adapter = getattr(session, "adapters", {}).get("https://")
+        return isinstance(adapter, HTTPAdapter) and adapter._pool_maxsize >= pool_maxsize
+
+    def _slot(self, host):
+        return self.concurrency.slot(host) if self.concurrency else nullcontext()
+
+    def _report_failure(self, host, reason):
+        if self.concurrency:
+            self.concurrency.record_failure(host, reason)
+
+    @staticmethod
+    def _retry_delay(response, attempt):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), 60.0)
+        return min(2 ** attempt, 30)
+
+    def can_handle(self, href):
+        return urlparse(href).scheme in ("http", "https")
+
+    def exists(self, href):
+        try:
+            return self.session.head(href, timeout=self.timeout).status_code == 200
+        except Exception as e:
+            print(f"Error verificando URL {href}: {str(e)}")
+            return False
+
+    @contextmanager
+    def open(self, href):
+        host = urlparse(href).netloc
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            with self._slot(host):
+                started = time.monotonic()
+                try:
+                    response = self.session.get(href, stream=True, timeout=self.timeout)
+                except (requests.Timeout, requests.ConnectionError) as e:
+                    self._report_failure(host, type(e).__name__)
+                    if last_attempt:
+                        raise
+                    response, delay = None, self._retry_delay(None, attempt)
+
+                if response is None:
+                    pass
+                elif response.status_code in BACKPRESSURE_STATUS:
+                    self._report_failure(host, f"HTTP {response.status_code}")
+                    if last_attempt:
+                        response.close()
+                        response.raise_for_status()
+                    delay = self._retry_delay(response, attempt)
+                    response.close()
+                else:
+                    with response:
+                        response.raise_for_status()
+                        latency = time.monotonic() - started
+                        total_size = int(response.headers.get('content-length', 0))
+                        received = [0]
+
+                        def chunks(chunk_size):
+                            for chunk in response.iter_content(chunk_size=chunk_size):
+                                received[0] += len(chunk)
+                                yield chunk
+
+                        try:
+                            yield AssetStream(chunks, total_size, source=href)
+                        except (requests.Timeout, requests.ConnectionError) as e:
+                            self._report_failure(host, type(e).__name__)
+                            raise
+
+                        if self.concurrency:
+                            self.concurrency.record_success(host, received[0], latency)
+                    return
+
+            # La espera se hace fuera del cupo para no frenar al resto de descargas del host
+            time.sleep(delay)
+
+
+class MirrorBackend(StorageBackend):
+    """
+    Resuelve el href contra un espejo local y, si el archivo no está en el
+    espejo, delega en el backend de respaldo (normalmente HTTP).
+    """
+
+    def __init__(self, mirror_root, fallback):
+        self.mirror_root = Path(mirror_root)
+        self.local = FileBackend()
+        self.fallback = fallback
+
+    def can_handle(self, href):
+        return self.fallback.can_handle(href)
+
+    def resolve(self, href):
+        """Devuelve la ruta del asset en el espejo o None si no está espejado."""
+        parsed = urlparse(href)
+        relative = unquote(parsed.path).lstrip("/")
+        if not relative:
+            return None
+
+        for candidate in (self.mirror_root / parsed.netloc / relative, self.mirror_root / relative):
+            if candidate.is_file():
+                return str(candidate)
+        return None
+
+    def exists(self, href):
+        return self.resolve(href) is not None or self.fallback.exists(href)
+
+    @contextmanager
+    def open(self, href):
+        local_path = self.resolve(href)
+        if local_path:
+            with self.local.open(local_path) as stream:
+                yield stream
+        else:
+            with self.fallback.open(href) as stream:
+                yield stream
+
+    def fetch(self, href, output_file):
+        local_path = self.resolve(href)
+        if local_path:
+            return self.local.fetch(local_path, output_file)
+        return self.fallback.fetch(href, output_file)
+
+
+class CompositeBackend(StorageBackend):
+    """Selecciona el backend adecuado según el esquema del href."""
+
+    def __init__(self, backends):
+        self.backends = backends
+
+    def _backend_for(self, href):
+        for backend in self.backends:
+            if backend.can_handle(href):
+                return backend
+        raise ValueError(f"No hay un backend de almacenamiento para {href}")
+
+    def exists(self, href):
+        return self._backend_for(href).exists(href)
+
+    @contextmanager
+    def open(self, href):
+        with self._backend_for(href).open(href) as stream:
+            yield stream
+
+    def fetch(self, href, output_file):
+        return self._backend_for(href).fetch(href, output_file)
+
+
+def get_storage_backend(session=None, mirror_root=None, concurrency=None):
+    """
+    Construye el backend de almacenamiento para las descargas:
+    file:// y rutas locales se leen directamente; las URLs HTTP se buscan
+    primero en el espejo local (si está configurado) y luego se descargan,
+    con la concurrencia por host regulada por `concurrency` si se indica.
+    """
+    if mirror_root is None:
+        mirror_root = MIRROR_ROOT
+
+    backends = [FileBackend()]
+    if session is not None:
+        http = HTTPBackend(session, concurrency)
+        if mirror_root and os.path.isdir(mirror_root):
+            print(f"Usando espejo local de escenas: {mirror_root}")
+            backends.append(MirrorBackend(mirror_root, http))
+        else:
+            backends.append(http)
+
+    return CompositeBackend(backends)
@@ -0,0 +1,159 @@
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+import rasterio
+from rasterio.windows import Window
+
+TIFF_SIGNATURES = {
+    b"II*\x00": ("<", False),
+    b"MM\x00*": (">", False),
+    b"II+\x00": ("<", True),
+    b"MM\x00+": (">", True),
+}
+
+# Tamaño en bytes de cada tipo de dato TIFF
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 16: 8, 17: 8, 18: 8}
+TIFF_TYPE_FORMATS = {3: "H", 4: "I", 16: "Q"}
+
+# Etiquetas con los desplazamientos y tamaños de los bloques de datos (strips o tiles)
+STRIP_TAGS = (273, 279)
+TILE_TAGS = (324, 325)
+
+VERIFY_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+
+def _read_tag_values(file, order, bigtiff, entry):
+    """Lee los valores de una entrada del IFD (en línea o en su desplazamiento)."""
+    if bigtiff:
+        tag, type_id, count = struct.unpack(f"{order}HHQ", entry[:12])
+        inline, value_field = 8, entry[12:20]
+    else:
+        tag, type_id, count = struct.unpack(f"{order}HHI", entry[:8])
+        inline, value_field = 4, entry[8:12]
+
+    fmt = TIFF_TYPE_FORMATS.get(type_id)
+    if fmt is None:
+        return tag, None
+    size = TIFF_TYPE_SIZES[type_id] * count
+    if size <= inline:
+        data = value_field[:size]
+    else:
+        offset = struct.unpack(f"{order}{'Q' if bigtiff else 'I'}", value_field)[0]
+        file.seek(offset)
+        data = file.read(size)
+        if len(data) < size:
+            raise ValueError(f"etiqueta {tag} apunta fuera del archivo")
+    return tag, struct.unpack(f"{order}{count}{fmt}", data)
+
+
+def check_tiff_structure(file_path):
+    """
+    Revisa la cabecera TIFF y el primer IFD sin decodificar píxeles.
+    Devuelve None si la estructura es válida o un texto con el motivo del fallo.
+    """
+    file_size = os.path.getsize(file_path)
+    if file_size < 16:
+        return f"archivo demasiado pequeño ({file_size} bytes)"
+
+    with open(file_path, "rb") as file:
+        head = file.read(16)
+        signature = TIFF_SIGNATURES.get(head[:4])
+        if signature is None:
+            lowered = head.lower()
+            if lowered.lstrip().startswith((b"<!doctype", b"<html", b"<?xml", b"{")):
+                return "el archivo es una página de error HTML/JSON, no un TIFF"
+            return "cabecera TIFF inválida"
+        order, bigtiff = signature
+
+        if bigtiff:
+            ifd_offset = struct.unpack(f"{order}Q", head[8:16])[0]
+        else:
+            ifd_offset = struct.unpack(f"{order}I", head[4:8])[0]
+        if ifd_offset >= file_size:
+            return "el IFD está fuera del archivo (descarga truncada)"
+
+        file.seek(ifd_offset)
+        count_size, entry_size = (8, 20) if bigtiff else (2, 12)
+        raw_count = file.read(count_size)
+        if len(raw_count) < count_size:
+            return "IFD incompleto (descarga truncada)"
+        entry_count = struct.unpack(f"{order}{'Q' if bigtiff else 'H'}", raw_count)[0]
+        entries = file.read(entry_count * entry_size)
+        if len(entries) < entry_count * entry_size:
+            return "IFD incompleto (descarga truncada)"
+
+        tags = {}
+        for i in range(entry_count):
+            entry = entries[i * entry_size:(i + 1) * entry_size]
+            try:
+                tag, values = _read_tag_values(file, order, bigtiff, entry)
+            except (ValueError, struct.error) as e:
+                return f"IFD corrupto: {str(e)}"
+            if tag in STRIP_TAGS + TILE_TAGS:
+                tags[tag] = values
+
+    offsets_tag, counts_tag = TILE_TAGS if TILE_TAGS[0] in tags else STRIP_TAGS
+    offsets, counts = tags.get(offsets_tag), tags.get(counts_tag)
+    if not offsets or not counts:
+        return "no se encontraron bloques de datos en el IFD"
+
+    data_end = max(offset + count for offset, count in zip(offsets, counts))
+    if data_end > file_size:
+        return f"datos incompletos: se esperaban {data_end} bytes y el archivo tiene {file_size}"
+    return None
+
+
+def decode_last_block(file_path):
+    """Decodifica el último bloque del raster para detectar datos corruptos."""
+    with rasterio.open(file_path) as src:
+        block_height, block_width = src.block_shapes[0]
+        row = ((src.height - 1) // block_height) * block_height
+        col = ((src.width - 1) // block_width) * block_width
+        window = Window(col, row, min(block_width, src.width - col), min(block_height, src.height - row))
+        src.read(1, window=window)
+
+
+def verify_tif(file_path, expected_size=None, full_decode=False):
+    """
+    Verifica un TIF descargado: cabecera, bloques de datos dentro del archivo,
+    tamaño contra el Content-Length y, opcionalmente, decodificación del último bloque.
+    Devuelve None si es válido o el motivo del fallo.
+    """
+    if not os.path.exists(file_path):
+        return "el archivo no existe"
+
+    file_size = os.path.getsize(file_path)
+    if expected_size and file_size != expected_size:
+        return f"tamaño {file_size} distinto del Content-Length {expected_size}"
+
+    try:
+        reason = check_tiff_structure(file_path)
+    except OSError as e:
+        return f"no se pudo leer el archivo: {str(e)}"
+    if reason:
+        return reason
+
+    if full_decode:
+        try:
+            decode_last_block(file_path)
+        except Exception as e:
+            return f"error al decodificar el último bloque: {str(e)}"
+    return None
+
+
+def verify_downloads(file_paths, expected_sizes=None, full_decode=False, max_workers=None):
+    """
+    Verifica en paralelo una lista de TIFs.
+    Devuelve un diccionario {ruta: motivo} solo con los archivos inválidos.
+    """
+    expected_sizes = expected_sizes or {}
+    file_paths = list(file_paths)
+    if not file_paths:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or VERIFY_WORKERS) as executor:
+        reasons = executor.map(
+            lambda path: verify_tif(path, expected_sizes.get(path), full_decode),
+            file_paths
+        )
+        return {path: reason for path, reason in zip(file_paths, reasons) if reason}
@@ -153,16 +153,22 @@ class ProcessThread(QThread):
     """
     result_ready = pyqtSignal(object)  # Señal para devolver los resultados
     error_occurred = pyqtSignal(str)   # Señal para comunicar errores
+    metadata_ready = pyqtSignal()      # Señal al terminar la búsqueda (capa de cobertura disponible)
 
-    def __init__(self, config):
+    def __init__(self, config, snapshot_file=None):
         super().__init__()
         self.config = config
         self.landsat_controller = LandsatController(config)
+        # Búsqueda guardada desde la que reanudar sin consultar el servidor STAC
+        self.snapshot_file = snapshot_file
 
     def run(self):
         """Ejecuta LandsatController"""
         try:
-            gen = self.landsat_controller.fetch_data()  # Obtiene el generador
+            if self.snapshot_file:
+                gen = self.landsat_controller.resume_search(self.snapshot_file)
+            else:
+                gen = self.landsat_controller.fetch_data()  # Obtiene el generador
             
             while True:
                 message = next(gen)  # Obtiene el siguiente mensaje
@@ -173,6 +179,7 @@ class ProcessThread(QThread):
             resultado = e.value  # Captura el valor de retorno
             features, scenes = resultado
             indices = self.config["selected_indices"]
+            self.metadata_ready.emit()
             print("Lista de diccionarios (scenes):", scenes)
 
             try:
@@ -474,6 +481,13 @@ class MapAppWindow(QMainWindow):
             'remove': False
         }
 
+        # Capa de cobertura de la última búsqueda (se muestra al terminar la búsqueda);
+        # el mapa se centra en ella solo la primera vez que se añade
+        self.coverage_layer_file = None
+        self.coverage_layer_fitted = False
+        # Vista del mapa [lat, lon, zoom] que se conserva al regenerarlo
+        self.map_view = None
+
         # Crear y cargar el mapa
         self.html_file = self.create_interactive_map()
         self.web_view.load(QUrl.fromLocalFile(self.html_file))
@@ -839,8 +853,12 @@ class MapAppWindow(QMainWindow):
         Crea un mapa de Folium con herramientas de dibujo y lo guarda como HTML.
         
         """
-        # Crear mapa centrado en Colombia
-        m = folium.Map(location=[4.6097, -74.0817], zoom_start=6)
+        # Crear mapa centrado en Colombia o en la vista que tenía el usuario
+        if getattr(self, "map_view", None):
+            lat, lon, zoom = self.map_view
+            m = folium.Map(location=[lat, lon], zoom_start=zoom)
+        else:
+            m = folium.Map(location=[4.6097, -74.0817], zoom_start=6)
 
         # Crear una capa para almacenar los elementos dibujados
         draw_items = folium.FeatureGroup(name="Drawn polygons")
@@ -905,6 +923,10 @@ class MapAppWindow(QMainWindow):
 
         if self.show_instructions:
             m.get_root().html.add_child(folium.Element(instructions_html))
+
+        # Añadir huellas de las escenas de la última búsqueda
+        if self.coverage_layer_file and os.path.exists(self.coverage_layer_file):
+            self.add_coverage_layer(m, self.coverage_layer_file)
         
         # Añadir JavaScript para recuperar los polígonos dibujados
         js = """
@@ -953,6 +975,54 @@ class MapAppWindow(QMainWindow):
         
         return html_file
         
+    def add_coverage_layer(self, m, layer_file):
+        """
+        Añade al mapa las huellas candidatas y seleccionadas de la capa GeoJSON
+        de cobertura, con los metadatos de cada escena en un popup.
+        """
+        with open(layer_file, 'r') as f:
+            layer = json.load(f)
+        if not layer.get("features"):
+            return
+
+        fields = ["id", "date", "cloud_cover", "coverage_percent", "path", "row"]
+        aliases = ["Escena", "Fecha", "Nubes (%)", "Cobertura (%)", "Path", "Row"]
+        styles = {
+            False: {"color": "#757575", "weight": 1, "fillColor": "#BDBDBD", "fillOpacity": 0.05},
+            True: {"color": "#1B5E20", "weight": 2, "fillColor": "#66BB6A", "fillOpacity": 0.3},
+        }
+
+        focus = None
+        for selected, name in ((False, "Escenas candidatas"), (True, "Escenas seleccionadas")):
+            features = [feature for feature in layer["features"] if feature["properties"].get("selected") == selected]
+            if not features:
+                continue
+            style = styles[selected]
+            focus = folium.GeoJson(
+                {"type": "FeatureCollection", "features": features},
+                name=name,
+                style_function=lambda feature, style=style: style,
+                popup=folium.GeoJsonPopup(fields=fields, aliases=aliases),
+                show=selected,
+            ).add_to(m)
+
+        folium.LayerControl(collapsed=False).add_to(m)
+
+        # Centrar el mapa en las escenas seleccionadas (la última capa añadida) solo al
+        # mostrar la capa por primera vez, para no perder el desplazamiento y zoom del usuario
+        if not self.coverage_layer_fitted:
+            m.fit_bounds(focus.get_bounds())
+            self.coverage_layer_fitted = True
+
+    def show_coverage_layer(self):
+        """Muestra en el mapa la capa de cobertura generada por la búsqueda."""
+        script_dir = Path(__file__).parent
+        layer_file = script_dir.parent.parent / "data" / "exports" / "coverage_layer.geojson"
+        if layer_file.exists():
+            self.coverage_layer_file = str(layer_file)
+            self.coverage_layer_fitted = False
+            self.update_map()
+
     def extract_coordinates(self):
         """
         Extrae las coordenadas de los polígonos dibujados en el mapa.
@@ -1361,7 +1431,14 @@ class MapAppWindow(QMainWindow):
         self.update_map()
 
     def update_map(self):
-        """Regenera el mapa."""
+        """Regenera el mapa conservando la vista actual (centro y zoom)."""
+        js_code = "window.map ? [window.map.getCenter().lat, window.map.getCenter().lng, window.map.getZoom()] : null"
+        self.web_view.page().runJavaScript(js_code, self.reload_map)
+
+    def reload_map(self, view=None):
+        """Regenera el mapa con la vista `view` ([lat, lon, zoom]) leída del mapa anterior."""
+        if view:
+            self.map_view = view
 
         # Regenerar el mapa
         self.html_file = self.create_interactive_map()
@@ -1388,6 +1465,7 @@ class MapAppWindow(QMainWindow):
         data_paths = [
             script_dir.parent.parent / "data" / "temp" / "processed",
             script_dir.parent.parent / "data" / "temp" / "downloads",
+            script_dir.parent.parent / "data" / "temp" / "comparison",
             script_dir.parent.parent / "data" / "exports"
         ]
 
@@ -1485,6 +1563,7 @@ class MapAppWindow(QMainWindow):
         self.first_thread = ProcessThread(self.config)
         self.first_thread.result_ready.connect(self.handle_result)
         self.first_thread.error_occurred.connect(self.handle_error)
+        self.first_thread.metadata_ready.connect(self.show_coverage_layer)
         self.first_thread.start()
 
     def handle_result(self, result):
@@ -1519,7 +1598,10 @@ class MapAppWindow(QMainWindow):
         
         # Configurar el hilo para el procesamiento
         config = {
-            "selected_indices": self.selected_indices
+            "selected_indices": self.selected_indices,
+            "diff_date_enabled": self.config.get("diff_date_enabled", False),
+            "diff_start_date": self.config.get("diff_start_date"),
+            "diff_end_date": self.config.get("diff_end_date")
         }
         
         # Crear y configurar el hilo
@@ -0,0 +1,156 @@
+"""
+Benchmark de compresión de los productos raster: para cada códec mide el
+tiempo de escritura, el tiempo de lectura, el tamaño en disco y el error
+máximo (solo LERC con pérdida) sobre bandas representativas de Landsat.
+
+Sin --files usa bandas sintéticas con la textura de una escena Collection 2
+Level-2: reflectancia uint16 (escala 2.75e-05, -0.2) con borde sin datos,
+un índice NDVI float32 con -9999 fuera del área y la máscara uint8 del AOI.
+Con --files usa GeoTIFF reales (p. ej. data/temp/processed/.../clip_B4.tif)
+y elige el producto según el tipo de dato.
+
+El resultado sirve para fijar LANDSAT_COMPRESSION_<PRODUCTO> (ver
+src/landsat/compression.py).
+
+Ejemplo:
+    python tests/benchmark_compression.py --size 4096 --codecs DEFLATE ZSTD:9 LERC:0.001
+    python tests/benchmark_compression.py --files data/temp/processed/clips/clip_B4.tif
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.landsat.compression import INDEX, MASK, REFLECTANCE, compression_options
+
+DEFAULT_CODECS = ["NONE", "DEFLATE", "DEFLATE:9", "LZW", "ZSTD:1", "ZSTD:9", "ZSTD:19", "LERC", "LERC:0.001"]
+BLOCK_SIZE = 512
+
+
+def smooth_field(rng, size, scale):
+    """Campo aleatorio espacialmente correlacionado en [0, 1] (ruido suavizado por bloques)."""
+    coarse = rng.random((size // scale + 2, size // scale + 2))
+    field = np.kron(coarse, np.ones((scale, scale)))[:size, :size]
+    for axis in (0, 1):
+        field = (field + np.roll(field, scale // 2, axis=axis)) / 2
+    return (field - field.min()) / (np.ptp(field) or 1)
+
+
+def synthetic_bands(size, seed=0):
+    """{nombre: (producto, arreglo)} con bandas de reflectancia, un índice y la máscara."""
+    rng = np.random.default_rng(seed)
+    terrain = smooth_field(rng, size, 64)
+    inside = np.zeros((size, size), dtype=bool)
+    margin = size // 10
+    inside[margin:-margin, margin // 2:-margin // 2] = True
+
+    bands = {}
+    reflectance = {}
+    for band, (low, high) in {"B4": (0.02, 0.25), "B5": (0.15, 0.45)}.items():
+        value = low + (high - low) * (0.7 * terrain + 0.3 * smooth_field(rng, size, 8))
+        value += rng.normal(0, 0.004, (size, size))  # ruido del sensor
+        reflectance[band] = value
+        dn = np.clip((value + 0.2) / 2.75e-05, 1, 65535).astype(np.uint16)
+        dn[~inside] = 0
+        bands[band] = (REFLECTANCE, dn)
+
+    ndvi = (reflectance["B5"] - reflectance["B4"]) / (reflectance["B5"] + reflectance["B4"])
+    bands["NDVI"] = (INDEX, np.where(inside, ndvi, -9999).astype(np.float32))
+    bands["aoi_mask"] = (MASK, inside.astype(np.uint8))
+    return bands
+
+
+def file_bands(files):
+    bands = {}
+    for file in files:
+        with rasterio.open(file) as src:
+            data = src.read(1)
+        if data.dtype == np.uint8:
+            product = MASK
+        elif np.issubdtype(data.dtype, np.floating):
+            product = INDEX
+        else:
+            product = REFLECTANCE
+        bands[Path(file).stem] = (product, data)
+    return bands
+
+
+def measure(data, product, spec, output_file, num_threads, repeats):
+    """Escribe y relee `data` con el códec `spec`; devuelve las métricas (mejor de `repeats`)."""
+    height, width = data.shape
+    profile = dict(driver="GTiff", width=width, height=height, count=1, dtype=data.dtype.name,
+                   crs="EPSG:32618", transform=from_origin(500000, 1000000, 30, 30),
+                   tiled=True, blockxsize=BLOCK_SIZE, blockysize=BLOCK_SIZE, num_threads=num_threads)
+    profile.update({key.lower(): value for key, value in compression_options(product, data.dtype, spec).items()})
+
+    write_times, read_times = [], []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        with rasterio.open(output_file, "w", **profile) as dst:
+            dst.write(data, 1)
+        write_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        with rasterio.open(output_file) as src:
+            read_back = src.read(1)
+        read_times.append(time.perf_counter() - started)
+
+    size = os.path.getsize(output_file)
+    os.remove(output_file)
+    raw = data.nbytes
+    return {
+        "codec": spec,
+        "write_s": round(min(write_times), 4),
+        "read_s": round(min(read_times), 4),
+        "size_MB": round(size / 1e6, 3),
+        "ratio": round(raw / size, 2),
+        "write_MBps": round(raw / 1e6 / min(write_times), 1),
+        "read_MBps": round(raw / 1e6 / min(read_times), 1),
+        "max_error": float(np.max(np.abs(read_back.astype(np.float64) - data.astype(np.float64)))),
+    }
+
+
+def run(args):
+    bands = file_bands(args.files) if args.files else synthetic_bands(args.size)
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, (product, data) in bands.items():
+            print(f"\n{name} ({product}, {data.dtype}, {data.shape[1]}x{data.shape[0]}, {data.nbytes / 1e6:.1f} MB)")
+            print(f"{'códec':<12}{'escritura s':>12}{'lectura s':>11}{'MB':>9}{'ratio':>8}{'error máx':>11}")
+            results[name] = []
+            for spec in args.codecs:
+                try:
+                    row = measure(data, product, spec, os.path.join(temp_dir, f"{name}.tif"),
+                                  args.threads, args.repeats)
+                except Exception as e:  # códec no disponible en este GDAL
+                    print(f"{spec:<12} no disponible: {e}")
+                    continue
+                results[name].append(row)
+                print(f"{spec:<12}{row['write_s']:>12.4f}{row['read_s']:>11.4f}{row['size_MB']:>9.2f}"
+                      f"{row['ratio']:>8.2f}{row['max_error']:>11.4g}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResultados guardados en {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", nargs="+", help="GeoTIFF reales en vez de bandas sintéticas")
+    parser.add_argument("--size", type=int, default=2048, help="lado en píxeles de las bandas sintéticas")
+    parser.add_argument("--codecs", nargs="+", default=DEFAULT_CODECS, help="CÓDEC o CÓDEC:parámetro")
+    parser.add_argument("--threads", default="ALL_CPUS", help="NUM_THREADS de GDAL para comprimir")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="guardar los resultados como JSON")
+    run(parser.parse_args())
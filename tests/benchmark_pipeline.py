@@ -0,0 +1,126 @@
+"""
+Benchmark de extremo a extremo sin red: levanta tests/fake_usgs_server.py y
+ejecuta búsqueda STAC → login → selección de escenas → descarga → mosaicos
+y recortes → índices, midiendo el tiempo de cada etapa.
+
+Los datos se escriben en una raíz temporal (LANDSAT_DATA_ROOT) que se borra
+al terminar, salvo que se indique --data-root; las carpetas data/ de la
+aplicación no se tocan.
+
+Ejemplo:
+    python tests/benchmark_pipeline.py --latency 0.05 --bandwidth 5e6 --failure-rate 0.1
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from shapely.geometry import box
+
+from fake_usgs_server import FakeUSGSServer, SyntheticCatalog
+from raster_helpers import write_aoi
+
+def drain(generator):
+    """Consume un generador de mensajes y devuelve su valor de retorno."""
+    try:
+        while True:
+            next(generator)
+    except StopIteration as e:
+        return e.value
+
+
+def timed(results, stage, func, *args, **kwargs):
+    started = time.perf_counter()
+    value = func(*args, **kwargs)
+    results[stage] = round(time.perf_counter() - started, 3)
+    print(f"{stage}: {results[stage]:.3f} s")
+    return value
+
+
+def prepare_data_dir(catalog, data_dir):
+    """Escribe el polígono de prueba donde la aplicación lo espera, con carpetas de trabajo vacías."""
+    source_dir = data_dir / "temp" / "source"
+    for folder in (source_dir, data_dir / "temp" / "downloads", data_dir / "temp" / "processed", data_dir / "exports"):
+        shutil.rmtree(folder, ignore_errors=True)
+        folder.mkdir(parents=True, exist_ok=True)
+    write_aoi(source_dir / "source_file.geojson", box(*catalog.aoi_bounds), crs="EPSG:4326")
+
+
+def run(args):
+    if args.data_root:
+        return run_in(args, Path(args.data_root))
+    with tempfile.TemporaryDirectory(prefix="landsat_benchmark_") as data_root:
+        return run_in(args, Path(data_root))
+
+
+def run_in(args, data_dir):
+    # Las rutas de la aplicación se fijan al importar src.landsat, por eso se importa después
+    os.environ["LANDSAT_DATA_ROOT"] = str(data_dir)
+    catalog = SyntheticCatalog(grid=(args.grid, args.grid), acquisitions=args.acquisitions)
+    prepare_data_dir(catalog, data_dir)
+
+    with FakeUSGSServer(catalog=catalog, latency=args.latency, bandwidth=args.bandwidth,
+                        failure_rate=args.failure_rate, truncate_rate=args.truncate_rate,
+                        html_error_rate=args.html_error_rate, raster_size=args.raster_size,
+                        page_limit=args.page_limit) as server:
+        os.environ["LANDSAT_STAC_URL"] = server.stac_url
+        os.environ["USGS_LOGIN_URL"] = server.login_url
+
+        from src.landsat import (generate_landsat_query, fetch_stac_server, process_metadata,
+                                 generate_mosaics_and_clips, process_indices_from_cutouts_wrapper)
+        from src.landsat.epochs import epoch_paths
+        from src.controllers.landsat_controller import LandsatController
+
+        config = {
+            "file_path": "", "import_mode": True, "generate_mode": False, "path_row_mode": False,
+            "path": "", "row": "", "start_date": catalog.start_date.isoformat(), "end_date": "2030-12-31",
+            "diff_date_enabled": False, "diff_start_date": None, "diff_end_date": None,
+            "cloud_cover": 100, "selected_indices": args.indices, "imported_file": "source_file.geojson",
+        }
+
+        results = {}
+        controller = LandsatController(config)
+        query = timed(results, "query", generate_landsat_query, **config)
+        features = timed(results, "search", fetch_stac_server, query)
+        timed(results, "login", controller.get_session)
+        scenes = timed(results, "metadata", lambda: drain(process_metadata(features)))
+        # Como en la aplicación: completar las colecciones SR/ST de las escenas y descargar
+        timed(results, "download", lambda: drain(controller.download_data(features, scenes, args.indices)))
+        results["bands"] = len(glob.glob(str(epoch_paths()["downloads"] / "**" / "*_B*.TIF"), recursive=True))
+        if not results["bands"]:
+            raise Exception(f"La etapa de descarga no obtuvo ninguna banda (assets servidos: {server.stats['assets']})")
+        timed(results, "mosaic_and_clip", lambda: drain(generate_mosaics_and_clips()))
+        timed(results, "indices", lambda: drain(process_indices_from_cutouts_wrapper(args.indices)))
+
+        results["features"] = len(features)
+        results["scenes"] = len(scenes)
+        results["server"] = dict(server.stats)
+        if results["download"]:
+            results["download_MBps"] = round(server.stats["bytes_sent"] / 1e6 / results["download"], 3)
+
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=float, default=None, help="bytes/s por conexión")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, default=0.0)
+    parser.add_argument("--html-error-rate", type=float, default=0.0)
+    parser.add_argument("--raster-size", type=int, default=512)
+    parser.add_argument("--page-limit", type=int, default=None)
+    parser.add_argument("--grid", type=int, default=2, help="path/rows por lado alrededor del AOI")
+    parser.add_argument("--acquisitions", type=int, default=8)
+    parser.add_argument("--indices", nargs="+", default=["NDVI"])
+    parser.add_argument("--data-root", help="conservar los datos en esta carpeta en vez de una temporal")
+    run(parser.parse_args())
@@ -0,0 +1,718 @@
+"""
+Servidor local que imita los servicios de USGS usados por la aplicación:
+búsqueda STAC paginada, formulario de login tipo ERS y assets Landsat
+(GeoTIFF en mosaico tipo COG y MTL.json) generados de forma sintética.
+
+Permite ejecutar fetch_stac_server → download_images → mosaico → índices
+sin red y medir el rendimiento de forma determinista. La latencia, el
+ancho de banda y la inyección de fallos son configurables.
+
+Uso:
+    with FakeUSGSServer(latency=0.05, bandwidth=2_000_000) as server:
+        os.environ["LANDSAT_STAC_URL"] = server.stac_url
+        os.environ["USGS_LOGIN_URL"] = server.login_url
+        ...
+"""
+import hashlib
+import json
+import math
+import random
+import secrets
+import struct
+import threading
+import time
+from array import array
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+SR_BANDS = ["B1", "B2", "B3", "B4", "B5", "B6", "B7"]
+ST_BANDS = ["B10"]
+SESSION_COOKIE = "EROS_SSO_production_secure"
+# Assets generados que cada servidor conserva en memoria
+ASSET_CACHE_SIZE = 64
+
+
+# ---------------------------------------------------------------------------
+# Geometría: proyección UTM (WGS84) para georreferenciar los rasters sintéticos
+# ---------------------------------------------------------------------------
+
+def utm_epsg(lon, lat):
+    """Devuelve el código EPSG de la zona UTM WGS84 que contiene el punto."""
+    zone = int((lon + 180) // 6) + 1
+    return (32600 if lat >= 0 else 32700) + zone
+
+
+def lonlat_to_utm(lon, lat, epsg):
+    """Proyección directa Transverse Mercator (serie de Snyder) para la zona del EPSG."""
+    zone = epsg % 100
+    a = 6378137.0
+    f = 1 / 298.257223563
+    e2 = f * (2 - f)
+    ep2 = e2 / (1 - e2)
+    k0 = 0.9996
+
+    lon0 = math.radians((zone - 1) * 6 - 180 + 3)
+    phi = math.radians(lat)
+    lam = math.radians(lon)
+
+    n = a / math.sqrt(1 - e2 * math.sin(phi) ** 2)
+    t = math.tan(phi) ** 2
+    c = ep2 * math.cos(phi) ** 2
+    A = math.cos(phi) * (lam - lon0)
+    m = a * ((1 - e2 / 4 - 3 * e2 ** 2 / 64 - 5 * e2 ** 3 / 256) * phi
+             - (3 * e2 / 8 + 3 * e2 ** 2 / 32 + 45 * e2 ** 3 / 1024) * math.sin(2 * phi)
+             + (15 * e2 ** 2 / 256 + 45 * e2 ** 3 / 1024) * math.sin(4 * phi)
+             - (35 * e2 ** 3 / 3072) * math.sin(6 * phi))
+
+    x = k0 * n * (A + (1 - t + c) * A ** 3 / 6 + (5 - 18 * t + t ** 2 + 72 * c - 58 * ep2) * A ** 5 / 120) + 500000.0
+    y = k0 * (m + n * math.tan(phi) * (A ** 2 / 2 + (5 - t + 9 * c + 4 * c ** 2) * A ** 4 / 24
+                                        + (61 - 58 * t + t ** 2 + 600 * c - 330 * ep2) * A ** 6 / 720))
+    if epsg // 100 == 327:
+        y += 10000000.0
+    return x, y
+
+
+# ---------------------------------------------------------------------------
+# Escritura de GeoTIFF en mosaico (sin compresión) con Python puro
+# ---------------------------------------------------------------------------
+
+_TIFF_TYPES = {"SHORT": (3, "H"), "LONG": (4, "I"), "DOUBLE": (12, "d"), "ASCII": (2, "s")}
+
+
+def build_geotiff(width, height, origin_x, origin_y, pixel_size, epsg, pixel_value, tile_size=256, nodata=0):
+    """
+    Construye un GeoTIFF uint16 en mosaico con el IFD al inicio del archivo
+    (estructura tipo COG). pixel_value(x, y) devuelve el valor de cada píxel.
+    """
+    tiles_across = (width + tile_size - 1) // tile_size
+    tiles_down = (height + tile_size - 1) // tile_size
+    tile_bytes = tile_size * tile_size * 2
+    tile_count = tiles_across * tiles_down
+
+    geokeys = [1, 1, 0, 4,
+               1024, 0, 1, 1,      # GTModelType: proyectado
+               1025, 0, 1, 1,      # GTRasterType: PixelIsArea
+               3072, 0, 1, epsg,   # ProjectedCSType
+               3076, 0, 1, 9001]   # Unidades lineales: metros
+    nodata_str = f"{nodata}\0".encode("ascii")
+
+    tags = [
+        (256, "LONG", [width]),
+        (257, "LONG", [height]),
+        (258, "SHORT", [16]),
+        (259, "SHORT", [1]),
+        (262, "SHORT", [1]),
+        (277, "SHORT", [1]),
+        (284, "SHORT", [1]),
+        (322, "LONG", [tile_size]),
+        (323, "LONG", [tile_size]),
+        (324, "LONG", [0] * tile_count),
+        (325, "LONG", [tile_bytes] * tile_count),
+        (339, "SHORT", [1]),
+        (33550, "DOUBLE", [pixel_size, pixel_size, 0.0]),
+        (33922, "DOUBLE", [0.0, 0.0, 0.0, origin_x, origin_y, 0.0]),
+        (34735, "SHORT", geokeys),
+        (42113, "ASCII", nodata_str),
+    ]
+
+    def payload(kind, values):
+        code, fmt = _TIFF_TYPES[kind]
+        if kind == "ASCII":
+            return code, len(values), values
+        return code, len(values), struct.pack(f"<{len(values)}{fmt}", *values)
+
+    ifd_offset = 8
+    ifd_size = 2 + 12 * len(tags) + 4
+    extra_offset = ifd_offset + ifd_size
+    encoded = [payload(kind, values) for _, kind, values in tags]
+    extra_size = sum(len(data) + (len(data) % 2) for _, _, data in encoded if len(data) > 4)
+    data_offset = extra_offset + extra_size
+    data_offset += (-data_offset) % 16
+
+    tile_offsets = [data_offset + i * tile_bytes for i in range(tile_count)]
+    tags[9] = (324, "LONG", tile_offsets)
+    encoded[9] = payload("LONG", tile_offsets)
+
+    header = bytearray(b"II*\x00" + struct.pack("<I", ifd_offset))
+    ifd = bytearray(struct.pack("<H", len(tags)))
+    extra = bytearray()
+    for (tag, _, _), (code, count, data) in zip(tags, encoded):
+        if len(data) <= 4:
+            value = data.ljust(4, b"\x00")
+        else:
+            value = struct.pack("<I", extra_offset + len(extra))
+            extra += data
+            if len(data) % 2:
+                extra += b"\x00"
+        ifd += struct.pack("<HHI", tag, code, count) + value
+    ifd += struct.pack("<I", 0)
+
+    out = header + ifd + extra
+    out += b"\x00" * (data_offset - len(out))
+
+    for ty in range(tiles_down):
+        for tx in range(tiles_across):
+            tile = array("H")
+            for y in range(ty * tile_size, (ty + 1) * tile_size):
+                if y >= height:
+                    tile.extend([nodata] * tile_size)
+                    continue
+                x0 = tx * tile_size
+                tile.extend(pixel_value(x, y) if x < width else nodata for x in range(x0, x0 + tile_size))
+            out += tile.tobytes()
+
+    return bytes(out)
+
+
+# ---------------------------------------------------------------------------
+# Catálogo sintético
+# ---------------------------------------------------------------------------
+
+class SyntheticCatalog:
+    """
+    Genera escenas Landsat 8 sintéticas alrededor de un área de interés:
+    una cuadrícula de path/row que se repite cada 16 días.
+    """
+
+    def __init__(self, aoi_bounds=(-74.3, 4.4, -73.7, 4.9), grid=(2, 2), start_date="2024-01-01",
+                 acquisitions=8, footprint_size=(1.0, 1.0), base_path=8, base_row=57, seed=0):
+        self.aoi_bounds = aoi_bounds
+        self.grid = grid
+        self.start_date = date.fromisoformat(start_date)
+        self.acquisitions = acquisitions
+        self.footprint_size = footprint_size
+        self.base_path = base_path
+        self.base_row = base_row
+        self.seed = seed
+        self.tiles = self._build_tiles()
+
+    def _build_tiles(self):
+        west, south, east, north = self.aoi_bounds
+        cols, rows = self.grid
+        fw, fh = self.footprint_size
+        step_x = (east - west) / cols
+        step_y = (north - south) / rows
+        tiles = []
+        for c in range(cols):
+            for r in range(rows):
+                cx = west + step_x * (c + 0.5)
+                cy = north - step_y * (r + 0.5)
+                tiles.append({
+                    "path": f"{self.base_path + c:03d}",
+                    "row": f"{self.base_row + r:03d}",
+                    "bounds": (cx - fw / 2, cy - fh / 2, cx + fw / 2, cy + fh / 2),
+                })
+        return tiles
+
+    def _cloud_cover(self, product_id):
+        digest = hashlib.sha256(f"{self.seed}:{product_id}".encode()).digest()
+        return round(digest[0] / 255 * 100, 2)
+
+    def products(self):
+        """Devuelve la lista de productos (uno por path/row y fecha de adquisición)."""
+        items = []
+        for i in range(self.acquisitions):
+            acquired = self.start_date + timedelta(days=16 * i)
+            processed = acquired + timedelta(days=5)
+            for tile in self.tiles:
+                product_id = (f"LC08_L2SP_{tile['path']}{tile['row']}_{acquired:%Y%m%d}_"
+                              f"{processed:%Y%m%d}_02_T1")
+                items.append({
+                    "product_id": product_id,
+                    "path": tile["path"],
+                    "row": tile["row"],
+                    "date": acquired,
+                    "bounds": tile["bounds"],
+                    "cloud_cover": self._cloud_cover(product_id),
+                })
+        return items
+
+    def product(self, product_id):
+        for item in self.products():
+            if item["product_id"] == product_id:
+                return item
+        return None
+
+    def feature(self, item, collection, base_url):
+        """Construye un feature STAC para el producto en la colección indicada."""
+        west, south, east, north = item["bounds"]
+        suffix = "SR" if collection.endswith("sr") else "ST"
+        product_id = item["product_id"]
+        folder = (f"{base_url}/data/collection02/level-2/standard/oli-tirs/{item['date']:%Y}/"
+                  f"{item['path']}/{item['row']}/{product_id}")
+
+        bands = SR_BANDS if suffix == "SR" else ST_BANDS
+        assets = {
+            f"{suffix}_{band}": {"href": f"{folder}/{product_id}_{suffix}_{band}.TIF",
+                                 "type": "image/tiff; application=geotiff; profile=cloud-optimized"}
+            for band in bands
+        }
+        assets["QA_PIXEL"] = {"href": f"{folder}/{product_id}_QA_PIXEL.TIF",
+                              "type": "image/tiff; application=geotiff; profile=cloud-optimized"}
+        assets["MTL.json"] = {"href": f"{folder}/{product_id}_MTL.json", "type": "application/json"}
+
+        return {
+            "type": "Feature",
+            "stac_version": "1.0.0",
+            "id": f"{product_id}_{suffix}",
+            "collection": collection,
+            "bbox": [west, south, east, north],
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [[[west, north], [east, north], [east, south], [west, south], [west, north]]],
+            },
+            "properties": {
+                "datetime": f"{item['date']:%Y-%m-%d}T15:10:00.000000Z",
+                "eo:cloud_cover": item["cloud_cover"],
+                "platform": "LANDSAT_8",
+                "landsat:wrs_path": item["path"],
+                "landsat:wrs_row": item["row"],
+                "landsat:collection_category": "T1",
+            },
+            "assets": assets,
+        }
+
+    def search(self, query, base_url):
+        """Filtra el catálogo según una consulta STAC (colecciones, fechas, nubes, path/row, bbox)."""
+        collections = query.get("collections") or ["landsat-c2l2-sr"]
+        filters = query.get("query", {})
+        max_cloud = float(filters.get("eo:cloud_cover", {}).get("lte", 100))
+        path_eq = filters.get("landsat:wrs_path", {}).get("eq")
+        row_eq = filters.get("landsat:wrs_row", {}).get("eq")
+
+        start, end = None, None
+        if query.get("datetime"):
+            start_str, _, end_str = query["datetime"].partition("/")
+            start = date.fromisoformat(start_str[:10]) if start_str and start_str != ".." else None
+            end = date.fromisoformat(end_str[:10]) if end_str and end_str != ".." else None
+
+        target_bbox = _geometry_bbox(query.get("intersects"))
+
+        results = []
+        for collection in collections:
+            for item in self.products():
+                if item["cloud_cover"] > max_cloud:
+                    continue
+                if path_eq and item["path"] != path_eq or row_eq and item["row"] != row_eq:
+                    continue
+                if start and item["date"] < start or end and item["date"] > end:
+                    continue
+                if target_bbox and not _bbox_intersects(item["bounds"], target_bbox):
+                    continue
+                results.append(self.feature(item, collection, base_url))
+        return results
+
+    def mtl(self, item):
+        """Genera un MTL.json con los campos que consume la aplicación."""
+        digest = hashlib.sha256(f"{self.seed}:{item['product_id']}:sun".encode()).digest()
+        reflectance = {}
+        for band in range(1, 8):
+            reflectance[f"REFLECTANCE_MULT_BAND_{band}"] = "2.75E-05"
+            reflectance[f"REFLECTANCE_ADD_BAND_{band}"] = "-0.200000"
+        return {
+            "LANDSAT_METADATA_FILE": {
+                "PRODUCT_CONTENTS": {"LANDSAT_PRODUCT_ID": item["product_id"]},
+                "IMAGE_ATTRIBUTES": {
+                    "SPACECRAFT_ID": "LANDSAT_8",
+                    "WRS_PATH": str(int(item["path"])),
+                    "WRS_ROW": str(int(item["row"])),
+                    "DATE_ACQUIRED": f"{item['date']:%Y-%m-%d}",
+                    "CLOUD_COVER": f"{item['cloud_cover']:.2f}",
+                    "CLOUD_COVER_LAND": f"{item['cloud_cover']:.2f}",
+                    "SUN_AZIMUTH": f"{90 + digest[1] / 255 * 60:.8f}",
+                    "SUN_ELEVATION": f"{40 + digest[2] / 255 * 25:.8f}",
+                },
+                "LEVEL2_SURFACE_REFLECTANCE_PARAMETERS": reflectance,
+                "LEVEL2_SURFACE_TEMPERATURE_PARAMETERS": {
+                    "TEMPERATURE_MULT_BAND_ST_B10": "0.00341802",
+                    "TEMPERATURE_ADD_BAND_ST_B10": "149.000000",
+                },
+                "LEVEL1_RADIOMETRIC_RESCALING": {
+                    "RADIANCE_MULT_BAND_10": "3.3420E-04",
+                    "RADIANCE_ADD_BAND_10": "0.10000",
+                },
+                "LEVEL1_THERMAL_CONSTANTS": {
+                    "K1_CONSTANT_BAND_10": "774.8853",
+                    "K2_CONSTANT_BAND_10": "1321.0789",
+                },
+            }
+        }
+
+
+def _geometry_bbox(geometry):
+    if not geometry or "coordinates" not in geometry:
+        return None
+    xs, ys = [], []
+
+    def walk(coords):
+        if coords and isinstance(coords[0], (int, float)):
+            xs.append(coords[0])
+            ys.append(coords[1])
+        else:
+            for c in coords:
+                walk(c)
+
+    walk(geometry["coordinates"])
+    return (min(xs), min(ys), max(xs), max(ys)) if xs else None
+
+
+def _bbox_intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+# ---------------------------------------------------------------------------
+# Servidor HTTP
+# ---------------------------------------------------------------------------
+
+class FakeUSGSServer:
+    """
+    Servidor HTTP local con los endpoints /stac-server/search, /login y /data/...
+
+    Parámetros de simulación:
+        latency: segundos de espera antes de responder cada petición.
+        bandwidth: bytes por segundo por conexión (None = sin límite).
+        failure_rate: probabilidad de responder 503/429 en assets.
+        truncate_rate: probabilidad de cortar la transferencia a la mitad.
+        html_error_rate: probabilidad de responder una página HTML en lugar del TIF.
+        require_login: exige la cookie de sesión para descargar assets.
+        raster_size: ancho/alto en píxeles de las bandas sintéticas.
+        page_limit: máximo de features por página en la búsqueda.
+    Los fallos se deciden con una semilla por (ruta, intento), por lo que
+    se reproducen igual sin importar el orden de las peticiones.
+    """
+
+    def __init__(self, catalog=None, host="127.0.0.1", port=0, latency=0.0, bandwidth=None,
+                 failure_rate=0.0, failure_status=(503, 429), truncate_rate=0.0, html_error_rate=0.0,
+                 require_login=True, raster_size=512, tile_size=256, page_limit=None, seed=0):
+        self.catalog = catalog or SyntheticCatalog(seed=seed)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.truncate_rate = truncate_rate
+        self.html_error_rate = html_error_rate
+        self.require_login = require_login
+        self.raster_size = raster_size
+        self.tile_size = tile_size
+        self.page_limit = page_limit
+        self.seed = seed
+
+        self.csrf_token = secrets.token_hex(16)
+        self.sessions = set()
+        self.stats = {"search": 0, "login": 0, "assets": 0, "bytes_sent": 0, "failures": 0}
+        self._attempts = {}
+        self._assets = {}
+        self._lock = threading.Lock()
+
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    # -- ciclo de vida -------------------------------------------------------
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stac_url(self):
+        return f"{self.url}/stac-server/search"
+
+    @property
+    def login_url(self):
+        return f"{self.url}/login"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # -- utilidades ----------------------------------------------------------
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _roll(self, path, kind):
+        """Devuelve un número pseudoaleatorio determinista para (ruta, intento, tipo de fallo)."""
+        with self._lock:
+            attempt = self._attempts.get((path, kind), 0)
+            self._attempts[(path, kind)] = attempt + 1
+        return random.Random(f"{self.seed}:{path}:{kind}:{attempt}").random()
+
+    def asset_bytes(self, filename):
+        """Genera (y cachea en el servidor) el contenido de un asset a partir de su nombre de archivo."""
+        with self._lock:
+            if filename in self._assets:
+                return self._assets[filename]
+        body = self._build_asset(filename)
+        with self._lock:
+            if len(self._assets) >= ASSET_CACHE_SIZE:
+                self._assets.pop(next(iter(self._assets)))
+            self._assets[filename] = body
+        return body
+
+    def _build_asset(self, filename):
+        if filename.endswith("_MTL.json"):
+            item = self.catalog.product(filename[:-len("_MTL.json")])
+            return json.dumps(self.catalog.mtl(item), indent=2).encode() if item else None
+
+        if not filename.endswith(".TIF"):
+            return None
+        stem = filename[:-4]
+        if stem.endswith("_QA_PIXEL"):
+            product_id, band = stem[:-len("_QA_PIXEL")], "QA_PIXEL"
+        else:
+            product_id, _, band = stem.rsplit("_", 2)
+        item = self.catalog.product(product_id)
+        if item is None:
+            return None
+
+        west, south, east, north = item["bounds"]
+        epsg = utm_epsg((west + east) / 2, (south + north) / 2)
+        corners = [lonlat_to_utm(x, y, epsg) for x, y in ((west, south), (west, north), (east, south), (east, north))]
+        min_x = min(c[0] for c in corners)
+        max_x = max(c[0] for c in corners)
+        min_y = min(c[1] for c in corners)
+        max_y = max(c[1] for c in corners)
+        size = self.raster_size
+        pixel_size = max(max_x - min_x, max_y - min_y) / size
+
+        seed = int(hashlib.sha256(f"{self.seed}:{product_id}:{band}".encode()).hexdigest()[:6], 16)
+        if band == "QA_PIXEL":
+            cloudy = int(item["cloud_cover"] / 100 * size)
+
+            def pixel_value(x, y):
+                # Bit 6 = despejado, bit 3 = nube (franja superior proporcional a la nubosidad)
+                return (1 << 3) | (1 << 1) if y < cloudy else (1 << 6)
+        elif band == "B10":
+            def pixel_value(x, y):
+                return 44000 + ((x * 13 + y * 7 + seed) % 4000)
+        else:
+            base = 7500 + (seed % 500)
+
+            def pixel_value(x, y):
+                return base + ((x * 5 + y * 3 + seed) % 3000)
+
+        return build_geotiff(size, size, min_x, max_y, pixel_size, epsg, pixel_value, tile_size=self.tile_size)
+
+    # -- manejador -----------------------------------------------------------
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body=b"", content_type="application/json", headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if self.command != "HEAD" and body:
+                    self.wfile.write(body)
+                    server._count("bytes_sent", len(body))
+
+            def _read_body(self):
+                length = int(self.headers.get("Content-Length", 0))
+                return self.rfile.read(length) if length else b""
+
+            def _logged_in(self):
+                cookies = self.headers.get("Cookie", "")
+                for part in cookies.split(";"):
+                    name, _, value = part.strip().partition("=")
+                    if name == SESSION_COOKIE and value in server.sessions:
+                        return True
+                return False
+
+            def do_GET(self):
+                self._dispatch()
+
+            def do_HEAD(self):
+                self._dispatch()
+
+            def do_POST(self):
+                self._dispatch()
+
+            def _dispatch(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                path = urlparse(self.path).path
+                if path == "/stac-server/search":
+                    self._search()
+                elif path == "/login":
+                    self._login()
+                elif path.startswith("/data/"):
+                    self._asset(path)
+                else:
+                    self._send(404, b'{"message": "Not Found"}')
+
+            def _search(self):
+                server._count("search")
+                if self.command == "POST":
+                    try:
+                        query = json.loads(self._read_body() or b"{}")
+                    except ValueError:
+                        self._send(400, b'{"message": "Invalid JSON"}')
+                        return
+                else:
+                    query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+
+                matched = server.catalog.search(query, server.url)
+                limit = int(query.get("limit", 100))
+                if server.page_limit:
+                    limit = min(limit, server.page_limit)
+                page = int(query.get("page", 1))
+                features = matched[(page - 1) * limit:page * limit]
+
+                links = []
+                if page * limit < len(matched):
+                    links.append({"rel": "next", "href": server.stac_url, "method": "POST",
+                                  "body": {"page": page + 1}})
+
+                body = {
+                    "type": "FeatureCollection",
+                    "features": features,
+                    "links": links,
+                    "context": {"page": page, "limit": limit, "matched": len(matched), "returned": len(features)},
+                }
+                self._send(200, json.dumps(body).encode(), "application/geo+json")
+
+            def _login(self):
+                server._count("login")
+                if self.command != "POST":
+                    form = (f'<html><body><form method="post" action="/login">'
+                            f'<input type="hidden" name="csrf" value="{server.csrf_token}">'
+                            f'<input name="username"><input name="password" type="password">'
+                            f'</form></body></html>').encode()
+                    self._send(200, form, "text/html")
+                    return
+
+                fields = {k: v[0] for k, v in parse_qs(self._read_body().decode()).items()}
+                if fields.get("csrf") != server.csrf_token or not fields.get("username"):
+                    self._send(403, b"<html><body>Invalid login</body></html>", "text/html")
+                    return
+
+                token = secrets.token_hex(16)
+                with server._lock:
+                    server.sessions.add(token)
+                self._send(200, b"<html><body>Welcome</body></html>", "text/html",
+                           {"Set-Cookie": f"{SESSION_COOKIE}={token}; Path=/"})
+
+            def _asset(self, path):
+                server._count("assets")
+                if server.require_login and not self._logged_in():
+                    self._send(401, b"<html><body>Login required</body></html>", "text/html")
+                    return
+
+                filename = path.rsplit("/", 1)[-1]
+                body = server.asset_bytes(filename)
+                if body is None:
+                    self._send(404, b"<html><body>Not Found</body></html>", "text/html")
+                    return
+
+                if self.command == "GET":
+                    if server.failure_rate and server._roll(path, "status") < server.failure_rate:
+                        server._count("failures")
+                        status = server.failure_status[int(server._roll(path, "code") * len(server.failure_status))]
+                        self._send(status, b"<html><body>Service Unavailable</body></html>", "text/html",
+                                   {"Retry-After": "1"})
+                        return
+                    if server.html_error_rate and server._roll(path, "html") < server.html_error_rate:
+                        server._count("failures")
+                        self._send(200, b"<html><body>Temporary error, please retry</body></html>",
+                                   "application/octet-stream")
+                        return
+
+                content_type = "application/json" if filename.endswith(".json") else "image/tiff"
+                start, end = 0, len(body) - 1
+                status = 200
+                range_header = self.headers.get("Range")
+                if range_header and range_header.startswith("bytes="):
+                    first, _, last = range_header[6:].partition("-")
+                    if first:
+                        start = int(first)
+                        end = min(int(last), end) if last else end
+                    else:
+                        start = max(0, len(body) - int(last))
+                    status = 206
+
+                chunk = body[start:end + 1]
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(chunk)))
+                self.send_header("Accept-Ranges", "bytes")
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+                self.end_headers()
+                if self.command == "HEAD":
+                    return
+
+                truncate = server.truncate_rate and server._roll(path, "truncate") < server.truncate_rate
+                if truncate:
+                    server._count("failures")
+                    chunk = chunk[:len(chunk) // 2]
+                    self.close_connection = True
+
+                self._stream(chunk)
+
+            def _stream(self, data):
+                block = 65536
+                for offset in range(0, len(data), block):
+                    piece = data[offset:offset + block]
+                    started = time.monotonic()
+                    try:
+                        self.wfile.write(piece)
+                    except (BrokenPipeError, ConnectionResetError):
+                        return
+                    server._count("bytes_sent", len(piece))
+                    if server.bandwidth:
+                        remaining = len(piece) / server.bandwidth - (time.monotonic() - started)
+                        if remaining > 0:
+                            time.sleep(remaining)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Servidor local STAC/ERS/assets para pruebas sin red")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=float, default=None, help="bytes/s por conexión")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, default=0.0)
+    parser.add_argument("--html-error-rate", type=float, default=0.0)
+    parser.add_argument("--raster-size", type=int, default=512)
+    args = parser.parse_args()
+
+    fake = FakeUSGSServer(port=args.port, latency=args.latency, bandwidth=args.bandwidth,
+                          failure_rate=args.failure_rate, truncate_rate=args.truncate_rate,
+                          html_error_rate=args.html_error_rate, raster_size=args.raster_size)
+    print(f"STAC: {fake.stac_url}\nLogin: {fake.login_url}")
+    fake.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
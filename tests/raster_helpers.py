@@ -0,0 +1,27 @@
+"""Rasters y polígonos sintéticos compartidos por los tests y benchmarks."""
+import geopandas as gpd
+import rasterio
+from rasterio.transform import from_origin
+
+TEST_CRS = "EPSG:32618"
+
+
+def write_raster(path, data, origin=(500000, 500000), pixel_size=30, crs=TEST_CRS, **profile):
+    """
+    Escribe `data` (filas x columnas, o bandas x filas x columnas) como GeoTIFF con
+    la esquina superior izquierda en `origin`. `profile` añade o reemplaza opciones
+    de creación (nodata, tiled, compress...). Devuelve la ruta.
+    """
+    bands = data if data.ndim == 3 else data[None]
+    options = dict(driver="GTiff", count=bands.shape[0], height=bands.shape[1], width=bands.shape[2],
+                   dtype=data.dtype.name, crs=crs, transform=from_origin(*origin, pixel_size, pixel_size))
+    options.update(profile)
+    with rasterio.open(path, "w", **options) as dst:
+        dst.write(bands)
+    return path
+
+
+def write_aoi(path, geometry, crs=TEST_CRS):
+    """Escribe un polígono de área de interés como GeoJSON. Devuelve la ruta."""
+    gpd.GeoDataFrame(geometry=[geometry], crs=crs).to_file(path, driver="GeoJSON")
+    return path
@@ -0,0 +1,162 @@
+import os
+from collections import OrderedDict
+from functools import partial
+
+import numpy as np
+import pytest
+import rasterio
+import rasterio.mask
+from shapely.geometry import Polygon
+
+from raster_helpers import write_aoi, write_raster
+from src.landsat import mosaic
+from src.landsat.mosaic import get_aoi_grid
+
+ORIGIN = (500000, 1000000)
+AOI = Polygon([(503000, 996000), (510000, 994000), (508000, 988000), (502000, 990000)])
+
+write_band = partial(write_raster, origin=ORIGIN, nodata=0)
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Caché de rejillas vacía; devuelve la lista de rejillas construidas."""
+    monkeypatch.setattr(mosaic, "_aoi_grids", OrderedDict())
+    monkeypatch.setattr(mosaic, "_aoi_masks", OrderedDict())
+    calls = []
+    build = mosaic._build_aoi_grid
+
+    def counting_build(polygon_path, dataset):
+        calls.append(os.path.basename(str(polygon_path)))
+        return build(polygon_path, dataset)
+
+    monkeypatch.setattr(mosaic, "_build_aoi_grid", counting_build)
+    return calls
+
+
+def test_bands_on_the_same_grid_share_one_aoi_grid(tmp_path, builds):
+    aoi = write_aoi(tmp_path / "source_file.geojson", AOI)
+    data = np.arange(1, 600 * 500 + 1, dtype=np.uint16).reshape(600, 500)
+    b4 = write_band(tmp_path / "B4.tif", data)
+    b5 = write_band(tmp_path / "B5.tif", data[::-1].copy())
+
+    with rasterio.open(b4) as src4, rasterio.open(b5) as src5:
+        assert get_aoi_grid(aoi, src4) is get_aoi_grid(aoi, src5)
+    assert builds == ["source_file.geojson"]
+
+    # Un polígono modificado invalida la entrada
+    write_aoi(aoi, Polygon([(504000, 995000), (509000, 995000), (509000, 990000), (504000, 990000)]))
+    mtime = os.path.getmtime(aoi) + 10
+    os.utime(aoi, (mtime, mtime))
+    with rasterio.open(b4) as src:
+        get_aoi_grid(aoi, src)
+    assert len(builds) == 2
+
+
+def test_aoi_grid_cache_evicts_the_least_recently_used_grid(tmp_path, builds, monkeypatch):
+    monkeypatch.setattr(mosaic, "AOI_GRID_CACHE_SIZE", 2)
+    aoi = write_aoi(tmp_path / "source_file.geojson", AOI)
+    rasters = [write_band(tmp_path / f"B{i}.tif", np.ones((600, 500), dtype=np.uint16), pixel_size=30 - i)
+               for i in range(3)]
+
+    def grid_for(i):
+        with rasterio.open(rasters[i]) as src:
+            return get_aoi_grid(aoi, src)
+
+    first = grid_for(0)
+    grid_for(1)
+    assert grid_for(0) is first  # uso reciente: pasa al final
+    grid_for(2)                  # desaloja la rejilla 1, no la 0
+    assert grid_for(0) is first
+    assert len(builds) == 3
+    grid_for(1)
+    assert len(builds) == 4
+
+
+def test_clip_streams_strips_within_a_tiny_budget_and_matches_rasterio_mask(tmp_path, builds):
+    aoi = write_aoi(tmp_path / "source_file.geojson", AOI)
+    data = np.random.default_rng(0).integers(1, 60000, (600, 500), dtype=np.uint16)
+    band = write_band(tmp_path / "mosaic_B4.tif", data)
+
+    with rasterio.open(band) as src:
+        grid = get_aoi_grid(aoi, src)
+        geometries = [geom.__geo_interface__ for geom in grid.geometries]
+        expected, expected_transform = rasterio.mask.mask(src, geometries, crop=True, all_touched=True)
+        expected_mask = ~rasterio.mask.geometry_mask(geometries, grid.shape, grid.transform, all_touched=True)
+
+        strips = []
+        mask_strip = grid.mask_strip
+        grid.mask_strip = lambda row, rows: strips.append(rows) or mask_strip(row, rows)
+        out_meta = src.meta.copy()
+        out_meta.update(height=grid.shape[0], width=grid.shape[1], transform=grid.transform)
+        mosaic.write_clip_windowed(src, grid, tmp_path / "clip_B4.tif", out_meta, memory_budget_mb=0.05)
+        mosaic.write_aoi_mask(tmp_path / "aoi_mask.tif", out_meta, grid, memory_budget_mb=0.01)
+
+    # 0.05 MB con 3 bytes por píxel: franjas de pocas filas, muy por debajo de un bloque
+    assert len(strips) > 10 and max(strips) < mosaic.CLIP_BLOCK_SIZE
+    with rasterio.open(tmp_path / "clip_B4.tif") as clip:
+        assert clip.transform == expected_transform
+        np.testing.assert_array_equal(clip.read(), expected)
+    with rasterio.open(tmp_path / "aoi_mask.tif") as mask_file:
+        np.testing.assert_array_equal(mask_file.read(1), expected_mask.astype(np.uint8))
+
+
+def test_epochs_on_the_same_clip_grid_share_one_rasterized_mask(tmp_path, builds, monkeypatch):
+    aoi = write_aoi(tmp_path / "source_file.geojson", AOI)
+    written = []
+    write_aoi_mask = mosaic.write_aoi_mask
+    monkeypatch.setattr(mosaic, "write_aoi_mask", lambda mask_file, *args, **kwargs:
+                        written.append(mask_file) or write_aoi_mask(mask_file, *args, **kwargs))
+
+    # La época de comparación cubre más escenas: otro raster, pero alineado a la misma rejilla
+    primary = write_band(tmp_path / "mosaic_B4.tif", np.full((600, 500), 7, dtype=np.uint16))
+    comparison_dir = tmp_path / "comparison"
+    comparison_dir.mkdir()
+    comparison = write_band(comparison_dir / "mosaic_B4.tif", np.full((800, 700), 9, dtype=np.uint16),
+                            origin=(ORIGIN[0] - 3000, ORIGIN[1] + 3000))
+
+    clips = [mosaic.extract_mosaic_by_polygon(str(path), str(aoi), str(tmp_path / f"clip_{epoch}"))
+             for epoch, path in (("primary", primary), ("comparison", comparison))]
+
+    assert len(builds) == 2 and len(written) == 1
+    masks = [tmp_path / f"clip_{epoch}" / "aoi_mask.tif" for epoch in ("primary", "comparison")]
+    with rasterio.open(masks[0]) as first, rasterio.open(masks[1]) as second:
+        assert first.transform == second.transform
+        np.testing.assert_array_equal(first.read(1), second.read(1))
+    with rasterio.open(clips[1]) as clip:
+        assert clip.read(1).max() == 9
+
+    # Repetir una época no vuelve a escribir; borrar su máscara la recupera de la otra
+    os.remove(masks[0])
+    mosaic.extract_mosaic_by_polygon(str(primary), str(aoi), str(tmp_path / "clip_primary"))
+    assert masks[0].exists() and len(written) == 1
+
+
+def test_fused_clip_matches_mosaic_then_clip(tmp_path, builds):
+    aoi = write_aoi(tmp_path / "source_file.geojson", AOI)
+    rng = np.random.default_rng(1)
+    # Dos escenas solapadas; la esquina suroeste del AOI no la cubre ninguna (nodata dentro del AOI)
+    first = write_band(tmp_path / "scene_a_B4.TIF", rng.integers(1, 60000, (300, 300), dtype=np.uint16))
+    second = write_band(tmp_path / "scene_b_B4.TIF", rng.integers(1, 60000, (300, 300), dtype=np.uint16),
+                        origin=(506000, 997000))
+    band_files = [(str(second), 40.0), (str(first), 10.0)]
+
+    mosaic_file = mosaic.build_mosaic_per_band(band_files, str(tmp_path / "mosaic"), "B4_SR",
+                                               temp_dir=str(tmp_path / "temp_mosaic"), incremental=False)
+    expected_file = mosaic.extract_mosaic_by_polygon(mosaic_file, str(aoi), str(tmp_path / "clip_mosaic"))
+    fused_file = mosaic.build_clip_per_band(band_files, str(aoi), str(tmp_path / "clip_fused"), "B4_SR",
+                                            temp_dir=str(tmp_path / "temp_fused"))
+
+    with rasterio.open(expected_file) as expected, rasterio.open(fused_file) as fused:
+        assert fused.bounds == expected.bounds and fused.shape == expected.shape
+        assert fused.crs == expected.crs and fused.nodata == expected.nodata == 0
+        expected_data, fused_data = expected.read(1), fused.read(1)
+    np.testing.assert_array_equal(fused_data == 0, expected_data == 0)
+    np.testing.assert_array_equal(fused_data, expected_data)
+    assert (expected_data == 0).any() and (expected_data != 0).any()
+
+
+def test_rows_per_chunk_respects_budgets_below_one_block():
+    assert mosaic.rows_per_chunk(1000, 1, "uint16", memory_budget_mb=64, block_size=512) == 33280
+    assert mosaic.rows_per_chunk(1000, 1, "uint16", memory_budget_mb=0.5, block_size=512) == 262
+    assert mosaic.rows_per_chunk(10 ** 7, 4, "float32", memory_budget_mb=1, block_size=512) == 1
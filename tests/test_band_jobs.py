@@ -0,0 +1,78 @@
+import threading
+import time
+
+from src.landsat import mosaic
+from src.landsat.mosaic import run_band_jobs, split_thread_budget
+
+
+def drain(generator):
+    messages = []
+    try:
+        while True:
+            messages.append(next(generator))
+    except StopIteration as e:
+        return messages, e.value
+
+
+def test_split_thread_budget():
+    assert split_thread_budget(7, budget=16, max_parallel=4) == (4, 4)
+    assert split_thread_budget(2, budget=16, max_parallel=4) == (2, 8)
+    assert split_thread_budget(7, budget=2, max_parallel=4) == (2, 1)
+    assert split_thread_budget(0, budget=8, max_parallel=4) == (1, 8)
+
+
+def test_run_band_jobs_reports_failing_jobs():
+    def fail():
+        raise ValueError("VRT inválido")
+
+    results = {band: (result, error) for band, result, error in
+               run_band_jobs({"B4": lambda: "clip_B4.tif", "B5": fail}, max_workers=2)}
+
+    assert results["B4"] == ("clip_B4.tif", None)
+    assert results["B5"][0] is None and isinstance(results["B5"][1], ValueError)
+
+
+def test_run_band_jobs_stops_when_requested():
+    stop = threading.Event()
+    started = []
+
+    def job(band):
+        started.append(band)
+        stop.set()
+        time.sleep(0.05)
+        return band
+
+    jobs = {f"B{i}": (lambda band=f"B{i}": job(band)) for i in range(1, 9)}
+    finished = [band for band, _, _ in run_band_jobs(jobs, max_workers=1, should_stop=stop.is_set)]
+
+    assert finished == ["B1"] and started == ["B1"]
+
+
+def test_generate_mosaics_and_clips_reports_failed_bands(tmp_path, monkeypatch):
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "source_file.geojson").write_text('{"type": "FeatureCollection", "features": []}')
+    paths = {name: tmp_path / name for name in ("downloads", "mosaic", "clip", "exports")}
+    # Recorte multibanda de una ejecución anterior con STACKED_CLIP activado
+    paths["clip"].mkdir()
+    (paths["clip"] / mosaic.STACK_FILE_NAME).touch()
+
+    def build_mosaic(files, output_path, band, temp_dir=None, num_threads=1):
+        if band == "B5_SR":
+            raise RuntimeError("escena corrupta")
+        mosaic_file = tmp_path / f"mosaic_{band}.tif"
+        mosaic_file.touch()
+        return str(mosaic_file)
+
+    monkeypatch.setattr(mosaic, "SOURCE_PATH", source)
+    monkeypatch.setattr(mosaic, "epoch_paths", lambda epoch: paths)
+    monkeypatch.setattr(mosaic, "get_scenes_by_band", lambda path: {"B4_SR": [("a.TIF", 1)], "B5_SR": [("b.TIF", 1)]})
+    monkeypatch.setattr(mosaic, "build_mosaic_per_band", build_mosaic)
+    monkeypatch.setattr(mosaic, "extract_mosaic_by_polygon", lambda mosaic_path, polygon, clips: mosaic_path)
+
+    messages, results = drain(mosaic.generate_mosaics_and_clips(fused=False))
+
+    assert list(results["mosaicos"]) == ["B4_SR"] and list(results["recortes"]) == ["B4_SR"]
+    assert results["errores"] == {"B5_SR": "escena corrupta"}
+    assert any("B5_SR" in message and "escena corrupta" in message for message in messages)
+    assert not (paths["clip"] / mosaic.STACK_FILE_NAME).exists()
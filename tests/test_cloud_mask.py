@@ -0,0 +1,31 @@
+import numpy as np
+from shapely.geometry import box
+
+from fake_usgs_server import build_geotiff, lonlat_to_utm, utm_epsg
+from src.landsat.cloud_mask import (QA_CLEAR, QA_CLOUD, QA_DILATED_CLOUD, QA_FILL, clear_sky_fraction,
+                                    find_qa_href, read_aoi_clear_fraction)
+
+
+def test_clear_sky_fraction_bits():
+    qa = np.array([[QA_CLEAR, QA_CLOUD | QA_DILATED_CLOUD],
+                   [0, QA_FILL]], dtype=np.uint16)
+    inside = np.ones_like(qa, dtype=bool)
+    # El relleno no cuenta; un píxel sin nube ni sombra cuenta como despejado
+    assert clear_sky_fraction(qa, inside) == 2 / 3
+    assert clear_sky_fraction(qa, np.zeros_like(inside)) is None
+
+
+def test_reads_only_aoi_window(tmp_path):
+    epsg = utm_epsg(-74.0, 4.6)
+    origin_x, origin_y = lonlat_to_utm(-74.2, 4.8, epsg)
+    # Mitad norte nublada, mitad sur despejada
+    data = build_geotiff(256, 256, origin_x, origin_y, 100.0, epsg,
+                         lambda x, y: QA_CLOUD if y < 128 else QA_CLEAR, tile_size=64)
+    path = tmp_path / "LC08_TEST_QA_PIXEL.TIF"
+    path.write_bytes(data)
+
+    feature = {"assets": {"QA_PIXEL": {"href": path.as_uri()}}}
+    href = find_qa_href(feature)
+    south_x, south_y = -74.0, 4.8 - 200 * 100.0 / 111320
+    assert read_aoi_clear_fraction(href, box(south_x, south_y, south_x + 0.01, south_y + 0.01)) == 1.0
+    assert read_aoi_clear_fraction(href, box(-74.1, 4.78, -74.09, 4.79)) == 0.0
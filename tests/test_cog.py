@@ -0,0 +1,26 @@
+import numpy as np
+import rasterio
+
+from raster_helpers import write_raster
+from src.landsat.cog import MASK, finalize_raster
+
+
+def test_finalize_raster_writes_cog_with_overviews(tmp_path):
+    path = tmp_path / "aoi_mask.tif"
+    data = (np.random.default_rng(0).random((1200, 1100)) > 0.5).astype(np.uint8)
+    write_raster(path, data)
+
+    assert finalize_raster(path, MASK, enabled=True) == path
+    with rasterio.open(path) as src:
+        assert src.overviews(1)
+        assert src.tags(ns="IMAGE_STRUCTURE").get("LAYOUT") == "COG"
+        np.testing.assert_array_equal(src.read(1), data)
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_finalize_raster_is_a_no_op_when_disabled(tmp_path):
+    path = tmp_path / "NDVI.tif"
+    write_raster(path, np.zeros((64, 64), dtype=np.float32))
+    finalize_raster(path, enabled=False)
+    with rasterio.open(path) as src:
+        assert not src.overviews(1)
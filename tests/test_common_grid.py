@@ -0,0 +1,60 @@
+import numpy as np
+from rasterio.transform import from_origin
+from rasterio.warp import transform_bounds
+
+from raster_helpers import write_raster
+from src.landsat import mosaic
+from src.landsat.mosaic import common_grid_sources, snap_bounds
+
+# Origen nativo de Landsat desplazado medio píxel (15 m) de los múltiplos de 30 m
+NATIVE_ORIGIN = (250015, 520015)
+
+
+def write_scene(path, crs, origin):
+    return str(write_raster(path, np.ones((300, 300), dtype=np.uint16), origin=origin, crs=crs, nodata=0))
+
+
+class RecordingGdal:
+    """Registra las llamadas a gdal.Warp en lugar de escribir los VRT."""
+
+    def __init__(self):
+        self.warps = []
+
+    def WarpOptions(self, **options):
+        return options
+
+    def Warp(self, destination, source, options=None):
+        self.warps.append((destination, source, options))
+
+
+def on_grid(value, origin, res=30):
+    steps = (value - origin) / res
+    return abs(steps - round(steps)) < 1e-6
+
+
+def test_snap_bounds_expands_to_the_reference_grid():
+    reference = from_origin(*NATIVE_ORIGIN, 30, 30)
+    assert snap_bounds((250100, 519000, 250200, 519950), reference) == (250075, 518995, 250225, 519955)
+    assert snap_bounds((250015, 518995, 250045, 519025), reference) == (250015, 518995, 250045, 519025)
+
+
+def test_scenes_from_another_zone_are_warped_onto_the_native_grid(tmp_path, monkeypatch):
+    gdal = RecordingGdal()
+    monkeypatch.setattr(mosaic, "gdal", gdal)
+    native = write_scene(tmp_path / "zone19_B4.TIF", "EPSG:32619", NATIVE_ORIGIN)
+    other = write_scene(tmp_path / "zone18_B4.TIF", "EPSG:32618", (780000, 520000))
+
+    paths = common_grid_sources([(native, 10.0), (other, 20.0)], str(tmp_path), "B4")
+
+    # La escena que ya está en la zona común entra sin reproyectar
+    assert paths[0] == native and paths[1].endswith("warp_B4_1.vrt")
+    (destination, source, options), = gdal.warps
+    assert (destination, source) == (paths[1], other)
+    assert options["dstSRS"] == "EPSG:32619" and "targetAlignedPixels" not in options
+    assert (options["xRes"], options["yRes"]) == (30, 30)
+
+    left, bottom, right, top = options["outputBounds"]
+    assert all(on_grid(x, NATIVE_ORIGIN[0]) for x in (left, right))
+    assert all(on_grid(y, NATIVE_ORIGIN[1]) for y in (bottom, top))
+    footprint = transform_bounds("EPSG:32618", "EPSG:32619", 780000, 511000, 789000, 520000)
+    assert left <= footprint[0] and bottom <= footprint[1] and right >= footprint[2] and top >= footprint[3]
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+from src.landsat.compression import (
+    INDEX, MASK, REFLECTANCE, apply_compression, compression_options, gtiff_creation_options
+)
+
+
+def test_compression_options_per_product(monkeypatch):
+    assert compression_options(REFLECTANCE, "uint16") == {"COMPRESS": "DEFLATE", "PREDICTOR": 2}
+    assert compression_options(INDEX, "float32") == {"COMPRESS": "DEFLATE", "PREDICTOR": 3}
+    assert compression_options(INDEX, "float32", "ZSTD:9") == {"COMPRESS": "ZSTD", "PREDICTOR": 3, "ZSTD_LEVEL": 9}
+    assert compression_options(INDEX, "float32", "lerc:0.001") == {"COMPRESS": "LERC", "MAX_Z_ERROR": 0.001}
+    assert compression_options(MASK, "uint8", "NONE") == {}
+
+    monkeypatch.setenv("LANDSAT_COMPRESSION_REFLECTANCE", "LZW")
+    assert gtiff_creation_options(REFLECTANCE, "uint16", 4) == ["COMPRESS=LZW", "PREDICTOR=2", "TILED=YES",
+                                                                 "NUM_THREADS=4"]
+    with pytest.raises(Exception):
+        compression_options(REFLECTANCE, "uint16", "JPEG")
+
+
+def test_apply_compression_writes_lossy_index_within_max_error(tmp_path, monkeypatch):
+    monkeypatch.setenv("LANDSAT_COMPRESSION_INDEX", "LERC:0.01")
+    data = np.random.default_rng(0).uniform(-1, 1, (256, 256)).astype(np.float32)
+    profile = dict(driver="GTiff", width=256, height=256, count=1, dtype="float32", crs="EPSG:32618",
+                   transform=from_origin(500000, 500000, 30, 30), compress="deflate", predictor=2)
+
+    apply_compression(profile, INDEX)
+    assert "predictor" not in profile
+    with rasterio.open(tmp_path / "NDVI.tif", "w", **profile) as dst:
+        dst.write(data, 1)
+    with rasterio.open(tmp_path / "NDVI.tif") as src:
+        assert src.compression.name == "lerc"
+        assert np.abs(src.read(1) - data).max() <= 0.01 + 1e-6
@@ -0,0 +1,69 @@
+import threading
+import time
+
+from src.landsat.concurrency import AdaptiveConcurrencyController
+
+
+def complete_round(controller, host, nbytes, latency=0.01):
+    limit = controller.metrics().get(host, {}).get("concurrency", controller.initial)
+    for _ in range(limit):
+        with controller.slot(host):
+            controller.record_success(host, nbytes, latency)
+
+
+def test_additive_increase_while_throughput_rises():
+    controller = AdaptiveConcurrencyController(initial=2, max_concurrency=5)
+    for i in range(1, 6):
+        time.sleep(0.01)
+        complete_round(controller, "usgs", nbytes=1_000_000 * i * i)
+    assert controller.metrics()["usgs"]["concurrency"] == 5
+
+
+def test_no_increase_when_latency_grows():
+    controller = AdaptiveConcurrencyController(initial=2, max_concurrency=8)
+    complete_round(controller, "usgs", nbytes=1_000, latency=0.01)
+    limit = controller.metrics()["usgs"]["concurrency"]
+    complete_round(controller, "usgs", nbytes=10_000_000, latency=2.0)
+    assert controller.metrics()["usgs"]["concurrency"] == limit
+
+
+def test_multiplicative_decrease_on_backpressure():
+    controller = AdaptiveConcurrencyController(initial=8, min_concurrency=1, backoff_cooldown=0)
+    controller.record_failure("usgs", "HTTP 503")
+    assert controller.metrics()["usgs"]["concurrency"] == 4
+    controller.record_failure("usgs", "HTTP 429")
+    controller.record_failure("usgs", "timeout")
+    controller.record_failure("usgs", "timeout")
+    assert controller.metrics()["usgs"]["concurrency"] == 1
+
+
+def test_backoff_cooldown_groups_bursts():
+    controller = AdaptiveConcurrencyController(initial=8, backoff_cooldown=60)
+    for _ in range(5):
+        controller.record_failure("usgs", "HTTP 503")
+    metrics = controller.metrics()["usgs"]
+    assert metrics["concurrency"] == 4
+    assert metrics["failures"] == 5
+
+
+def test_slot_limits_active_transfers():
+    controller = AdaptiveConcurrencyController(initial=2, max_concurrency=2)
+    peak = []
+    active = [0]
+    lock = threading.Lock()
+
+    def transfer():
+        with controller.slot("usgs"):
+            with lock:
+                active[0] += 1
+                peak.append(active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=transfer) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert max(peak) <= 2
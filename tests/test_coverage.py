@@ -0,0 +1,96 @@
+import json
+
+import pandas as pd
+from shapely.geometry import Polygon, box, shape
+
+import raster_helpers
+from src.landsat import processing
+from src.landsat.processing import export_coverage_layer, render_coverage_map_async, visualize_coverage
+
+
+def make_scene(scene_id, west, south, path, row, cloud_cover=10.0):
+    feature = {
+        "id": scene_id,
+        "geometry": box(west, south, west + 1, south + 1).__geo_interface__,
+        "properties": {"landsat:wrs_path": path, "landsat:wrs_row": row, "eo:cloud_cover": cloud_cover,
+                       "datetime": "2024-01-15T15:00:00Z"},
+    }
+    scene = {"id": scene_id, "path": path, "row": row, "date": "2024-01-15", "cloud_cover": cloud_cover}
+    return feature, scene
+
+
+SCENES = [make_scene(f"LC08_{i}", i * 0.5, 0, f"{8 + i:03d}", "057") for i in range(3)]
+FEATURES = [feature for feature, _ in SCENES]
+SELECTED = [scene for _, scene in SCENES]
+
+
+def write_aoi(tmp_path):
+    return raster_helpers.write_aoi(tmp_path / "source_file.geojson", box(0.2, 0.2, 1.8, 0.8), crs="EPSG:4326")
+
+
+def record_adjust_text(monkeypatch):
+    calls = []
+    monkeypatch.setattr(processing, "adjust_text", lambda texts, **kwargs: calls.append((len(texts), kwargs)))
+    return calls
+
+
+def test_visualize_coverage_writes_the_map(tmp_path, monkeypatch):
+    calls = record_adjust_text(monkeypatch)
+    output_file = visualize_coverage(write_aoi(tmp_path), FEATURES, SELECTED, 100.0, dpi=30, figsize=(4, 4),
+                                     output_dir=tmp_path / "exports")
+
+    assert output_file == tmp_path / "exports" / "coverage_map.png"
+    assert output_file.read_bytes()[:8] == b"\x89PNG\r\n\x1a\n"
+    assert [(n_texts, kwargs["iter_lim"]) for n_texts, kwargs in calls] == [(3, processing.LABEL_RELAX_ITERATIONS)]
+
+
+def test_label_relaxation_is_skipped_above_the_label_limit(tmp_path, monkeypatch):
+    calls = record_adjust_text(monkeypatch)
+    monkeypatch.setattr(processing, "LABEL_RELAX_MAX_TEXTS", 2)
+
+    visualize_coverage(write_aoi(tmp_path), FEATURES, SELECTED, 100.0, dpi=30, figsize=(4, 4), output_dir=tmp_path)
+    assert calls == []
+
+
+def test_render_coverage_map_async_returns_the_png_path(tmp_path, monkeypatch):
+    record_adjust_text(monkeypatch)
+    future = render_coverage_map_async(write_aoi(tmp_path), FEATURES, SELECTED, 100.0, dpi=30, figsize=(4, 4),
+                                       output_dir=tmp_path)
+    output_file = future.result(timeout=60)
+    assert output_file == tmp_path / "coverage_map.png" and output_file.exists()
+
+
+def read_layer(layer_file):
+    with open(layer_file) as f:
+        return {feature["properties"]["id"]: feature for feature in json.load(f)["features"]}
+
+
+def test_export_coverage_layer_properties_and_simplification(tmp_path):
+    # Huella con vértices casi colineales (desvío de 1e-4 grados) a lo largo del borde sur
+    jagged = Polygon([(x / 10, (x % 2) * 1e-4) for x in range(11)] + [(1, 1), (0, 1)])
+    features = [
+        {"id": "sel", "geometry": jagged.__geo_interface__,
+         "properties": {"landsat:wrs_path": "008", "landsat:wrs_row": "057", "eo:cloud_cover": None,
+                        "datetime": "2024-01-15T15:00:00Z"}},
+        {"id": "cand", "geometry": box(1, 0, 2, 1).__geo_interface__,
+         "properties": {"eo:cloud_cover": 12.345}},
+        {"id": "fuera", "geometry": box(5, 5, 6, 6).__geo_interface__, "properties": {}},
+    ]
+    coverage_by_scene = pd.DataFrame({"id": ["sel", "cand"], "coverage_percent": [80.123, 20.0]})
+
+    output_file = export_coverage_layer(features, [{"id": "sel"}], coverage_by_scene, tolerance=0.001,
+                                        output_dir=tmp_path)
+    layer = read_layer(output_file)
+
+    assert set(layer) == {"sel", "cand"}
+    assert layer["sel"]["properties"] == {"id": "sel", "path": "008", "row": "057", "date": "2024-01-15",
+                                          "cloud_cover": 100.0, "coverage_percent": 80.12, "selected": True}
+    assert layer["cand"]["properties"]["cloud_cover"] == 12.35
+    assert layer["cand"]["properties"]["selected"] is False
+    # Los desvíos menores que la tolerancia desaparecen
+    assert len(shape(layer["sel"]["geometry"]).exterior.coords) == 5
+
+    output_file = export_coverage_layer(features, [{"id": "sel"}], coverage_by_scene, tolerance=1e-5,
+                                        output_dir=tmp_path)
+    layer = read_layer(output_file)
+    assert len(shape(layer["sel"]["geometry"]).exterior.coords) > 5
@@ -0,0 +1,52 @@
+import queue
+import time
+
+from src.landsat import downloader
+from src.landsat.concurrency import AdaptiveConcurrencyController
+
+
+def drain(generator):
+    messages = []
+    try:
+        while True:
+            messages.append(next(generator))
+    except StopIteration as e:
+        return messages, e.value
+
+
+class LateQueue(queue.Queue):
+    """La primera espera expira justo cuando los grupos terminan de encolar sus mensajes."""
+
+    expired = False
+
+    def get(self, block=True, timeout=None):
+        if timeout is not None and not self.expired:
+            self.expired = True
+            time.sleep(0.3)
+            raise queue.Empty
+        return super().get(block, timeout)
+
+
+def test_download_images_forwards_messages_queued_after_the_last_wait(tmp_path, monkeypatch):
+    def download_scene_group(storage, features, group_key, *args):
+        yield f"grupo {group_key} descargado"
+
+    def verify_and_requeue(*args):
+        yield "verificado"
+        return True
+
+    monkeypatch.setattr(downloader, "epoch_paths", lambda epoch: {"downloads": tmp_path})
+    monkeypatch.setattr(downloader, "get_storage_backend", lambda session, concurrency=None: None)
+    monkeypatch.setattr(downloader, "prefetch_metadata", lambda *args: (None, 0, 0))
+    monkeypatch.setattr(downloader, "download_scene_group", download_scene_group)
+    monkeypatch.setattr(downloader, "verify_and_requeue", verify_and_requeue)
+    monkeypatch.setattr(downloader.queue, "Queue", LateQueue)
+
+    scenes = [{"id": f"LC08_{i}", "path": "008", "row": f"05{i}", "date": "2024-01-15"} for i in range(3)]
+    messages, download_path = drain(downloader.download_images(
+        [], scenes, {"B4": "sr"}, concurrency=AdaptiveConcurrencyController(), session=object()))
+
+    assert download_path == tmp_path
+    assert sorted(m for m in messages if m.startswith("grupo")) == [
+        f"grupo 008_05{i}_2024-01-15 descargado" for i in range(3)
+    ]
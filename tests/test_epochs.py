@@ -0,0 +1,66 @@
+import pytest
+
+from src.landsat.epochs import (COMPARISON, DATA_ROOT, MOSAIC_CACHE_PATH, PRIMARY, epoch_configs, epoch_paths,
+                                run_generators_concurrently, share_scene_dirs)
+from src.landsat.metadata import MetadataCache, SceneMetadata
+
+
+def drain(generator):
+    messages = []
+    try:
+        while True:
+            messages.append(next(generator))
+    except StopIteration as e:
+        return messages, e.value
+
+
+def epoch(name, steps):
+    for i in range(steps):
+        yield f"{name} {i}"
+    return name.upper()
+
+
+def failing():
+    yield "inicio"
+    raise ValueError("falló")
+
+
+def test_epoch_configs_swaps_comparison_dates():
+    config = {"start_date": "2020-01-01", "end_date": "2020-02-01", "diff_date_enabled": True,
+              "diff_start_date": "2024-01-01", "diff_end_date": "2024-02-01"}
+    epochs = dict(epoch_configs(config))
+    assert epochs[PRIMARY] is config
+    assert (epochs[COMPARISON]["start_date"], epochs[COMPARISON]["end_date"]) == ("2024-01-01", "2024-02-01")
+
+    assert [name for name, _ in epoch_configs(dict(config, diff_date_enabled=False))] == [PRIMARY]
+    assert epoch_paths(COMPARISON)["downloads"] != epoch_paths(PRIMARY)["downloads"]
+
+
+def test_mosaics_are_kept_outside_the_folders_cleared_on_each_run():
+    mosaics = {epoch: epoch_paths(epoch)["mosaic"] for epoch in (PRIMARY, COMPARISON)}
+    assert mosaics[PRIMARY] != mosaics[COMPARISON]
+    for path in mosaics.values():
+        assert MOSAIC_CACHE_PATH in path.parents
+        assert DATA_ROOT / "temp" not in path.parents and DATA_ROOT / "exports" not in path.parents
+
+
+def test_run_generators_concurrently_prefixes_messages_and_returns_values():
+    messages, results = drain(run_generators_concurrently({"": epoch("a", 3), "[b] ": epoch("b", 2)}))
+    assert sorted(messages) == ["[b] b 0", "[b] b 1", "a 0", "a 1", "a 2"]
+    assert results == {"": "A", "[b] ": "B"}
+
+    with pytest.raises(ValueError):
+        drain(run_generators_concurrently({"": epoch("a", 1), "[b] ": failing()}))
+
+
+def test_share_scene_dirs_links_files_and_metadata(tmp_path):
+    source, target = tmp_path / "primary", tmp_path / "comparison"
+    (source / "scene_001_002_2024-01-01").mkdir(parents=True)
+    (source / "scene_001_002_2024-01-01" / "B4.TIF").write_bytes(b"datos")
+    cache = MetadataCache(source)
+    cache.put(SceneMetadata(scene_id="LC08_X", collection="sr", scene_dir="scene_001_002_2024-01-01"))
+    cache.save()
+
+    assert share_scene_dirs(source, target, ["scene_001_002_2024-01-01", "scene_no_existe"]) == 1
+    assert (target / "scene_001_002_2024-01-01" / "B4.TIF").read_bytes() == b"datos"
+    assert [r.scene_id for r in MetadataCache(target).load().records()] == ["LC08_X"]
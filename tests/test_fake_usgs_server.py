@@ -0,0 +1,119 @@
+import json
+import struct
+import urllib.error
+import urllib.request
+from http.cookiejar import CookieJar
+from urllib.parse import urlencode
+
+import pytest
+
+from fake_usgs_server import FakeUSGSServer, SyntheticCatalog
+
+
+def search(server, **overrides):
+    query = {
+        "collections": ["landsat-c2l2-sr"],
+        "query": {"eo:cloud_cover": {"lte": 100}},
+        "datetime": "2024-01-01T00:00:00.000Z/2024-12-31T23:59:59.999Z",
+        "page": 1,
+        "limit": 100,
+    }
+    query.update(overrides)
+    request = urllib.request.Request(server.stac_url, data=json.dumps(query).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def logged_in_opener(server):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    with opener.open(server.login_url) as response:
+        form = response.read().decode()
+    csrf = form.split('name="csrf" value="')[1].split('"')[0]
+    data = urlencode({"username": "user", "password": "pass", "csrf": csrf}).encode()
+    opener.open(server.login_url, data=data).close()
+    return opener
+
+
+@pytest.fixture
+def server():
+    with FakeUSGSServer(raster_size=64, tile_size=32) as fake:
+        yield fake
+
+
+def test_search_is_paginated_like_stac_server(server):
+    server.page_limit = 5
+    first = search(server)
+    assert first["context"]["returned"] == 5
+    assert first["context"]["matched"] == len(SyntheticCatalog().products())
+    assert first["links"]
+
+    last_page = -(-first["context"]["matched"] // 5)
+    last = search(server, page=last_page)
+    assert last["links"] == []
+
+
+def test_search_filters_by_path_row_and_cloud_cover(server):
+    data = search(server, query={"eo:cloud_cover": {"lte": 50},
+                                 "landsat:wrs_path": {"eq": "008"},
+                                 "landsat:wrs_row": {"eq": "057"}})
+    for feature in data["features"]:
+        assert feature["properties"]["landsat:wrs_path"] == "008"
+        assert feature["properties"]["landsat:wrs_row"] == "057"
+        assert feature["properties"]["eo:cloud_cover"] <= 50
+
+
+def test_assets_require_login(server):
+    href = search(server)["features"][0]["assets"]["SR_B4"]["href"]
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(href)
+    assert error.value.code == 401
+
+    with logged_in_opener(server).open(href) as response:
+        body = response.read()
+    assert body[:4] == b"II*\x00"
+    assert int(response.headers["Content-Length"]) == len(body)
+
+
+def test_assets_are_tiled_geotiffs(server):
+    server.require_login = False
+    href = search(server)["features"][0]["assets"]["SR_B4"]["href"]
+    body = urllib.request.urlopen(href).read()
+
+    ifd_offset = struct.unpack("<I", body[4:8])[0]
+    count = struct.unpack("<H", body[ifd_offset:ifd_offset + 2])[0]
+    tags = {struct.unpack("<H", body[ifd_offset + 2 + 12 * i:ifd_offset + 4 + 12 * i])[0] for i in range(count)}
+    assert {256, 257, 322, 323, 324, 325, 33550, 33922, 34735} <= tags
+
+
+def test_range_requests(server):
+    server.require_login = False
+    href = search(server)["features"][0]["assets"]["SR_B4"]["href"]
+    request = urllib.request.Request(href, headers={"Range": "bytes=0-15"})
+    with urllib.request.urlopen(request) as response:
+        assert response.status == 206
+        assert len(response.read()) == 16
+
+
+def test_failure_injection_is_deterministic():
+    codes = []
+    for _ in range(2):
+        with FakeUSGSServer(raster_size=32, tile_size=32, failure_rate=0.5, require_login=False, seed=7) as fake:
+            hrefs = [f["assets"]["SR_B4"]["href"] for f in search(fake)["features"][:6]]
+            run = []
+            for href in hrefs:
+                try:
+                    run.append(urllib.request.urlopen(href).status)
+                except urllib.error.HTTPError as e:
+                    run.append(e.code)
+            codes.append(run)
+    assert codes[0] == codes[1]
+    assert any(code in (429, 503) for code in codes[0])
+
+
+def test_mtl_contains_consumed_fields(server):
+    server.require_login = False
+    href = search(server)["features"][0]["assets"]["MTL.json"]["href"]
+    mtl = json.load(urllib.request.urlopen(href))["LANDSAT_METADATA_FILE"]
+    assert "CLOUD_COVER" in mtl["IMAGE_ATTRIBUTES"]
+    assert "K1_CONSTANT_BAND_10" in mtl["LEVEL1_THERMAL_CONSTANTS"]
@@ -0,0 +1,39 @@
+from shapely.geometry import MultiPolygon, box
+
+from src.landsat.footprints import FootprintIndex
+
+
+def make_feature(scene_id, west, south, east, north, with_geometry=True):
+    feature = {"id": scene_id, "properties": {}}
+    if with_geometry:
+        feature["geometry"] = box(west, south, east, north).__geo_interface__
+    else:
+        feature["properties"] = {
+            "landsat:bounds_west": west, "landsat:bounds_south": south,
+            "landsat:bounds_east": east, "landsat:bounds_north": north,
+        }
+    return feature
+
+
+FEATURES = [
+    make_feature("a", 0, 0, 2, 2),
+    make_feature("b", 1, 1, 3, 3, with_geometry=False),
+    make_feature("c", 10, 10, 12, 12),
+    {"id": "sin_huella", "properties": {}},
+]
+
+
+def test_query_and_missing_footprints():
+    index = FootprintIndex(FEATURES)
+    assert list(index.missing) == [3]
+    assert list(index.query(box(1.5, 1.5, 1.6, 1.6))) == [0, 1]
+    assert list(index.query_bounds(9, 9, 20, 20)) == [2]
+    assert index.footprint("c").bounds == (10.0, 10.0, 12.0, 12.0)
+    assert index.footprint("no_existe") is None
+
+
+def test_query_parts_and_intersection_areas():
+    index = FootprintIndex(FEATURES)
+    aoi = MultiPolygon([box(0, 0, 0.5, 0.5), box(11, 11, 13, 13)])
+    assert [list(parts) for parts in index.query_parts(aoi)] == [[0], [2]]
+    assert list(index.intersection_areas(box(1, 1, 2, 2))) == [1.0, 1.0, 0.0, 0.0]
@@ -0,0 +1,82 @@
+import os
+from functools import partial
+
+import numpy as np
+import rasterio
+
+import raster_helpers
+from src.landsat.incremental import (
+    compact_mosaic, grid_of, load_manifest, plan_update, save_manifest, source_entries, update_mosaic_blocks,
+    wasted_bytes
+)
+
+write_raster = partial(raster_helpers.write_raster, origin=(500000, 1000640), pixel_size=10)
+
+
+def test_plan_update_detects_changed_scenes(tmp_path):
+    scene_a, scene_b = tmp_path / "a.tif", tmp_path / "b.tif"
+    write_raster(scene_a, np.ones((64, 64), dtype="uint16"))
+    write_raster(scene_b, np.ones((64, 64), dtype="uint16"))
+    with rasterio.open(scene_a) as src:
+        grid, crs = grid_of(src), src.crs
+
+    sources = source_entries([(str(scene_a), 5.0), (str(scene_b), 10.0)], crs)
+    mosaic = tmp_path / "mosaic_B4.tif"
+    save_manifest(mosaic, grid, sources)
+    manifest = load_manifest(mosaic)
+
+    assert plan_update(None, grid, sources) is None
+    assert plan_update(manifest, grid, sources) == []
+    assert plan_update(manifest, dict(grid, width=128), sources) is None
+    assert plan_update(manifest, grid, sources[::-1]) is None
+    assert plan_update(manifest, grid, sources[:1]) == [sources[1]["bounds"]]
+
+    modified = dict(sources[1], size=sources[1]["size"] + 1)
+    assert plan_update(manifest, grid, [sources[0], modified]) == [sources[1]["bounds"]] * 2
+
+    # Una escena descargada de nuevo (otra fecha de modificación, mismo contenido) no cambia
+    mtime = os.path.getmtime(scene_b) + 3600
+    os.utime(scene_b, (mtime, mtime))
+    assert plan_update(manifest, grid, source_entries([(str(scene_a), 5.0), (str(scene_b), 10.0)], crs)) == []
+
+
+def test_update_mosaic_blocks_rewrites_only_intersecting_blocks(tmp_path):
+    mosaic, source = tmp_path / "mosaic_B4.tif", tmp_path / "mosaic_B4.vrt.tif"
+    write_raster(mosaic, np.zeros((64, 64), dtype="uint16"), tiled=True, blockxsize=16, blockysize=16)
+    write_raster(source, np.full((64, 64), 7, dtype="uint16"))
+
+    # Extensión que cubre los píxeles 20-27 (columnas) y 4-9 (filas)
+    bounds = [500000 + 20 * 10, 1000640 - 10 * 10, 500000 + 28 * 10, 1000640 - 4 * 10]
+    assert update_mosaic_blocks(mosaic, source, [bounds]) == (1, 16)
+
+    with rasterio.open(mosaic) as src:
+        data = src.read(1)
+    assert (data[0:16, 16:32] == 7).all()
+    assert data.sum() == 7 * 16 * 16
+
+
+def test_compact_mosaic_drops_tiles_replaced_by_updates(tmp_path):
+    rng = np.random.default_rng(0)
+    mosaic, source = tmp_path / "mosaic_B4.tif", tmp_path / "source.tif"
+    write_raster(mosaic, rng.integers(0, 60000, (512, 512), dtype="uint16"), tiled=True, blockxsize=128,
+                 blockysize=128, compress="deflate")
+    assert not compact_mosaic(mosaic)
+    size = os.path.getsize(mosaic)
+
+    # Las teselas reescritas que no caben en su espacio anterior se añaden al final del archivo
+    everything = [500000, 1000640 - 512 * 10, 500000 + 512 * 10, 1000640]
+    for _ in range(2):
+        write_raster(source, rng.integers(0, 60000, (512, 512), dtype="uint16"))
+        assert update_mosaic_blocks(mosaic, source, [everything]) == (16, 16)
+    assert os.path.getsize(mosaic) > 1.25 * size
+    wasted, live = wasted_bytes(mosaic)
+    assert wasted > 0.25 * live
+
+    with rasterio.open(source) as src:
+        expected = src.read(1)
+    assert compact_mosaic(mosaic)
+    assert os.path.getsize(mosaic) < 1.25 * size
+    with rasterio.open(mosaic) as src:
+        np.testing.assert_array_equal(src.read(1), expected)
+        assert src.block_shapes[0] == (128, 128) and src.compression.name == "deflate"
+    assert not compact_mosaic(mosaic)
@@ -0,0 +1,45 @@
+import json
+import os
+
+import numpy as np
+import rasterio
+
+from raster_helpers import write_raster
+from src.landsat.indices import STACK_FILE_NAME, band_key, load_stacked_bands, stacked_band_names
+
+
+NAMES = ["B10_ST", "B4_SR", "B5_SR"]
+
+
+def write_stack(path, names=NAMES):
+    data = np.arange(len(names) * 32 * 48, dtype=np.uint16).reshape(len(names), 32, 48)
+    with rasterio.open(write_raster(path / STACK_FILE_NAME, data, interleave="pixel"), "r+") as dst:
+        dst.update_tags(BANDS=json.dumps(names))
+    return data
+
+
+def test_load_stacked_bands_reads_requested_bands_by_name(tmp_path):
+    data = write_stack(tmp_path)
+
+    bands, band_profile = load_stacked_bands(tmp_path, {band_key("B5", "sr"), band_key("B2", "sr")})
+    assert list(bands) == ["B5_SR"]
+    assert bands["B5_SR"].dtype == np.float32
+    np.testing.assert_array_equal(bands["B5_SR"], data[2])
+    assert band_profile["count"] == 1
+
+    assert load_stacked_bands(tmp_path / "sin_recortes", {"B4_SR"}) == ({}, None)
+
+
+def test_a_stack_older_than_the_band_clips_is_ignored(tmp_path):
+    write_stack(tmp_path)
+    clip = tmp_path / "clip_B4_SR.tif"
+    clip.touch()
+    stack_mtime = os.path.getmtime(tmp_path / STACK_FILE_NAME)
+
+    os.utime(clip, (stack_mtime - 10, stack_mtime - 10))
+    assert stacked_band_names(tmp_path) == NAMES
+
+    # Recortes regenerados después del recorte multibanda: el recorte multibanda ya no vale
+    os.utime(clip, (stack_mtime + 10, stack_mtime + 10))
+    assert stacked_band_names(tmp_path) == []
+    assert load_stacked_bands(tmp_path, {"B4_SR"}) == ({}, None)
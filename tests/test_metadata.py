@@ -0,0 +1,112 @@
+import json
+import os
+
+from src.landsat.downloader import prefetch_metadata
+from src.landsat.indices import load_temperature_scaling, load_thermal_constants
+from src.landsat.metadata import (
+    MetadataCache, SceneMetadata, get_scene_dir_metadata, load_metadata_cache, parse_mtl
+)
+
+MTL_TEXT = """
+{
+  "LANDSAT_METADATA_FILE": {
+    "IMAGE_ATTRIBUTES": {"CLOUD_COVER": "12.34", "CLOUD_COVER_LAND": "10.00", "SUN_AZIMUTH": "120.5",
+                         "SUN_ELEVATION": "55.1"},
+    "LEVEL2_SURFACE_REFLECTANCE_PARAMETERS": {"REFLECTANCE_MULT_BAND_4": "2.75E-05",
+                                              "REFLECTANCE_ADD_BAND_4": "-0.200000"},
+    "LEVEL2_SURFACE_TEMPERATURE_PARAMETERS": {"TEMPERATURE_MULT_BAND_ST_B10": "0.00341802",
+                                              "TEMPERATURE_ADD_BAND_ST_B10": "149.000000"},
+    "LEVEL1_THERMAL_CONSTANTS": {"K1_CONSTANT_BAND_10": "774.8853", "K2_CONSTANT_BAND_10": "1321.0789"},
+    "LEVEL1_RADIOMETRIC_RESCALING": {"RADIANCE_MULT_BAND_10": "3.3420E-04", "RADIANCE_ADD_BAND_10": "0.10000"}
+  }
+}
+"""
+
+
+def test_parse_mtl_reads_the_fields_used_downstream():
+    record = parse_mtl(json.loads(MTL_TEXT), "LC08_L2SP_008057_20240101", "st", "scene_008_057_20240101")
+
+    assert record.cloud_cover == 12.34 and record.cloud_cover_land == 10.0
+    assert record.reflectance_mult == {"B4": 2.75e-05} and record.reflectance_add == {"B4": -0.2}
+    assert (record.temperature_mult, record.temperature_add) == (0.00341802, 149.0)
+    assert record.thermal_constants() == {"K1": 774.8853, "K2": 1321.0789, "ML": 3.342e-04, "AL": 0.1}
+    assert parse_mtl({}, "empty").cloud_cover is None
+
+
+def test_metadata_cache_round_trip(tmp_path):
+    record = parse_mtl(json.loads(MTL_TEXT), "LC08_A", "sr", "scene_a")
+    cache = MetadataCache(tmp_path)
+    cache.put(record)
+    cache.save()
+
+    loaded = MetadataCache(tmp_path).load()
+    assert loaded.get("LC08_A") == record
+    assert loaded.for_scene_dir(tmp_path / "scene_a") == [record]
+    assert get_scene_dir_metadata(tmp_path / "scene_a") == [record]
+
+
+def test_load_metadata_cache_is_invalidated_when_the_file_changes(tmp_path):
+    cache = MetadataCache(tmp_path)
+    cache.put(SceneMetadata("LC08_A", cloud_cover=5.0))
+    cache.save()
+
+    first = load_metadata_cache(tmp_path)
+    assert load_metadata_cache(tmp_path) is first
+
+    cache.put(SceneMetadata("LC08_B", cloud_cover=50.0))
+    cache.save()
+    mtime = os.path.getmtime(cache.cache_file) + 10
+    os.utime(cache.cache_file, (mtime, mtime))
+
+    reloaded = load_metadata_cache(tmp_path)
+    assert reloaded is not first
+    assert {record.scene_id for record in reloaded.records()} == {"LC08_A", "LC08_B"}
+
+
+def test_thermal_constants_and_scaling_come_from_st_records():
+    st_record = SceneMetadata("LC08_ST", collection="st", k1=800.0, k2=1300.0, radiance_mult=0.0004,
+                              radiance_add=0.2, temperature_mult=0.004, temperature_add=150.0)
+    sr_record = SceneMetadata("LC08_SR", collection="sr", k1=1.0)
+
+    assert load_thermal_constants([sr_record, st_record]) == {"K1": 800.0, "K2": 1300.0, "ML": 0.0004, "AL": 0.2}
+    assert load_thermal_constants([sr_record])["K1"] == 774.8853
+    assert load_temperature_scaling([st_record]) == (0.004, 150.0)
+    assert load_temperature_scaling([sr_record]) == (0.00341802, 149.0)
+
+
+class FlakyStorage:
+    """Entrega primero las respuestas defectuosas de cada href y luego el MTL.json válido."""
+
+    def __init__(self, bad_responses):
+        self.bad_responses = bad_responses
+        self.fetched = []
+
+    def fetch(self, href, output_file):
+        self.fetched.append(href)
+        responses = self.bad_responses.get(href, [])
+        body = responses.pop(0) if responses else MTL_TEXT
+        with open(output_file, "w") as f:
+            f.write(body)
+        return len(body)
+
+
+def mtl_feature(scene_id, collection):
+    return {"id": scene_id, "collection": f"landsat-c2l2-{collection}",
+            "assets": {"MTL.json": {"href": f"https://example.org/{scene_id}_MTL.json"}}}
+
+
+def test_prefetch_metadata_refetches_invalid_mtl_files(tmp_path):
+    features = [mtl_feature("LC08_A", "sr"), mtl_feature("LC08_B", "st")]
+    groups = {"008_057_2024-01-01": [{"id": "LC08_A"}, {"id": "LC08_B"}]}
+    scene_dir = tmp_path / "scene_008_057_2024-01-01"
+    # MTL.json truncado de una ejecución anterior
+    scene_dir.mkdir()
+    (scene_dir / "LC08_A_SR_MTL.json").write_text("")
+    storage = FlakyStorage({"https://example.org/LC08_B_MTL.json": ["<html>Service Unavailable</html>"]})
+
+    cache, fetched, total = prefetch_metadata(storage, features, groups, tmp_path)
+
+    assert (fetched, total) == (2, 2)
+    assert {record.scene_id for record in cache.records()} == {"LC08_A", "LC08_B"}
+    assert cache.get("LC08_A").cloud_cover == 12.34
+    assert sorted(storage.fetched) == ["https://example.org/LC08_A_MTL.json"] + ["https://example.org/LC08_B_MTL.json"] * 2
@@ -0,0 +1,29 @@
+import numpy as np
+import shapely
+from shapely.geometry import box
+
+from src.landsat.projection import area_crs_for, common_utm_crs, get_transformer, project, utm_epsg_for
+
+
+def test_utm_zone_selection():
+    assert utm_epsg_for(-74.0, 4.6) == 32618
+    assert utm_epsg_for(-70.6, -33.4) == 32719
+    assert area_crs_for(box(-74.3, 4.4, -73.7, 4.9)) == "EPSG:32618"
+    assert area_crs_for(box(-80, 0, -60, 10)).startswith("+proj=laea")
+
+
+def test_bulk_projection_uses_cached_transformer():
+    get_transformer.cache_clear()
+    geometries = np.array([box(10, 60, 11, 61), box(10, 62, 11, 63)], dtype=object)
+    projected = project(geometries, "EPSG:4326", area_crs_for(box(10, 60, 11, 63)))
+    areas = shapely.area(projected)
+    # Un grado cuadrado abarca menos área a mayor latitud
+    assert areas[1] < areas[0]
+    assert np.allclose(areas / 1e6, [6200, 5630], rtol=0.02)
+    assert get_transformer.cache_info().misses == 1
+
+
+def test_common_utm_crs_uses_center_of_joint_extent():
+    # Escenas a ambos lados del límite entre las zonas 18 y 19 (-72°)
+    assert common_utm_crs([(-73.5, 4.0, -72.2, 5.0), (-72.4, 4.0, -70.1, 5.0)]) == "EPSG:32619"
+    assert common_utm_crs([(-74.3, -1.0, -73.7, -0.5)]) == "EPSG:32718"
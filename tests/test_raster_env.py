@@ -0,0 +1,16 @@
+import rasterio
+
+from src.landsat.raster_env import raster_env, raster_options
+
+
+def test_raster_options_env_overrides(monkeypatch):
+    monkeypatch.setenv("LANDSAT_GDAL_CACHEMAX", "2048")
+    options = raster_options(VSI_CACHE=False)
+    assert options["GDAL_CACHEMAX"] == 2048
+    assert options["VSI_CACHE"] is False
+    assert options["GDAL_NUM_THREADS"]
+
+
+def test_raster_env_applies_options_to_rasterio():
+    with raster_env(GDAL_CACHEMAX=256):
+        assert rasterio.env.getenv()["GDAL_CACHEMAX"] == 256
@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+from shapely.geometry import box
+
+from src.landsat.selection import best_time_window, select_scenes
+
+
+def make_scenes(rows):
+    return pd.DataFrame([
+        {"id": scene_id, "path_row": path_row, "cloud_cover": cloud, "date_obj": pd.Timestamp(date),
+         "footprint": box(*bounds)}
+        for scene_id, path_row, cloud, date, bounds in rows
+    ])
+
+
+AOI = box(0, 0, 2, 1)
+
+SCENES = make_scenes([
+    ("izquierda", "1_1", 5.0, "2024-01-01", (0, 0, 1, 1)),
+    ("redundante", "1_2", 1.0, "2024-01-05", (0.2, 0.2, 0.8, 0.8)),
+    ("derecha_nublada", "2_1", 60.0, "2024-01-10", (1, 0, 2, 1)),
+    ("derecha", "2_1", 10.0, "2024-09-01", (1, 0, 2, 1)),
+])
+
+
+@pytest.mark.parametrize("selector", ["greedy", "ilp"])
+def test_skips_redundant_scenes_and_fills_gaps(selector):
+    selected = select_scenes(SCENES, AOI, selector, window_days=365)
+    assert sorted(selected["id"]) == ["derecha", "izquierda"]
+
+
+@pytest.mark.parametrize("selector", ["greedy", "ilp"])
+def test_window_forces_scene_inside_range(selector):
+    selected = select_scenes(SCENES, AOI, selector, window_days=30)
+    assert sorted(selected["id"]) == ["derecha_nublada", "izquierda"]
+
+
+def test_unknown_selector():
+    with pytest.raises(ValueError):
+        select_scenes(SCENES, AOI, "otro")
+
+
+def test_window_search_finds_best_window():
+    scenes = make_scenes([
+        ("a", "1_1", 0.0, "2024-01-01", (0, 0, 1, 1)),
+        ("d", "2_1", 80.0, "2024-01-20", (1, 0, 2, 1)),
+        ("b", "2_1", 50.0, "2024-06-01", (1, 0, 2, 1)),
+        ("c", "1_1", 20.0, "2024-06-10", (0, 0, 1, 1)),
+    ])
+    assert list(best_time_window(scenes, AOI, 30)) == [2, 3]
+    assert sorted(select_scenes(scenes, AOI, window_days=30)["id"]) == ["b", "c"]
+    assert sorted(select_scenes(scenes, AOI, window_days=30, window_search=False)["id"]) == ["a", "d"]
+
+
+def test_window_search_prefers_clear_scene_over_smaller_window():
+    scenes = make_scenes([
+        ("primera", "1_1", 30.0, "2024-01-01", (0, 0, 2, 1)),
+        ("despejada", "2_1", 1.0, "2024-01-17", (0, 0, 2, 1)),
+        ("nublada", "3_1", 90.0, "2024-01-20", (0, 0, 2, 1)),
+    ])
+    assert list(select_scenes(scenes, AOI, window_days=120)["id"]) == ["despejada"]
+
+
+def test_window_search_tracks_overlapping_path_rows():
+    # Huellas solapadas: la cobertura de la ventana no es la suma de áreas
+    scenes = make_scenes([
+        ("ancha", "1_1", 40.0, "2024-01-01", (0, 0, 1.5, 1)),
+        ("estrecha", "2_1", 10.0, "2024-01-10", (1, 0, 2, 1)),
+        ("centro", "3_1", 5.0, "2024-03-01", (0.5, 0, 1.5, 1)),
+        ("izquierda", "1_1", 20.0, "2024-03-10", (0, 0, 1.5, 1)),
+        ("derecha", "2_1", 15.0, "2024-03-20", (1, 0, 2, 1)),
+        ("suelta", "3_1", 0.0, "2024-08-01", (0.5, 0, 1.5, 1)),
+    ])
+    # Solo las ventanas de marzo y enero cubren el AOI; la de marzo es más despejada
+    assert list(best_time_window(scenes, AOI, 30)) == [2, 3, 4]
@@ -0,0 +1,18 @@
+import numpy as np
+
+from src.landsat.snapshots import latest_snapshot, load_search_snapshot, save_search_snapshot
+
+
+def test_snapshot_round_trip(tmp_path):
+    config = {"start_date": "2024-01-01", "selected_indices": ["NDVI"]}
+    features = [{"id": "LC08_A", "properties": {"eo:cloud_cover": 12.5}, "assets": {}}]
+    scenes = [{"id": "LC08_A", "path": "008", "row": "057", "coverage_percent": np.float64(97.5)}]
+
+    assert latest_snapshot(tmp_path) is None
+    snapshot_file = save_search_snapshot(config, {"primary": (features, scenes)}, runs_path=tmp_path)
+    assert latest_snapshot(tmp_path) == snapshot_file
+    assert snapshot_file.name.endswith(".json.gz")
+
+    loaded_config, epochs = load_search_snapshot(snapshot_file)
+    assert loaded_config == config
+    assert epochs["primary"] == (features, [dict(scenes[0], coverage_percent=97.5)])
@@ -0,0 +1,189 @@
+from contextlib import contextmanager
+
+import pytest
+import requests
+
+from src.landsat import storage
+from src.landsat.storage import (
+    AssetStream, CompositeBackend, FileBackend, HTTPBackend, MirrorBackend, StorageBackend
+)
+
+
+class RecordingBackend(StorageBackend):
+    """Backend de respaldo que registra los href pedidos."""
+
+    def __init__(self, scheme="https"):
+        self.scheme = scheme
+        self.requested = []
+
+    def can_handle(self, href):
+        return href.startswith(self.scheme + "://")
+
+    def exists(self, href):
+        self.requested.append(href)
+        return False
+
+    @contextmanager
+    def open(self, href):
+        self.requested.append(href)
+        yield AssetStream(lambda chunk_size: iter([b"remote"]), 6, source=href)
+
+
+def test_storage_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend()
+
+
+def test_file_backend_reads_file_urls_and_paths(tmp_path):
+    asset = tmp_path / "LC08_B4.TIF"
+    asset.write_bytes(b"x" * 20000)
+    backend = FileBackend()
+
+    assert backend.can_handle(asset.as_uri()) and backend.can_handle(str(asset))
+    assert not backend.can_handle("https://landsatlook.usgs.gov/data/B4.TIF")
+    assert backend.exists(asset.as_uri())
+    assert not backend.exists((tmp_path / "missing.TIF").as_uri())
+
+    with backend.open(asset.as_uri()) as stream:
+        assert stream.total_size == 20000
+        assert b"".join(stream.iter_content(8192)) == b"x" * 20000
+
+    assert backend.fetch(str(asset), tmp_path / "copy.TIF") == 20000
+    with pytest.raises(FileNotFoundError):
+        backend.fetch((tmp_path / "missing.TIF").as_uri(), tmp_path / "other.TIF")
+
+
+class BrokenBackend(RecordingBackend):
+    """Backend cuya transferencia se corta a mitad."""
+
+    @contextmanager
+    def open(self, href):
+        def chunks(chunk_size):
+            yield b"parcial"
+            raise ConnectionError("conexión cerrada")
+
+        yield AssetStream(chunks, 100, source=href)
+
+
+def test_failed_fetch_leaves_no_partial_file(tmp_path):
+    output_file = tmp_path / "LC08_MTL.json"
+    with pytest.raises(ConnectionError):
+        BrokenBackend().fetch("https://example.org/LC08_MTL.json", output_file)
+    assert list(tmp_path.iterdir()) == []
+
+    with pytest.raises(FileNotFoundError):
+        FileBackend().fetch((tmp_path / "missing.TIF").as_uri(), output_file)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_mirror_backend_resolves_hits_and_falls_back_on_misses(tmp_path):
+    mirrored = tmp_path / "mirror" / "landsatlook.usgs.gov" / "data" / "B4.TIF"
+    mirrored.parent.mkdir(parents=True)
+    mirrored.write_bytes(b"local")
+    fallback = RecordingBackend()
+    backend = MirrorBackend(tmp_path / "mirror", fallback)
+
+    hit = "https://landsatlook.usgs.gov/data/B4.TIF"
+    miss = "https://landsatlook.usgs.gov/data/B5.TIF"
+    assert backend.resolve(hit) == str(mirrored)
+    assert backend.resolve(miss) is None
+
+    assert backend.fetch(hit, tmp_path / "hit.TIF") == 5
+    assert (tmp_path / "hit.TIF").read_bytes() == b"local"
+    assert fallback.requested == []
+
+    assert backend.fetch(miss, tmp_path / "miss.TIF") == 6
+    assert fallback.requested == [miss]
+
+
+def test_composite_backend_dispatches_by_scheme(tmp_path):
+    asset = tmp_path / "B4.TIF"
+    asset.write_bytes(b"file")
+    remote = RecordingBackend()
+    backend = CompositeBackend([FileBackend(), remote])
+
+    assert backend.fetch(asset.as_uri(), tmp_path / "a.TIF") == 4
+    assert backend.fetch("https://example.org/B4.TIF", tmp_path / "b.TIF") == 6
+    assert remote.requested == ["https://example.org/B4.TIF"]
+    with pytest.raises(ValueError):
+        backend.exists("s3://bucket/B4.TIF")
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b""):
+        self.status_code = status_code
+        self.headers = {"Retry-After": "7"} if status_code == 503 else {"content-length": str(len(body))}
+        self.body = body
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def get(self, href, stream=False, timeout=None):
+        return self.responses.pop(0)
+
+
+class SlotCounter:
+    max_concurrency = 4
+
+    def __init__(self):
+        self.held = 0
+        self.failures = []
+
+    @contextmanager
+    def slot(self, host):
+        self.held += 1
+        try:
+            yield
+        finally:
+            self.held -= 1
+
+    def record_failure(self, host, reason=""):
+        self.failures.append(reason)
+
+    def record_success(self, host, nbytes, latency):
+        pass
+
+
+def test_http_backend_releases_the_host_slot_while_backing_off(tmp_path, monkeypatch):
+    concurrency = SlotCounter()
+    slots_held_while_sleeping = []
+    monkeypatch.setattr(storage.time, "sleep",
+                        lambda delay: slots_held_while_sleeping.append((concurrency.held, delay)))
+    backend = HTTPBackend(FakeSession([FakeResponse(503), FakeResponse(200, b"scene")]), concurrency)
+
+    assert backend.fetch("https://example.org/B4.TIF", tmp_path / "B4.TIF") == 5
+    assert concurrency.failures == ["HTTP 503"]
+    assert slots_held_while_sleeping == [(0, 7.0)]
+
+
+def test_backends_sharing_a_session_keep_its_connection_pool():
+    session = requests.Session()
+    concurrency = SlotCounter()
+    concurrency.max_concurrency = 16  # más que el pool por defecto de requests (10)
+    HTTPBackend(session, concurrency)
+    adapter = session.get_adapter("https://landsatlook.usgs.gov")
+    assert adapter._pool_maxsize == 16
+
+    # La segunda época reutiliza la sesión sin reemplazar el pool de la primera
+    HTTPBackend(session, concurrency)
+    assert session.get_adapter("https://landsatlook.usgs.gov") is adapter
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from fake_usgs_server import build_geotiff
+from src.landsat.verification import check_tiff_structure, verify_downloads, verify_tif
+
+
+@pytest.fixture
+def valid_tif(tmp_path):
+    path = tmp_path / "valid_SR_B4.TIF"
+    path.write_bytes(build_geotiff(64, 64, 500000.0, 600000.0, 30.0, 32618, lambda x, y: x + y, tile_size=32))
+    return str(path)
+
+
+def test_valid_tif_passes(valid_tif):
+    assert verify_tif(valid_tif, expected_size=os.path.getsize(valid_tif), full_decode=True) is None
+
+
+def test_truncated_tif_is_detected(valid_tif, tmp_path):
+    truncated = tmp_path / "truncated.TIF"
+    truncated.write_bytes(open(valid_tif, "rb").read()[:4000])
+    assert "incompletos" in check_tiff_structure(str(truncated))
+
+
+def test_html_error_page_is_detected(tmp_path):
+    page = tmp_path / "error.TIF"
+    page.write_bytes(b"<!DOCTYPE html><html><body>503</body></html>")
+    assert "HTML" in verify_tif(str(page))
+
+
+def test_content_length_mismatch(valid_tif):
+    assert "Content-Length" in verify_tif(valid_tif, expected_size=10)
+
+
+def test_verify_downloads_returns_only_invalid(valid_tif, tmp_path):
+    page = tmp_path / "error.TIF"
+    page.write_bytes(b"<html>error</html>")
+    invalid = verify_downloads([valid_tif, str(page)])
+    assert list(invalid) == [str(page)]